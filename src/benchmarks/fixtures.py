@@ -0,0 +1,351 @@
+import math
+import os
+import random
+import re
+
+from typing import Dict, List
+
+from modules.file import ensure_folder_exists, read_text_file, save_text_to_file
+from modules.logger import log, LogLevels
+
+AIRPORT_CODES = ['CDG', 'GRU', 'JFK', 'LHR', 'NRT', 'SYD', 'DXB', 'FRA', 'MAD', 'YYZ', 'SCL', 'JNB', 'SIN', 'MEX']
+
+BONUS_IMAGES = ['dollars.png', 'researchDollars.png']
+
+
+def get_fixtures_folder() -> str:
+    """
+    Retrieve the folder with the stored (anonymized) real pages, one sub folder per extractor
+    :return:
+    """
+    return os.getenv('BENCHMARK_FIXTURES_FOLDER', os.path.join(os.path.dirname(__file__), 'fixtures'))
+
+
+def render_page_layout(body: str, seed: int = 0) -> str:
+    """
+    Wraps a page content with the game layout bulk (head, scripts and navigation menu), so the parsing cost of the
+    generated pages is close to the real ones
+    :param body:
+    :param seed:
+    :return:
+    """
+    randomizer = random.Random(seed)
+    scripts = ''.join(
+        f'<script type="text/javascript">var config{index} = {{"id": {randomizer.randint(1, 10**6)}}};</script>'
+        for index in range(10)
+    )
+    menu_items = ''.join(
+        f'<li class="menu-item"><a href="/menu/{index}" title="Menu item {index}"><span>Item {index}</span></a></li>'
+        for index in range(60)
+    )
+
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Airlines Manager</title>'
+        f'<link rel="stylesheet" href="/css/main.css">{scripts}</head><body>'
+        f'<div id="header"><ul class="menu">{menu_items}</ul></div>{body}'
+        '<div id="footer"><p>Airlines Manager - Playrion</p></div></body></html>'
+    )
+
+
+def render_pagination(has_next: bool, page: int = 1, pages_count: int = None) -> str:
+    """
+    Renders the pagination div of the results pages (with a link to the last page if the pages count is given)
+    :param has_next:
+    :param page:
+    :param pages_count:
+    :return:
+    """
+    next_span = f'<span class="next"><a href="?page={page + 1}">Next</a></span>' if has_next else ''
+    last_span = ''
+    if pages_count is not None and pages_count > page:
+        last_span = f'<span class="last"><a href="?page={pages_count}">{pages_count}</a></span>'
+
+    return f'<div class="pagination"><span class="current">{page}</span>{next_span}{last_span}</div>'
+
+
+def generate_lines_summary_page(
+        rows_count: int,
+        first_id: int = 1,
+        has_next: bool = False,
+        page: int = 1,
+        pages_count: int = None,
+) -> str:
+    """
+    Generates a lines results page (network) with the given amount of rows
+    :param rows_count:
+    :param first_id:
+    :param has_next:
+    :param page:
+    :param pages_count:
+    :return:
+    """
+    randomizer = random.Random(first_id)
+    rows = []
+    for line_id in range(first_id, first_id + rows_count):
+        origin, destination = randomizer.sample(AIRPORT_CODES, 2)
+        rows.append(
+            f'<tr><td><img alt="Country {origin}" src="/images/flags/{origin.lower()}.png"> '
+            f'{origin} / {destination}</td>'
+            f'<td>{randomizer.randint(500, 15000)} km</td>'
+            f'<td>{randomizer.randint(0, 5000)} pax</td>'
+            f'<td>$ {randomizer.randint(10**4, 10**7)}</td>'
+            f'<td>$ {randomizer.randint(-10**5, 10**6)}</td>'
+            f'<td></td>'
+            f'<td><a href="/network/showline/{line_id}">Details</a></td></tr>'
+        )
+
+    body = (
+        '<div id="content"><div id="displayPro"><table><tr><td>Filters</td></tr></table>'
+        '<table><tr><th>Line</th><th>Distance</th><th>Demand</th><th>Turnover</th><th>Result</th><th></th>'
+        '<th></th></tr>'
+        f'{"".join(rows)}</table></div>{render_pagination(has_next, page, pages_count)}</div>'
+    )
+
+    return render_page_layout(body, seed=first_id)
+
+
+def generate_lines_summary_pages(lines_count: int, rows_per_page: int = 500) -> List[str]:
+    """
+    Generates all the lines results pages of an account with the given amount of lines
+    :param lines_count:
+    :param rows_per_page:
+    :return:
+    """
+    return [
+        generate_lines_summary_page(
+            rows_count=min(rows_per_page, lines_count - first_row),
+            first_id=first_row + 1,
+            has_next=first_row + rows_per_page < lines_count,
+            page=first_row // rows_per_page + 1,
+            pages_count=math.ceil(lines_count / rows_per_page),
+        )
+        for first_row in range(0, lines_count, rows_per_page)
+    ]
+
+
+def generate_airplanes_page(
+        rows_count: int,
+        first_id: int = 1,
+        has_next: bool = False,
+        page: int = 1,
+        pages_count: int = None,
+) -> str:
+    """
+    Generates an airplanes results page (aircraft) with the given amount of rows
+    :param rows_count:
+    :param first_id:
+    :param has_next:
+    :param page:
+    :param pages_count:
+    :return:
+    """
+    randomizer = random.Random(first_id)
+    rows = []
+    for airplane_id in range(first_id, first_id + rows_count):
+        hub = randomizer.choice(AIRPORT_CODES)
+        rows.append(
+            f'<tr><td>A320 / 180 seats <img class="zoomAircraft" data-aircraftimg="/images/aircraft/a320.png">'
+            f'<span class="editAircraftName" data-url="/aircraft/show/{airplane_id}">Airplane {airplane_id}</span></td>'
+            f'<td>{hub} <img alt="Country {hub}" src="/images/flags/{hub.lower()}.png"></td>'
+            f'<td>{randomizer.randint(2000, 15000)} km</td>'
+            f'<td>{randomizer.randint(0, 100)}%</td>'
+            f'<td>{randomizer.randint(0, 100)}%</td>'
+            f'<td>{randomizer.randint(0, 30)} years</td>'
+            f'<td>{randomizer.randint(50, 500)}</td>'
+            f'<td>$ {randomizer.randint(-10**5, 10**6)}</td></tr>'
+        )
+
+    body = (
+        '<div id="content"><table class="aircraftListViewTable">'
+        '<tr><th>Model</th><th>Hub</th><th>Range</th><th>Usage</th><th>Wearing</th><th>Age</th><th>Capacity</th>'
+        f'<th>Result</th></tr>{"".join(rows)}</table>{render_pagination(has_next, page, pages_count)}</div>'
+    )
+
+    return render_page_layout(body, seed=first_id)
+
+
+def generate_line_details_page(line_id: int = 1) -> str:
+    """
+    Generates a line details page (showline)
+    :param line_id:
+    :return:
+    """
+    randomizer = random.Random(line_id)
+    origin, destination = randomizer.sample(AIRPORT_CODES, 2)
+    body = (
+        '<div id="content"><div class="lineTitle"><span>Line</span> '
+        f'{origin} / {destination}</div>'
+        '<ul id="box1"><li>Opened <b>01/01/2021</b></li><li>Hub <b>Yes</b></li><li>Category <b>4</b></li>'
+        f'<li>Origin <b>{origin} / Airport {origin}</b></li></ul>'
+        f'<ul id="box2"><li>Status <b>Open</b></li><li>Distance <b>{randomizer.randint(500, 15000)} km</b></li>'
+        f'<li>Taxes <b>$ {randomizer.randint(100, 5000)}</b></li>'
+        f'<li>Destination <b>{destination} / Airport {destination}</b></li></ul></div>'
+    )
+
+    return render_page_layout(body, seed=line_id)
+
+
+def generate_line_pricing_page(line_id: int = 1) -> str:
+    """
+    Generates a line pricing page (marketing), following the position of each field amongst the pricing div
+    descendants (which is what the parser relies on)
+    :param line_id:
+    :return:
+    """
+    randomizer = random.Random(line_id)
+    children = [f'<span>Label {index}</span>' for index in range(95)]
+    for index in [15, 17, 19, 23, 25, 27, 31, 33, 35, 39, 41, 43, 62, 71, 80, 89]:
+        children[index] = f'<span>$ {randomizer.randint(100, 10000)}</span>'
+    children[47] = '<span>01/02/2021</span>'
+    children[54] = f'<span class="reliability {randomizer.randint(1, 5)}"></span>'
+    children[92] = f'<input type="hidden" id="line__token" value="token{randomizer.randint(1, 10**6)}">'
+    children[93] = '<form action="/marketing/pricing/update"></form>'
+    children[94] = f'<input type="hidden" id="internalAuditCost" value="{randomizer.randint(1000, 90000)}">'
+
+    body = f'<div id="content"><div id="marketing_linePricing">{"".join(children)}</div></div>'
+
+    return render_page_layout(body, seed=line_id)
+
+
+def generate_card_holder_bonuses_page(bonuses_count: int = 5) -> str:
+    """
+    Generates the response of a card holder opening with the given amount of bonuses
+    :param bonuses_count:
+    :return:
+    """
+    randomizer = random.Random(bonuses_count)
+    bonuses = ''.join(
+        '<div class="showCards-card front-card"><div class="front-side-title textFill">'
+        f'<img src="/images/cards/{randomizer.choice(BONUS_IMAGES)}"> $ {randomizer.randint(1000, 10**6)}</div></div>'
+        for _ in range(bonuses_count)
+    )
+
+    return f'<div id="bonusCards-container">{bonuses}</div>'
+
+
+def generate_home_page(has_play_wheel: bool = True, countdown_seconds: int = None) -> str:
+    """
+    Generates the home page (with the Travel Cards Wheel banner if it's available, or its countdown otherwise)
+    :param has_play_wheel:
+    :param countdown_seconds:
+    :return:
+    """
+    play_wheel = '<div id="playWheel"><a href="/home/wheeltcgame">Play</a></div>' if has_play_wheel else ''
+    if not has_play_wheel and countdown_seconds:
+        play_wheel = f'<div id="timerWheel" data-countdown="{countdown_seconds}"></div>'
+
+    return render_page_layout(f'<div id="mainContent"><h1>Welcome back!</h1>{play_wheel}</div>')
+
+
+def generate_login_page(csrf_token: str = 'token') -> str:
+    """
+    Generates the login page (with the CSRF token field)
+    :param csrf_token:
+    :return:
+    """
+    return render_page_layout(
+        '<div id="content"><form action="/login_check" method="post">'
+        '<input type="email" name="_username"><input type="password" name="_password">'
+        f'<input type="hidden" name="_csrf_token" value="{csrf_token}"></form></div>'
+    )
+
+
+def generate_card_holder_page(countdown_seconds: int = None) -> str:
+    """
+    Generates the card holder shop page (with the free Card Holder countdown if it isn't available)
+    :param countdown_seconds:
+    :return:
+    """
+    countdown = f'<div id="timerFree" data-countdown="{countdown_seconds}"></div>' if countdown_seconds else ''
+
+    return render_page_layout(f'<div id="content"><div class="cardholder-title">Card Holders</div>{countdown}</div>')
+
+
+def generate_card_holder_modal_page(form_id: int = 5) -> str:
+    """
+    Generates the free Card Holder opening modal (with its form fields)
+    :param form_id:
+    :return:
+    """
+    return (
+        '<div class="modal"><form method="post">'
+        f'<input type="hidden" id="form_id" value="{form_id}">'
+        f'<input type="hidden" id="form__token" value="token{form_id}"></form></div>'
+    )
+
+
+def generate_workshop_page(items_count: int = 50) -> str:
+    """
+    Generates a workshop page with the given amount of items (one in each ten is free)
+    :param items_count:
+    :return:
+    """
+    items = ''.join(
+        f'<div class="object"><img src="/images/workshop/{index}.png"><p>Item {index}</p>'
+        f'<a class="purchaseButton useAjax" href="/shop/workshop/buy/{index}">'
+        f'{"Free" if index % 10 == 0 else f"{index * 10} AM Gold"}</a></div>'
+        for index in range(items_count)
+    )
+
+    return render_page_layout(f'<div id="content"><div class="rack">{items}</div></div>', seed=items_count)
+
+
+def anonymize_page(html_text: str, redacted_strings: List[str] = None) -> str:
+    """
+    Anonymizes a saved page before storing it as a fixture: removes the scripts and comments, blanks the hidden input
+    values and the URL query strings (tokens), masks the e-mail addresses and replaces any given string (e.g. the
+    account or airline name)
+    :param html_text:
+    :param redacted_strings:
+    :return:
+    """
+    log("Entering anonymize_page method", LogLevels.LOG_LEVEL_DEBUG)
+    html_text = re.sub(r'<script\b.*?</script>', '', html_text, flags=re.IGNORECASE | re.DOTALL)
+    html_text = re.sub(r'<!--.*?-->', '', html_text, flags=re.DOTALL)
+    html_text = re.sub(
+        r'(<input\b[^>]*type="hidden"[^>]*value=")[^"]*(")',
+        r'\1redacted\2',
+        html_text,
+        flags=re.IGNORECASE,
+    )
+    html_text = re.sub(r'((?:href|src|action)="[^"?]*)\?[^"]*(")', r'\1\2', html_text, flags=re.IGNORECASE)
+    html_text = re.sub(r'[\w.+-]+@[\w-]+\.[\w.-]+', 'player@example.com', html_text)
+
+    for redacted_string in redacted_strings or []:
+        html_text = html_text.replace(redacted_string, 'Redacted')
+
+    return html_text
+
+
+def save_fixture(extractor: str, name: str, html_text: str) -> str:
+    """
+    Stores a page as a fixture of the given extractor, retrieving its path
+    :param extractor:
+    :param name:
+    :param html_text:
+    :return:
+    """
+    log("Entering save_fixture method", LogLevels.LOG_LEVEL_DEBUG)
+    extractor_folder = os.path.join(get_fixtures_folder(), extractor)
+    ensure_folder_exists(extractor_folder)
+    fixture_filepath = os.path.join(extractor_folder, f'{name}.html')
+    save_text_to_file(html_text, fixture_filepath)
+
+    return fixture_filepath
+
+
+def load_stored_fixtures(extractor: str) -> Dict[str, str]:
+    """
+    Loads the stored pages of the given extractor, by fixture name
+    :param extractor:
+    :return:
+    """
+    extractor_folder = os.path.join(get_fixtures_folder(), extractor)
+    if not os.path.isdir(extractor_folder):
+        return {}
+
+    return {
+        os.path.splitext(filename)[0]: read_text_file(os.path.join(extractor_folder, filename))
+        for filename in sorted(os.listdir(extractor_folder))
+        if filename.endswith('.html')
+    }
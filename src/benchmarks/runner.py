@@ -0,0 +1,320 @@
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from typing import Callable, Dict, List
+
+from benchmarks.fixtures import (
+    anonymize_page,
+    generate_airplanes_page,
+    generate_card_holder_bonuses_page,
+    generate_line_details_page,
+    generate_line_pricing_page,
+    generate_lines_summary_page,
+    generate_lines_summary_pages,
+    generate_workshop_page,
+    load_stored_fixtures,
+    save_fixture,
+)
+from models.line import Line
+from modules.airplanes import parse_airplanes_page
+from modules.card_holder import parse_card_holder_bonuses
+from modules.file import read_text_file, save_dict_to_json
+from modules.lines_data import parse_basic_data, parse_marketing_data
+from modules.lines_summary import parse_lines_summary_page
+from modules.logger import log, LogLevels
+from modules.workshop import parse_workshop_items
+
+
+def parse_line_basic_data(html_text: str) -> Line:
+    """
+    Parses a line details page into a new Line object
+    :param html_text:
+    :return:
+    """
+    line = Line()
+    line.id = 1
+    parse_basic_data(line=line, html_text=html_text)
+
+    return line
+
+
+def parse_line_marketing_data(html_text: str) -> Line:
+    """
+    Parses a line pricing page into a new Line object
+    :param html_text:
+    :return:
+    """
+    line = Line()
+    line.id = 1
+    parse_marketing_data(line=line, html_text=html_text)
+
+    return line
+
+
+# Extractors benchmarked, each parsing a single page text
+EXTRACTORS: Dict[str, Callable] = {
+    'lines_summary': parse_lines_summary_page,
+    'airplanes': parse_airplanes_page,
+    'line_basic_data': parse_line_basic_data,
+    'line_marketing_data': parse_line_marketing_data,
+    'card_holder_bonuses': parse_card_holder_bonuses,
+    'workshop_items': parse_workshop_items,
+}
+
+
+class BenchmarkCase:
+    """
+    Class representing a benchmark case: an extractor run over a list of pages (a single operation parses all of them)
+    """
+    def __init__(self, extractor: str, fixture: str, pages: List[str]):
+        """
+        BenchmarkCase class constructor
+        :param extractor:
+        :param fixture:
+        :param pages:
+        """
+        self.extractor = extractor
+        self.fixture = fixture
+        self.pages = pages
+
+    @property
+    def name(self) -> str:
+        return f'{self.extractor}/{self.fixture}'
+
+    @property
+    def pages_bytes(self) -> int:
+        return sum(len(page) for page in self.pages)
+
+    def run(self) -> List:
+        """
+        Runs the extractor over all the pages of the case, retrieving their results
+        :return:
+        """
+        extractor = EXTRACTORS[self.extractor]
+
+        return [extractor(page) for page in self.pages]
+
+
+def get_benchmark_cases() -> List[BenchmarkCase]:
+    """
+    Retrieve the benchmark cases: the generated fixtures (regular pages, 500 rows tables and a whole 5,000 lines
+    account) plus the stored anonymized real pages of each extractor
+    :return:
+    """
+    cases = [
+        BenchmarkCase('lines_summary', 'generated_50_rows', [generate_lines_summary_page(rows_count=50)]),
+        BenchmarkCase('lines_summary', 'generated_500_rows', [generate_lines_summary_page(rows_count=500)]),
+        BenchmarkCase('lines_summary', 'generated_5000_lines_account', generate_lines_summary_pages(lines_count=5000)),
+        BenchmarkCase('airplanes', 'generated_50_rows', [generate_airplanes_page(rows_count=50)]),
+        BenchmarkCase('airplanes', 'generated_500_rows', [generate_airplanes_page(rows_count=500)]),
+        BenchmarkCase('line_basic_data', 'generated', [generate_line_details_page()]),
+        BenchmarkCase('line_marketing_data', 'generated', [generate_line_pricing_page()]),
+        BenchmarkCase('card_holder_bonuses', 'generated_5_bonuses', [generate_card_holder_bonuses_page(5)]),
+        BenchmarkCase('workshop_items', 'generated_50_items', [generate_workshop_page(items_count=50)]),
+        BenchmarkCase('workshop_items', 'generated_500_items', [generate_workshop_page(items_count=500)]),
+    ]
+
+    for extractor in EXTRACTORS:
+        for fixture, page in load_stored_fixtures(extractor).items():
+            cases.append(BenchmarkCase(extractor, fixture, [page]))
+
+    return cases
+
+
+def measure_case(case: BenchmarkCase, round_seconds: float, rounds: int) -> Dict:
+    """
+    Measures a benchmark case: the throughput is taken from the fastest of the rounds (each one repeating the case
+    until it takes the given time), then a single operation is traced to count the memory blocks it leaves allocated
+    (its results included) and its peak memory
+    :param case:
+    :param round_seconds:
+    :param rounds:
+    :return:
+    """
+    log(f"Measuring benchmark case {case.name}", LogLevels.LOG_LEVEL_NOTICE)
+
+    loops = 1
+    while True:
+        started_at = time.perf_counter()
+        for _ in range(loops):
+            case.run()
+        elapsed = time.perf_counter() - started_at
+        if elapsed >= round_seconds:
+            break
+        loops = max(loops * 2, int(loops * round_seconds / max(elapsed, 1e-9)))
+
+    round_durations = [elapsed]
+    for _ in range(rounds - 1):
+        started_at = time.perf_counter()
+        for _ in range(loops):
+            case.run()
+        round_durations.append(time.perf_counter() - started_at)
+
+    operation_seconds = min(round_durations) / loops
+
+    # The tracing may be already started (e.g. by the low-memory mode accounting), so it's only stopped if started here
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        snapshot_before = tracemalloc.take_snapshot()
+        started_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        results = case.run()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        snapshot_after = tracemalloc.take_snapshot()
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+    statistics = snapshot_after.compare_to(snapshot_before, 'lineno')
+    allocated_blocks = sum(statistic.count_diff for statistic in statistics if statistic.count_diff > 0)
+    del results
+
+    return {
+        'pages': len(case.pages),
+        'pages_bytes': case.pages_bytes,
+        'loops': loops,
+        'ops_per_sec': 1 / operation_seconds,
+        'seconds_per_op': operation_seconds,
+        'allocated_blocks': allocated_blocks,
+        'peak_bytes': peak_memory - started_memory,
+    }
+
+
+def run_benchmarks(name_filter: str = None) -> Dict:
+    """
+    Runs the benchmark cases (only the ones containing the given filter in their names, if any)
+    :param name_filter:
+    :return:
+    """
+    log("Entering run_benchmarks method", LogLevels.LOG_LEVEL_DEBUG)
+    round_seconds = float(os.getenv('BENCHMARK_ROUND_SECONDS', 0.2))
+    rounds = int(os.getenv('BENCHMARK_ROUNDS', 5))
+
+    results = {}
+    for case in get_benchmark_cases():
+        if name_filter is not None and name_filter not in case.name:
+            continue
+
+        results[case.name] = measure_case(case=case, round_seconds=round_seconds, rounds=rounds)
+
+    return {
+        'created_at': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'results': results,
+    }
+
+
+def find_benchmark_regressions(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Retrieve the regressions of a benchmark report against the baseline one: the cases slower than the baseline or
+    using more memory than it by more than the threshold
+    :param report:
+    :param baseline:
+    :param threshold:
+    :return:
+    """
+    regressions = []
+    for name, result in report['results'].items():
+        if name not in baseline['results']:
+            continue
+
+        baseline_result = baseline['results'][name]
+        if result['ops_per_sec'] < baseline_result['ops_per_sec'] * (1 - threshold):
+            decrease = (1 - result['ops_per_sec'] / baseline_result['ops_per_sec']) * 100
+            regressions.append(f"{name}: {decrease:.0f}% slower")
+
+        for field in ['allocated_blocks', 'peak_bytes']:
+            if result[field] > baseline_result[field] * (1 + threshold):
+                increase = (result[field] / baseline_result[field] - 1) * 100 if baseline_result[field] > 0 else 100
+                regressions.append(f"{name}: {field.replace('_', ' ')} +{increase:.0f}%")
+
+    return regressions
+
+
+def print_benchmark_report(report: Dict, baseline: Dict = None):
+    """
+    Prints the results of a benchmark report (with the throughput change against the baseline, if given)
+    :param report:
+    :param baseline:
+    :return:
+    """
+    print(f"{'Case':<50} {'Ops/sec':>10} {'ms/op':>9} {'Blocks':>9} {'Peak KiB':>10} {'Baseline':>9}")
+    for name, result in report['results'].items():
+        change = '-'
+        if baseline is not None and name in baseline['results']:
+            change = f"{(result['ops_per_sec'] / baseline['results'][name]['ops_per_sec'] - 1) * 100:+.0f}%"
+
+        print(
+            f"{name:<50} {result['ops_per_sec']:>10.1f} {result['seconds_per_op'] * 1000:>9.2f} "
+            f"{result['allocated_blocks']:>9} {result['peak_bytes'] / 1024:>10.0f} {change:>9}"
+        )
+
+
+def load_benchmark_report(filepath: str) -> Dict:
+    """
+    Loads a benchmark report from a JSON file (None if not found)
+    :param filepath:
+    :return:
+    """
+    if not os.path.isfile(filepath):
+        return None
+
+    return json.loads(read_text_file(filepath))
+
+
+def execute_benchmark_command(arguments: List):
+    """
+    Executes a benchmark CLI command: 'run [filter]' (exits with an error if a case regressed against the baseline),
+    'save-baseline' (stores the last results as the baseline) or 'import <extractor> <filepath> [redacted strings]'
+    (anonymizes a saved page and stores it as a fixture)
+    :param arguments:
+    :return:
+    """
+    log("Entering execute_benchmark_command method", LogLevels.LOG_LEVEL_DEBUG)
+    results_filepath = os.getenv('BENCHMARK_RESULTS_FILEPATH', '/data/benchmarks/results.json')
+    baseline_filepath = os.getenv('BENCHMARK_BASELINE_FILEPATH', '/data/benchmarks/baseline.json')
+
+    if len(arguments) == 0 or (arguments[0] == 'run' and len(arguments) <= 2):
+        report = run_benchmarks(name_filter=arguments[1] if len(arguments) == 2 else None)
+        save_dict_to_json(report, results_filepath)
+        baseline = load_benchmark_report(baseline_filepath)
+        print_benchmark_report(report=report, baseline=baseline)
+        log(f"Benchmark results saved to {results_filepath}")
+
+        if baseline is None:
+            log(f"No benchmark baseline found on {baseline_filepath}", LogLevels.LOG_LEVEL_WARNING)
+            return
+
+        threshold = float(os.getenv('BENCHMARK_REGRESSION_THRESHOLD', 0.25))
+        regressions = find_benchmark_regressions(report=report, baseline=baseline, threshold=threshold)
+        for regression in regressions:
+            log(f"Benchmark regression: {regression}", LogLevels.LOG_LEVEL_ERROR)
+        if len(regressions) > 0:
+            sys.exit(1)
+        return
+
+    if arguments == ['save-baseline']:
+        report = load_benchmark_report(results_filepath)
+        if report is None:
+            log(f"No benchmark results found on {results_filepath}", LogLevels.LOG_LEVEL_ERROR)
+            return
+
+        save_dict_to_json(report, baseline_filepath)
+        log(f"Benchmark baseline saved to {baseline_filepath}")
+        return
+
+    if arguments[0] == 'import' and len(arguments) >= 3 and arguments[1] in EXTRACTORS:
+        html_text = anonymize_page(read_text_file(arguments[2]), redacted_strings=arguments[3:])
+        fixture_name = os.path.splitext(os.path.basename(arguments[2]))[0]
+        fixture_filepath = save_fixture(extractor=arguments[1], name=fixture_name, html_text=html_text)
+        log(f"Stored the anonymized page as the fixture {fixture_filepath}")
+        return
+
+    log("Unknown benchmark command ['{}']!".format("','".join(arguments)), LogLevels.LOG_LEVEL_ERROR)
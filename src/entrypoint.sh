@@ -4,5 +4,12 @@ echo "-=-=- Airlines Manager Bot -=-=-"
 echo "Start the tasks manually by running:"
 echo "    docker exec -it airlines-manager-bot python3 main.py"
 
+# The sources are mounted (and PYTHONDONTWRITEBYTECODE is set), so their bytecode is only cached if a folder outside
+# of them is set in PYTHONPYCACHEPREFIX: it's compiled there once, and the later commands just read it
+if [ -n "$PYTHONPYCACHEPREFIX" ]; then
+  echo "Compiling the bytecode cache to $PYTHONPYCACHEPREFIX..."
+  python3 main.py --precompile
+fi
+
 echo "Executing main script!"
 python3 main.py
@@ -0,0 +1,318 @@
+import collections
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.fixtures import (
+    generate_airplanes_page,
+    generate_card_holder_bonuses_page,
+    generate_card_holder_modal_page,
+    generate_card_holder_page,
+    generate_home_page,
+    generate_line_details_page,
+    generate_line_pricing_page,
+    generate_lines_summary_page,
+    generate_login_page,
+    generate_workshop_page,
+)
+from modules.logger import log, LogLevels
+from modules.metrics import get_endpoint_pattern
+
+SESSION_COOKIE = 'PHPSESSID=stand-in-session'
+
+# Markers the parsers rely on, renamed when the layout drifts (as the game does on its redesigns)
+LAYOUT_DRIFT_REPLACEMENTS = {
+    'id="displayPro"': 'id="displayProList"',
+    'class="aircraftListViewTable"': 'class="aircraftList"',
+    'id="content"': 'id="pageContent"',
+    'id="marketing_linePricing"': 'id="marketing_pricing"',
+    'class="rack"': 'class="shelf"',
+    'id="bonusCards-container"': 'id="bonusCards"',
+    'class="cardholder-title"': 'class="cardholder-header"',
+    'id="mainContent"': 'id="main"',
+}
+
+
+class StandInSettings:
+    """
+    Settings of the stand-in server (the account size and the faults injected), read from the environment
+    """
+    def __init__(self):
+        """
+        StandInSettings class constructor
+        """
+        self.lines_count = int(os.getenv('LOADTEST_LINES', 10000))
+        self.airplanes_count = int(os.getenv('LOADTEST_AIRPLANES', 3000))
+        self.rows_per_page = int(os.getenv('LOADTEST_ROWS_PER_PAGE', 100))
+        self.workshop_items = int(os.getenv('LOADTEST_WORKSHOP_ITEMS', 50))
+        self.latency_ms = float(os.getenv('LOADTEST_LATENCY_MS', 0))
+        self.latency_jitter_ms = float(os.getenv('LOADTEST_LATENCY_JITTER_MS', 0))
+        self.error_rate = float(os.getenv('LOADTEST_ERROR_RATE', 0))
+        self.drift_rate = float(os.getenv('LOADTEST_DRIFT_RATE', 0))
+        self.seed = int(os.getenv('LOADTEST_SEED', 42))
+
+    def serialize(self) -> Dict:
+        return dict(vars(self))
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the stand-in server requests, generating pages with the same DOM structure the modules parse, for an
+    account of the configured size. Each response may be delayed, fail (503) or have its layout drifted, following the
+    configured rates. Only the home page checks the session cookie (as it's how the bot checks its session).
+
+    GET  /login                                login page (CSRF token)
+    POST /login_check                          sets the session cookie
+    GET  /home                                 home page (Travel Cards Wheel banner or countdown)
+    GET  /home/wheeltcgame/play                Travel Cards Wheel spin result (JSON)
+    GET  /network/?page=N                      lines results page
+    GET  /network/showline/<id>                line details
+    GET  /marketing/pricing/<id>               line pricing (POST to update the prices)
+    GET  /marketing/internalaudit/line/<id>    line audit (redirects back to the pricing)
+    GET  /aircraft?page=N                      airplanes results page
+    GET  /shop/workshop                        workshop items (POST /shop/workshop/buy/<n> to buy one)
+    GET  /shop/cardholder                      card holder shop
+    GET  /shop/buycards/...                    free Card Holder modal (POST to open it)
+    GET  /__stats                              requests served by the stand-in server (JSON)
+    """
+    def do_GET(self):
+        self.handle_game_request(method='GET')
+
+    def do_POST(self):
+        self.handle_game_request(method='POST')
+
+    def handle_game_request(self, method: str):
+        """
+        Serves a game request, injecting the configured latency and faults
+        :param method:
+        :return:
+        """
+        url = urlparse(self.path)
+        if url.path == '/__stats':
+            self.send_body(200, json.dumps(self.server.get_stats()), content_type='application/json')
+            return
+
+        body_length = int(self.headers.get('Content-Length') or 0)
+        if body_length > 0:
+            self.rfile.read(body_length)
+
+        settings = self.server.settings
+        randomizer = self.server.randomizer
+        with self.server.lock:
+            delay_ms = max(0.0, settings.latency_ms + randomizer.uniform(-1, 1) * settings.latency_jitter_ms)
+            is_failing = randomizer.random() < settings.error_rate
+            is_drifted = randomizer.random() < settings.drift_rate
+
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+        if is_failing:
+            self.server.record_request(method, url.path, 503)
+            self.send_body(503, '<html><body><h1>Service Unavailable</h1></body></html>')
+            return
+
+        status, body, headers = self.route(method=method, path=url.path, query=parse_qs(url.query))
+        if is_drifted and status == 200:
+            for marker, drifted_marker in LAYOUT_DRIFT_REPLACEMENTS.items():
+                body = body.replace(marker, drifted_marker)
+
+        self.server.record_request(method, url.path, status)
+        self.send_body(status, body, headers=headers)
+
+    def route(self, method: str, path: str, query: Dict) -> Tuple:
+        """
+        Retrieve the response (status, body and extra headers) of a game page
+        :param method:
+        :param path:
+        :param query:
+        :return:
+        """
+        settings = self.server.settings
+        page = int(query.get('page', ['1'])[0])
+
+        if path == '/login':
+            return 200, generate_login_page(), {}
+
+        if path == '/login_check' and method == 'POST':
+            return 302, '', {'Location': '/home', 'Set-Cookie': f'{SESSION_COOKIE}; Path=/'}
+
+        if path == '/home':
+            if SESSION_COOKIE not in (self.headers.get('Cookie') or ''):
+                return 302, '', {'Location': '/login'}
+
+            return 200, generate_home_page(
+                has_play_wheel=self.server.randomizer.random() < 0.5,
+                countdown_seconds=self.server.randomizer.choice([None, 3600]),
+            ), {}
+
+        if path == '/home/wheeltcgame/play':
+            return 200, json.dumps({
+                'nbOfTravelCards': 12,
+                'gain': 2,
+                'multiplierBonus': 1.5,
+                'indexScore': 3,
+                'isAllowToPlay': False,
+            }), {}
+
+        if path == '/network/':
+            first_row = (page - 1) * settings.rows_per_page
+            rows_count = max(0, min(settings.rows_per_page, settings.lines_count - first_row))
+            has_next = first_row + settings.rows_per_page < settings.lines_count
+            pages_count = max(1, math.ceil(settings.lines_count / settings.rows_per_page))
+            return 200, generate_lines_summary_page(
+                rows_count, first_id=first_row + 1, has_next=has_next, page=page, pages_count=pages_count,
+            ), {}
+
+        if path == '/aircraft':
+            first_row = (page - 1) * settings.rows_per_page
+            rows_count = max(0, min(settings.rows_per_page, settings.airplanes_count - first_row))
+            has_next = first_row + settings.rows_per_page < settings.airplanes_count
+            pages_count = max(1, math.ceil(settings.airplanes_count / settings.rows_per_page))
+            return 200, generate_airplanes_page(
+                rows_count, first_id=first_row + 1, has_next=has_next, page=page, pages_count=pages_count,
+            ), {}
+
+        line_match = re.fullmatch(r'/(network/showline|marketing/pricing|marketing/internalaudit/line)/(\d+)/?', path)
+        if line_match is not None:
+            line_id = int(line_match.group(2))
+            if not 1 <= line_id <= settings.lines_count:
+                return 404, '<html><body><h1>Not Found</h1></body></html>', {}
+
+            if line_match.group(1) == 'network/showline':
+                return 200, generate_line_details_page(line_id), {}
+
+            if line_match.group(1) == 'marketing/internalaudit/line':
+                return 302, '', {'Location': f'/marketing/pricing/{line_id}'}
+
+            return 200, generate_line_pricing_page(line_id), {}
+
+        if path == '/shop/workshop':
+            return 200, generate_workshop_page(items_count=settings.workshop_items), {}
+
+        if path.startswith('/shop/workshop/buy/') and method == 'POST':
+            return 302, '', {'Location': '/shop/workshop'}
+
+        if path == '/shop/cardholder':
+            countdown_seconds = self.server.randomizer.choice([None, 3600])
+            return 200, generate_card_holder_page(countdown_seconds=countdown_seconds), {}
+
+        if path.startswith('/shop/buycards/'):
+            if method == 'POST':
+                return 200, generate_card_holder_bonuses_page(bonuses_count=5), {}
+
+            return 200, generate_card_holder_modal_page(), {}
+
+        return 404, '<html><body><h1>Not Found</h1></body></html>', {}
+
+    def send_body(self, status: int, body: str, headers: Dict = None, content_type: str = 'text/html; charset=UTF-8'):
+        """
+        Sends a response
+        :param status:
+        :param body:
+        :param headers:
+        :param content_type:
+        :return:
+        """
+        response = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(response)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        log(f"Stand-in server: {format % args}", LogLevels.LOG_LEVEL_DEBUG)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Stand-in Airlines Manager server, counting the requests it serves by endpoint
+    """
+    daemon_threads = True
+
+    def __init__(self, address: tuple, settings: StandInSettings):
+        """
+        StandInServer class constructor
+        :param address:
+        :param settings:
+        """
+        super(StandInServer, self).__init__(address, StandInRequestHandler)
+        self.settings = settings
+        self.randomizer = random.Random(settings.seed)
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self._requests = collections.Counter()
+
+    def record_request(self, method: str, path: str, status: int):
+        """
+        Counts a request served
+        :param method:
+        :param path:
+        :param status:
+        :return:
+        """
+        with self.lock:
+            self._requests[(method, get_endpoint_pattern(path), status)] += 1
+
+    def get_stats(self) -> Dict:
+        """
+        Retrieve the requests served so far by endpoint (with the server settings)
+        :return:
+        """
+        with self.lock:
+            requests = [
+                {'method': method, 'endpoint': endpoint, 'status': status, 'count': count}
+                for (method, endpoint, status), count in sorted(self._requests.items())
+            ]
+
+        return {
+            'uptime_seconds': time.time() - self.started_at,
+            'total_requests': sum(request['count'] for request in requests),
+            'requests': requests,
+            'settings': self.settings.serialize(),
+        }
+
+
+def start_stand_in_server(host: str = None, port: int = None) -> StandInServer:
+    """
+    Starts serving the stand-in server on a background thread (the port is chosen by the system if it's 0)
+    :param host:
+    :param port:
+    :return:
+    """
+    log("Entering start_stand_in_server method", LogLevels.LOG_LEVEL_DEBUG)
+    host = host if host is not None else os.getenv('LOADTEST_HOST', '127.0.0.1')
+    port = port if port is not None else int(os.getenv('LOADTEST_PORT', 8800))
+
+    server = StandInServer((host, port), StandInSettings())
+    threading.Thread(target=server.serve_forever, name='stand-in-server', daemon=True).start()
+    log(f"Stand-in server listening on http://{host}:{server.server_address[1]} (point AM_BASE_URL to it)")
+
+    return server
+
+
+def execute_stand_in_server_command(arguments: List):
+    """
+    Runs the stand-in server until interrupted (the port may be given in the arguments)
+    :param arguments:
+    :return:
+    """
+    log("Entering execute_stand_in_server_command method", LogLevels.LOG_LEVEL_DEBUG)
+    server = start_stand_in_server(port=int(arguments[0]) if len(arguments) > 0 else None)
+    log(f"Serving an account with {server.settings.lines_count} lines and {server.settings.airplanes_count} airplanes")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        log(f"Stand-in server stopped after serving {server.get_stats()['total_requests']} requests")
+        server.shutdown()
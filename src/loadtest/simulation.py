@@ -0,0 +1,145 @@
+import collections
+import datetime
+import os
+import tempfile
+import time
+
+from typing import Dict, List
+
+from loadtest.server import StandInServer, start_stand_in_server
+from modules.accounts import ACCOUNT_DATA_PATH_VARIABLES
+from modules.clock import SimulatedClock, set_clock
+from modules.cycle import execute_tasks, wait_next_cycle
+from modules.logger import log, LogLevels
+from modules.scheduler import TaskScheduler, build_default_tasks
+from modules.session_manager import SessionManager
+
+
+class SimulationModes:
+    """
+    Enum class for the bot execution modes that can be simulated
+    """
+    DAEMON = 'daemon'
+    LOOP = 'loop'
+
+
+def prepare_simulation_environment(data_folder: str, base_url: str):
+    """
+    Points the data paths to the given folder (so the simulation doesn't touch the real data) and the game base URL
+    to the stand-in server
+    :param data_folder:
+    :param base_url:
+    :return:
+    """
+    log("Entering prepare_simulation_environment method", LogLevels.LOG_LEVEL_DEBUG)
+    for variable, default_path in ACCOUNT_DATA_PATH_VARIABLES.items():
+        os.environ[variable] = os.path.join(data_folder, os.path.relpath(default_path, '/data'))
+
+    os.environ['REQUEST_PACER_STATE_FILEPATH'] = ''
+    os.environ['METRICS_TEXTFILE_PATH'] = ''
+    os.environ['AM_BASE_URL'] = base_url
+    os.environ['AM_USER_EMAIL'] = 'player@example.com'
+    os.environ['AM_USER_PASSWORD'] = 'simulation'
+
+
+def simulate_daemon(clock: SimulatedClock, duration: float) -> Dict:
+    """
+    Runs the daemon scheduler until the simulated duration (in seconds) elapses, retrieving the runs of each task
+    :param clock:
+    :param duration:
+    :return:
+    """
+    log("Entering simulate_daemon method", LogLevels.LOG_LEVEL_DEBUG)
+    scheduler = TaskScheduler(session_manager=SessionManager(), tasks=build_default_tasks())
+    task_runs = collections.Counter()
+    while clock.get_elapsed_seconds() < duration:
+        task = scheduler.run_next()
+        if task is not None:
+            task_runs[task.name] += 1
+
+    return dict(task_runs)
+
+
+def simulate_loop(clock: SimulatedClock, duration: float) -> Dict:
+    """
+    Runs the main tasks cycles (as the infinite loop does) until the simulated duration (in seconds) elapses,
+    retrieving the amount of cycles
+    :param clock:
+    :param duration:
+    :return:
+    """
+    log("Entering simulate_loop method", LogLevels.LOG_LEVEL_DEBUG)
+    cycles = 0
+    session_manager = SessionManager()
+    while clock.get_elapsed_seconds() < duration:
+        try:
+            execute_tasks(session_manager=session_manager)
+        except ReferenceError:
+            log("An error occurred when parsing a page, the failed work will be retried", LogLevels.LOG_LEVEL_ERROR)
+        cycles += 1
+
+        wait_next_cycle(
+            wait_time_min=int(os.getenv('WAIT_TIME_MIN', 60*60*5)),
+            wait_time_max=int(os.getenv('WAIT_TIME_MAX', 60*60*8)),
+            session_manager=session_manager,
+        )
+
+    return {'cycles': cycles}
+
+
+def print_simulation_report(clock: SimulatedClock, server: StandInServer, runs: Dict, wall_seconds: float):
+    """
+    Prints the report of a simulation: the simulated and wall times, the runs and the requests served by endpoint
+    :param clock:
+    :param server:
+    :param runs:
+    :param wall_seconds:
+    :return:
+    """
+    elapsed_seconds = clock.get_elapsed_seconds()
+    stats = server.get_stats()
+
+    print(f"Simulated {datetime.timedelta(seconds=round(elapsed_seconds))} in {wall_seconds:.1f} seconds of wall time "
+          f"({elapsed_seconds / max(wall_seconds, 1e-6):.0f}x)")
+    print(f"Simulated time slept: {datetime.timedelta(seconds=round(clock.slept_seconds))}")
+    for name, count in sorted(runs.items()):
+        print(f"  {name:<24} {count:>8} run(s)")
+
+    requests_per_day = stats['total_requests'] / max(elapsed_seconds / 86400, 1e-6)
+    print(f"Requests served: {stats['total_requests']} ({requests_per_day:.0f} per simulated day)")
+    for request in stats['requests']:
+        print(f"  {request['method']:<5} {request['endpoint']:<40} {request['status']:>4} {request['count']:>8}")
+
+
+def execute_simulation_command(arguments: List):
+    """
+    Replays the bot behavior for the given amount of days (7 by default) on a simulated clock against an in-process
+    stand-in server, in the daemon (default) or loop mode: 'simulate [days] [daemon|loop]'
+    :param arguments:
+    :return:
+    """
+    log("Entering execute_simulation_command method", LogLevels.LOG_LEVEL_DEBUG)
+    days = float(arguments[0]) if len(arguments) > 0 else 7
+    mode = arguments[1] if len(arguments) > 1 else SimulationModes.DAEMON
+    if mode not in [SimulationModes.DAEMON, SimulationModes.LOOP]:
+        log(f"Unknown simulation mode '{mode}'!", LogLevels.LOG_LEVEL_ERROR)
+        return
+
+    server = start_stand_in_server(port=0)
+    data_folder = os.getenv('SIMULATION_DATA_FOLDER') or tempfile.mkdtemp(prefix='am-simulation-')
+    prepare_simulation_environment(
+        data_folder=data_folder,
+        base_url=f'http://{server.server_address[0]}:{server.server_address[1]}',
+    )
+    log(f"Simulating {days} day(s) in {mode} mode (data saved to {data_folder})")
+
+    clock = SimulatedClock()
+    set_clock(clock)
+    started_at = time.perf_counter()
+    if mode == SimulationModes.DAEMON:
+        runs = simulate_daemon(clock=clock, duration=days * 86400)
+    else:
+        runs = simulate_loop(clock=clock, duration=days * 86400)
+
+    print_simulation_report(clock=clock, server=server, runs=runs, wall_seconds=time.perf_counter() - started_at)
+    server.shutdown()
@@ -1,6 +1,6 @@
-import sys
-
-from modules.cli import execute_from_arguments
-
-if __name__ == "__main__":
-    execute_from_arguments(sys.argv[1:])
+import sys
+
+from modules.cli import execute_from_arguments
+
+if __name__ == "__main__":
+    execute_from_arguments(sys.argv[1:])
@@ -1,89 +1,252 @@
-import json
-import os
-
-from typing import Dict
-
-from models.base_model import BaseModel
-from modules.file import read_text_file, save_dict_to_json
-from modules.logger import log, LogLevels
-
-
-class Airport(BaseModel):
-    """
-    Model class representing the Airport resource
-    """
-    abbrev = None
-    name = None
-
-    serializable_fields = ['abbrev', 'name']
-
-    def __init__(self, **kwargs):
-        """
-        Airport class constructor
-        :param kwargs:
-        """
-        log("Instantiating Airport class", LogLevels.LOG_LEVEL_DEBUG)
-        super(Airport, self).__init__(**kwargs)
-
-        if 'id' in kwargs:
-            self.load_from_file()
-
-    def __str__(self):
-        """
-        Overrides the original string conversion method to add more information
-        :return:
-        """
-        log("Entering Airport.__str__ method", LogLevels.LOG_LEVEL_DEBUG)
-
-        return '{} - {}'.format(self.abbrev, self.name)
-
-    def load_from_file(self):
-        """
-        Load the resource from a file stored locally
-        :return:
-        """
-        log("Entering Airport.load_from_file method", LogLevels.LOG_LEVEL_DEBUG),
-
-        if self.abbrev is None:
-            raise ValueError("Cannot load airport from file without abbrev!")
-
-        filepath = os.path.join(os.environ['AIRPORTS_OBJECTS_FOLDER'], f'{self.abbrev}.json')
-        if not os.path.isfile(filepath):
-            log(
-                f"Skipping the load process of airport {self.abbrev} as the file {filepath} was not found.",
-                level=LogLevels.LOG_LEVEL_WARNING,
-            )
-            return self
-
-        line_json = json.loads(read_text_file(filepath=filepath))
-        self.unserialize(line_json)
-
-        return self
-
-    def persist_to_file(self):
-        """
-        Persist the resource to a file stored locally
-        :return:
-        """
-        log("Entering Airport.persist_to_file method", LogLevels.LOG_LEVEL_DEBUG)
-
-        if self.abbrev is None:
-            raise ValueError("Cannot persist airport to file without abbrev!")
-
-        filepath = os.path.join(os.environ['AIRPORTS_OBJECTS_FOLDER'], f'{self.abbrev}.json')
-        save_dict_to_json(input_dict=self.serialize(), output_filepath=filepath)
-        log(f"Persisted airport {self.abbrev} to file {filepath}!", LogLevels.LOG_LEVEL_DEBUG)
-
-
-def create_airport_from_dict(data_dict: Dict) -> Airport:
-    """
-    Factory method to create a Airport model from a given dict
-    :param data_dict:
-    :return:
-    """
-    log("Entering create_airport_from_dict method", LogLevels.LOG_LEVEL_DEBUG)
-
-    airport = Airport()
-    airport.unserialize(data_dict)
-
-    return airport
+import json
+import os
+
+from typing import Dict, List, Optional
+
+from models.base_model import BaseModel
+from modules.file import FileLock, read_text_file, save_dict_to_json
+from modules.logger import log, LogLevels
+
+
+class Airport(BaseModel):
+    """
+    Model class representing the Airport resource
+    """
+    abbrev = None
+    name = None
+
+    serializable_fields = ['abbrev', 'name']
+
+    def __init__(self, **kwargs):
+        """
+        Airport class constructor
+        :param kwargs:
+        """
+        log("Instantiating Airport class", LogLevels.LOG_LEVEL_DEBUG)
+        super(Airport, self).__init__(**kwargs)
+
+        if 'id' in kwargs:
+            self.load_from_file()
+
+    def __str__(self):
+        """
+        Overrides the original string conversion method to add more information
+        :return:
+        """
+        log("Entering Airport.__str__ method", LogLevels.LOG_LEVEL_DEBUG)
+
+        return '{} - {}'.format(self.abbrev, self.name)
+
+    def load_from_file(self):
+        """
+        Load the resource from the airports registry file stored locally
+        :return:
+        """
+        log("Entering Airport.load_from_file method", LogLevels.LOG_LEVEL_DEBUG),
+
+        if self.abbrev is None:
+            raise ValueError("Cannot load airport from file without abbrev!")
+
+        registered_airport = get_airport_registry().get(self.abbrev)
+        if registered_airport is None:
+            log(
+                f"Skipping the load process of airport {self.abbrev} as it was not found in the registry.",
+                level=LogLevels.LOG_LEVEL_WARNING,
+            )
+            return self
+
+        self.unserialize(registered_airport.serialize())
+
+        return self
+
+    def persist_to_file(self):
+        """
+        Persist the resource to the airports registry file stored locally
+        :return:
+        """
+        log("Entering Airport.persist_to_file method", LogLevels.LOG_LEVEL_DEBUG)
+
+        if self.abbrev is None:
+            raise ValueError("Cannot persist airport to file without abbrev!")
+
+        registry = get_airport_registry()
+        registry.intern(self.serialize())
+        registry.persist_to_file()
+        log(f"Persisted airport {self.abbrev} to the registry!", LogLevels.LOG_LEVEL_DEBUG)
+
+
+class AirportRegistry:
+    """
+    Registry holding a single Airport instance per IATA code (abbrev), persisted as a whole in one file and indexing
+    the lines touching each airport
+    """
+    def __init__(self, filepath: str):
+        """
+        AirportRegistry class constructor
+        :param filepath:
+        """
+        log("Instantiating AirportRegistry class", LogLevels.LOG_LEVEL_DEBUG)
+        self.filepath = filepath
+        self.is_dirty = False
+        self._airports: Dict[str, Airport] = {}
+        self._lines_index: Dict[str, set] = {}
+
+    def __len__(self):
+        return len(self._airports)
+
+    def get(self, abbrev: str) -> Optional[Airport]:
+        """
+        Retrieve the airport registered with the given IATA code (None if not registered)
+        :param abbrev:
+        :return:
+        """
+        return self._airports.get(abbrev)
+
+    def intern(self, data_dict: Dict) -> Airport:
+        """
+        Retrieve the registered airport for the abbrev in the given dict, registering it if not present yet (the
+        registered instance is updated with the dict values)
+        :param data_dict:
+        :return:
+        """
+        abbrev = data_dict.get('abbrev')
+        if abbrev is None:
+            raise ValueError("Cannot register airport without abbrev!")
+
+        airport = self._airports.get(abbrev)
+        if airport is None:
+            airport = Airport()
+            airport.unserialize(data_dict)
+            self._airports[abbrev] = airport
+            self.is_dirty = True
+            return airport
+
+        if any(getattr(airport, field) != value for field, value in data_dict.items()):
+            airport.unserialize(data_dict)
+            self.is_dirty = True
+
+        return airport
+
+    def index_line(self, line_id: int, *airports: Airport):
+        """
+        Register a line in the index of each of the given airports
+        :param line_id:
+        :param airports:
+        :return:
+        """
+        for airport in airports:
+            if airport is None or line_id is None:
+                continue
+
+            line_ids = self._lines_index.setdefault(airport.abbrev, set())
+            if line_id not in line_ids:
+                line_ids.add(line_id)
+                self.is_dirty = True
+
+    def get_line_ids(self, abbrev: str) -> List[int]:
+        """
+        Retrieve the IDs of the lines touching a given airport (as origin or destination)
+        :param abbrev:
+        :return:
+        """
+        return sorted(self._lines_index.get(abbrev, set()))
+
+    def get_hubs(self) -> List[Airport]:
+        """
+        Retrieve the registered airports sorted by the amount of lines touching them (busiest first)
+        :return:
+        """
+        return sorted(
+            self._airports.values(),
+            key=lambda airport: len(self._lines_index.get(airport.abbrev, set())),
+            reverse=True,
+        )
+
+    def serialize(self) -> Dict:
+        """
+        Writes the registry as a dict
+        :return:
+        """
+        return {
+            'airports': [airport.serialize() for airport in self._airports.values()],
+            'lines_index': {abbrev: sorted(line_ids) for abbrev, line_ids in self._lines_index.items()},
+        }
+
+    def load_from_file(self):
+        """
+        Load the registry from the file stored locally
+        :return:
+        """
+        log("Entering AirportRegistry.load_from_file method", LogLevels.LOG_LEVEL_DEBUG)
+
+        if not os.path.isfile(self.filepath):
+            log(f"Airports registry file {self.filepath} not found, starting empty.", LogLevels.LOG_LEVEL_NOTICE)
+            return self
+
+        self.merge_from_file()
+        self.is_dirty = False
+        log(f"Loaded {len(self)} airports from registry file {self.filepath}", LogLevels.LOG_LEVEL_NOTICE)
+
+        return self
+
+    def merge_from_file(self):
+        """
+        Merge the registry file stored locally into the registry (the airports not registered yet are added and the
+        lines indexes are joined)
+        :return:
+        """
+        registry_json = json.loads(read_text_file(filepath=self.filepath))
+        for airport_dict in registry_json.get('airports', []):
+            if airport_dict.get('abbrev') not in self._airports:
+                self.intern(airport_dict)
+
+        for abbrev, line_ids in registry_json.get('lines_index', {}).items():
+            self._lines_index.setdefault(abbrev, set()).update(line_ids)
+
+    def persist_to_file(self, force: bool = False):
+        """
+        Persist the registry to the file stored locally (only if it has changed, unless forced)
+        :param force:
+        :return:
+        """
+        log("Entering AirportRegistry.persist_to_file method", LogLevels.LOG_LEVEL_DEBUG)
+
+        if not self.is_dirty and not force:
+            return
+
+        # Locked and merged, as the registry file may be shared with other processes (e.g. the work queue workers)
+        with FileLock(self.filepath):
+            if os.path.isfile(self.filepath):
+                self.merge_from_file()
+            save_dict_to_json(input_dict=self.serialize(), output_filepath=self.filepath)
+
+        self.is_dirty = False
+        log(f"Persisted {len(self)} airports to registry file {self.filepath}!", LogLevels.LOG_LEVEL_DEBUG)
+
+
+_airport_registry: Optional[AirportRegistry] = None
+
+
+def get_airport_registry() -> AirportRegistry:
+    """
+    Retrieve the process-wide airports registry (loaded from the file on the first call)
+    :return:
+    """
+    global _airport_registry
+
+    if _airport_registry is None:
+        registry_filepath = os.getenv('AIRPORTS_REGISTRY_FILEPATH', '/data/models/airports.json')
+        _airport_registry = AirportRegistry(filepath=registry_filepath).load_from_file()
+
+    return _airport_registry
+
+
+def create_airport_from_dict(data_dict: Dict) -> Airport:
+    """
+    Factory method to retrieve the (interned) Airport model from a given dict
+    :param data_dict:
+    :return:
+    """
+    log("Entering create_airport_from_dict method", LogLevels.LOG_LEVEL_DEBUG)
+
+    return get_airport_registry().intern(data_dict)
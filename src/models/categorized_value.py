@@ -1,38 +1,311 @@
-from models.base_model import BaseModel
-from modules.logger import log, LogLevels
-
-
-class CategorizedValue(BaseModel):
-    """
-    Model class (to be inherited) representing a CategorizedValue resource
-    """
-    economic = 0
-    executive = 0
-    first_class = 0
-    cargo = 0
-
-    serializable_fields = ['economic', 'executive', 'first_class', 'cargo']
-
-    def __str__(self):
-        """
-        Overrides the original string conversion method to retrieve the total sum of internal values instead
-        :return:
-        """
-        log("Entering CategorizedValue.__str__ method", LogLevels.LOG_LEVEL_DEBUG)
-
-        return '{}'.format(self.economic + self.executive + self.first_class + self.cargo)
-
-    def __eq__(self, other: "CategorizedValue"):
-        """
-        Overrides the original comparison method to compare by checking each group difference
-        :param other:
-        :return:
-        """
-        log("Entering CategorizedValue.__eq__ method", LogLevels.LOG_LEVEL_DEBUG)
-
-        economic_diff = abs(self.economic - other.economic)
-        executive_diff = abs(self.executive - other.executive)
-        first_class_diff = abs(self.first_class - other.first_class)
-        cargo_diff = abs(self.cargo - other.cargo)
-
-        return (economic_diff + executive_diff + first_class_diff + cargo_diff) == 0
+import math
+
+from array import array
+from typing import Iterable, List, Optional, Tuple
+
+from models.base_model import BaseModel
+from modules.logger import log, LogLevels
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CATEGORIES = ['economic', 'executive', 'first_class', 'cargo']
+CATEGORIES_COUNT = len(CATEGORIES)
+
+
+class CategorizedField:
+    """
+    Descriptor for a single category of a CategorizedValue, reading from the backing table when the value is a view
+    """
+    def __init__(self, index: int):
+        """
+        CategorizedField descriptor constructor
+        :param index:
+        """
+        self.index = index
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        if instance._table is not None:
+            return instance._table.get(instance._row, self.index)
+
+        return instance._values[self.index]
+
+    def __set__(self, instance, value):
+        if instance._table is not None:
+            instance._table.set(instance._row, self.index, value)
+            return
+
+        instance._values[self.index] = value
+
+
+class CategorizedValue(BaseModel):
+    """
+    Model class (to be inherited) representing a CategorizedValue resource
+    """
+    economic = CategorizedField(0)
+    executive = CategorizedField(1)
+    first_class = CategorizedField(2)
+    cargo = CategorizedField(3)
+
+    serializable_fields = CATEGORIES
+
+    def __init__(self, **kwargs):
+        """
+        CategorizedValue class constructor (values are stored locally until bound to a CategorizedValueTable)
+        :param kwargs:
+        """
+        self._values = [0] * CATEGORIES_COUNT
+        self._table = None
+        self._row = None
+        super(CategorizedValue, self).__init__(**kwargs)
+
+    def __str__(self):
+        """
+        Overrides the original string conversion method to retrieve the total sum of internal values instead
+        :return:
+        """
+        log("Entering CategorizedValue.__str__ method", LogLevels.LOG_LEVEL_DEBUG)
+
+        return '{}'.format(sum(self.as_tuple()))
+
+    def __eq__(self, other: "CategorizedValue"):
+        """
+        Overrides the original comparison method to compare the values of each group
+        :param other:
+        :return:
+        """
+        if not isinstance(other, CategorizedValue):
+            return NotImplemented
+
+        return self.as_tuple() == other.as_tuple()
+
+    def as_tuple(self) -> Tuple:
+        """
+        Retrieve the values of the four groups as a tuple (in the CATEGORIES order)
+        :return:
+        """
+        if self._table is not None:
+            return self._table.get_row(self._row)
+
+        return tuple(self._values)
+
+    def bind(self, table: "CategorizedValueTable", row: int):
+        """
+        Turns the value into a view of the given table row (the current values are copied to the table first)
+        :param table:
+        :param row:
+        :return:
+        """
+        table.set_row(row, self.as_tuple())
+        self._table = table
+        self._row = row
+
+        return self
+
+
+class CategorizedValueTable:
+    """
+    Columnar container packing N categorized values (4 groups each) in a single buffer, allowing the comparisons over
+    the whole network to be done in one pass. Uses a NumPy array when available, falling back to a standard library
+    array otherwise. Missing values (None) are stored as NaN.
+    """
+    def __init__(self, value_class: type = CategorizedValue):
+        """
+        CategorizedValueTable class constructor
+        :param value_class:
+        """
+        self.value_class = value_class
+        self._size = 0
+        self._data = numpy.empty((0, CATEGORIES_COUNT)) if numpy is not None else array('d')
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, row: int) -> CategorizedValue:
+        """
+        Retrieve a view (instance of the table value class) of a given row
+        :param row:
+        :return:
+        """
+        if not 0 <= row < self._size:
+            raise IndexError(f"Row {row} is out of the table range")
+
+        value = self.value_class()
+        value._table = self
+        value._row = row
+
+        return value
+
+    def append(self, value: CategorizedValue = None) -> CategorizedValue:
+        """
+        Append a value to the table, turning it into a view of the new row (a new view is created if none is given)
+        :param value:
+        :return:
+        """
+        row = self._size
+        if numpy is not None:
+            if row >= len(self._data):
+                data = numpy.full((max(16, 2 * len(self._data)), CATEGORIES_COUNT), math.nan)
+                data[:row] = self._data[:row]
+                self._data = data
+        else:
+            self._data.extend([math.nan] * CATEGORIES_COUNT)
+        self._size += 1
+
+        if value is None:
+            value = self.value_class()
+
+        return value.bind(self, row)
+
+    def get(self, row: int, column: int) -> Optional[int]:
+        """
+        Retrieve a single cell of the table
+        :param row:
+        :param column:
+        :return:
+        """
+        if numpy is not None:
+            return self._from_storage(self._data[row, column])
+
+        return self._from_storage(self._data[row * CATEGORIES_COUNT + column])
+
+    def set(self, row: int, column: int, value: Optional[int]):
+        """
+        Update a single cell of the table
+        :param row:
+        :param column:
+        :param value:
+        :return:
+        """
+        if numpy is not None:
+            self._data[row, column] = self._to_storage(value)
+            return
+
+        self._data[row * CATEGORIES_COUNT + column] = self._to_storage(value)
+
+    def get_row(self, row: int) -> Tuple:
+        """
+        Retrieve the values of a row as a tuple
+        :param row:
+        :return:
+        """
+        return tuple(self.get(row, column) for column in range(CATEGORIES_COUNT))
+
+    def set_row(self, row: int, values: Iterable):
+        """
+        Update all the values of a row
+        :param row:
+        :param values:
+        :return:
+        """
+        for column, value in enumerate(values):
+            self.set(row, column, value)
+
+    def diff(self, other: "CategorizedValueTable") -> "CategorizedValueTable":
+        """
+        Retrieve a new table with the absolute differences between each cell of both tables
+        :param other:
+        :return:
+        """
+        log("Entering CategorizedValueTable.diff method", LogLevels.LOG_LEVEL_DEBUG)
+        self._check_same_size(other)
+
+        result = CategorizedValueTable(value_class=self.value_class)
+        result._size = self._size
+        if numpy is not None:
+            result._data = numpy.abs(self._data[:self._size] - other._data[:other._size])
+        else:
+            result._data = array('d', [abs(a - b) for a, b in zip(self._data, other._data)])
+
+        return result
+
+    def totals(self) -> List[int]:
+        """
+        Retrieve the sum of the groups of each row (missing values are ignored)
+        :return:
+        """
+        log("Entering CategorizedValueTable.totals method", LogLevels.LOG_LEVEL_DEBUG)
+        if numpy is not None:
+            return [int(total) for total in numpy.nansum(self._data[:self._size], axis=1)]
+
+        return [
+            int(sum(value for value in self._data[start:start + CATEGORIES_COUNT] if not math.isnan(value)))
+            for start in range(0, self._size * CATEGORIES_COUNT, CATEGORIES_COUNT)
+        ]
+
+    def ratio(self, other: "CategorizedValueTable") -> List[Tuple]:
+        """
+        Retrieve the ratio between each cell of both tables (None when it can't be determined)
+        :param other:
+        :return:
+        """
+        log("Entering CategorizedValueTable.ratio method", LogLevels.LOG_LEVEL_DEBUG)
+        self._check_same_size(other)
+
+        if numpy is not None:
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                ratios = (self._data[:self._size] / other._data[:other._size]).tolist()
+        else:
+            ratios = [a / b if b != 0 else math.nan for a, b in zip(self._data, other._data)]
+            ratios = [ratios[start:start + CATEGORIES_COUNT] for start in range(0, len(ratios), CATEGORIES_COUNT)]
+
+        return [tuple(value if math.isfinite(value) else None for value in row) for row in ratios]
+
+    def mask_relative_difference(self, other: "CategorizedValueTable", tolerance: float) -> List[bool]:
+        """
+        Retrieve a mask of the rows where any group differs from the other table by more than the given tolerance,
+        relative to the other table value (e.g. tolerance 0.05 for 5%)
+        :param other:
+        :param tolerance:
+        :return:
+        """
+        log("Entering CategorizedValueTable.mask_relative_difference method", LogLevels.LOG_LEVEL_DEBUG)
+        self._check_same_size(other)
+
+        if numpy is not None:
+            reference = other._data[:other._size]
+            exceeding = numpy.abs(self._data[:self._size] - reference) > tolerance * numpy.abs(reference)
+            return [bool(row) for row in exceeding.any(axis=1)]
+
+        exceeding = [abs(a - b) > tolerance * abs(b) for a, b in zip(self._data, other._data)]
+
+        return [any(exceeding[start:start + CATEGORIES_COUNT]) for start in range(0, len(exceeding), CATEGORIES_COUNT)]
+
+    def _check_same_size(self, other: "CategorizedValueTable"):
+        if len(self) != len(other):
+            raise ValueError(f"Cannot operate tables of different sizes ({len(self)} and {len(other)})!")
+
+    @staticmethod
+    def _to_storage(value: Optional[int]) -> float:
+        return math.nan if value is None else float(value)
+
+    @staticmethod
+    def _from_storage(value: float) -> Optional[int]:
+        return None if math.isnan(value) else int(value)
+
+
+def create_categorized_value_table(
+    values: Iterable[CategorizedValue],
+    value_class: type = None,
+) -> CategorizedValueTable:
+    """
+    Factory method to pack the given values into a CategorizedValueTable, turning each of them into a view of its row
+    :param values:
+    :param value_class:
+    :return:
+    """
+    log("Entering create_categorized_value_table method", LogLevels.LOG_LEVEL_DEBUG)
+    values = list(values)
+    if value_class is None:
+        value_class = type(values[0]) if len(values) > 0 else CategorizedValue
+
+    table = CategorizedValueTable(value_class=value_class)
+    for value in values:
+        table.append(value)
+
+    return table
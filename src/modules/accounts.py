@@ -0,0 +1,360 @@
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import sys
+
+from typing import Dict, List
+
+from modules.clock import get_clock
+from modules.file import read_text_file, save_dict_to_json
+from modules.logger import log, LogLevels
+
+
+class AccountStatus:
+    """
+    Enum class for the possible statuses of an account on the supervisor
+    """
+    WAITING = 'waiting'
+    RUNNING = 'running'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+
+
+# Environment variables holding the account data paths (and their defaults), moved to the account data namespace
+ACCOUNT_DATA_PATH_VARIABLES = {
+    'AIRPLANES_SUMMARY_FILEPATH': '/data/airplanes_summary.csv',
+    'AIRPORTS_REGISTRY_FILEPATH': '/data/models/airports.json',
+    'CARD_HOLD_RESULTS_FOLDER': '/data/card_hold_results',
+    'CHANGE_DETECTION_FOLDER': '/data/change_detection',
+    'CHANGE_EVENTS_FOLDER': '/data/change_events',
+    'CHECKPOINTS_FOLDER': '/data/checkpoints',
+    'COOKIES_FILEPATH': '/data/cookies.dat',
+    'ERROR_DUMPS_FOLDER': '/data/error_dumps',
+    'EVENTS_JOURNAL_FOLDER': '/data/events_journal',
+    'INCREMENTAL_CRAWL_FOLDER': '/data/incremental_crawl',
+    'LINES_OBJECTS_FOLDER': '/data/models/lines',
+    'LINES_SUMMARY_FILEPATH': '/data/lines_summary.csv',
+    'LOGS_FOLDER': '/data/logs',
+    'PAGE_ARCHIVE_FOLDER': '/data/page_archive',
+    'REPARSE_OUTPUT_FOLDER': '/data/reparse',
+    'RETRY_QUEUE_FILEPATH': '/data/retry_queue.json',
+    'RUN_REPORTS_FILEPATH': '/data/run_reports.jsonl',
+    'SAMPLING_PROFILE_FOLDER': '/data/profiles',
+    'TRAVEL_CARDS_RESULTS_FOLDER': '/data/travel_cards_wheel_results',
+}
+
+# Environment variables holding optional data paths (disabled when empty), moved to the account data namespace only
+# when they are configured. The REQUEST_PACER_STATE_FILEPATH is shared on purpose: all the accounts run from the same
+# host, so their requests are paced together.
+ACCOUNT_OPTIONAL_PATH_VARIABLES = ['METRICS_TEXTFILE_PATH']
+
+
+class Account:
+    """
+    Class representing a game account run by the supervisor, with its own credentials, data namespace (cookies, models,
+    results, logs...) and environment overrides
+    """
+    def __init__(self, name: str, email: str, password: str, env: Dict = None):
+        """
+        Account class constructor
+        :param name:
+        :param email:
+        :param password:
+        :param env:
+        """
+        self.name = name
+        self.email = email
+        self.password = password
+        self.env = env or {}
+        self.status = AccountStatus.WAITING
+        self.next_run_at = None
+        self.last_started_at = None
+        self.last_duration = None
+        self.runs = 0
+        self.failures = 0
+
+    def get_environment(self, data_folder: str) -> Dict:
+        """
+        Build the environment overlay of the account: the data paths moved to the account namespace inside the given
+        folder, the account credentials and the account environment overrides
+        :param data_folder:
+        :return:
+        """
+        environment = {}
+        for variable, default_path in ACCOUNT_DATA_PATH_VARIABLES.items():
+            relative_path = os.path.relpath(default_path, '/data')
+            environment[variable] = os.path.join(data_folder, self.name, relative_path)
+        for variable in ACCOUNT_OPTIONAL_PATH_VARIABLES:
+            if os.getenv(variable, '') != '':
+                environment[variable] = os.path.join(data_folder, self.name, os.path.basename(os.environ[variable]))
+
+        environment['AM_USER_EMAIL'] = self.email
+        environment['AM_USER_PASSWORD'] = self.password
+        environment.update({variable: str(value) for variable, value in self.env.items()})
+
+        return environment
+
+    def serialize(self) -> Dict:
+        """
+        Serializes the account status (the credentials are not included)
+        :return:
+        """
+        return {
+            'name': self.name,
+            'status': self.status,
+            'next_run_at': self.next_run_at,
+            'last_started_at': self.last_started_at,
+            'last_duration': self.last_duration,
+            'runs': self.runs,
+            'failures': self.failures,
+        }
+
+
+def load_accounts_from_file(filepath: str) -> List[Account]:
+    """
+    Loads the accounts from a JSON config file, in the format
+    {"accounts": [{"name": "...", "email": "...", "password": "...", "env": {...}}, ...]}
+    :param filepath:
+    :return:
+    """
+    log("Entering load_accounts_from_file method", LogLevels.LOG_LEVEL_DEBUG)
+    accounts_config = json.loads(read_text_file(filepath=filepath))
+
+    accounts = []
+    for account_dict in accounts_config['accounts']:
+        missing_keys = [key for key in ['name', 'email', 'password'] if not account_dict.get(key)]
+        if len(missing_keys) > 0:
+            raise ValueError(f"Account config on {filepath} is missing the key(s): {', '.join(missing_keys)}")
+
+        accounts.append(Account(
+            name=account_dict['name'],
+            email=account_dict['email'],
+            password=account_dict['password'],
+            env=account_dict.get('env'),
+        ))
+
+    names = [account.name for account in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Account names on {filepath} must be unique!")
+
+    return accounts
+
+
+def run_account_cycle(account_environment: Dict):
+    """
+    Entrypoint of the account worker processes: applies the account environment and runs a single cycle of the main
+    tasks (the exit code tells the supervisor if it succeeded)
+    :param account_environment:
+    :return:
+    """
+    os.environ.update(account_environment)
+
+    # Imported here so the supervisor doesn't load the tasks modules (only the account worker processes run them)
+    from modules.cycle import execute_tasks
+
+    try:
+        execute_tasks()
+    except Exception as error:
+        log(f"The account cycle failed: {repr(error)}", LogLevels.LOG_LEVEL_ERROR)
+        sys.exit(1)
+
+
+class AccountsSupervisor:
+    """
+    Runs the cycles of several accounts, each one on its own short-lived worker process (so a crash or a memory leak
+    of an account doesn't affect the others), with at most the given amount of processes running at the same time and
+    with the accounts schedules staggered
+    """
+    def __init__(self, accounts: List[Account], data_folder: str, status_filepath: str, max_processes: int):
+        """
+        AccountsSupervisor class constructor
+        :param accounts:
+        :param data_folder:
+        :param status_filepath:
+        :param max_processes:
+        """
+        log("Instantiating AccountsSupervisor class", LogLevels.LOG_LEVEL_DEBUG)
+        self.accounts = accounts
+        self.data_folder = data_folder
+        self.status_filepath = status_filepath
+        self.max_processes = max(1, max_processes)
+        self._processes: Dict[str, multiprocessing.Process] = {}
+
+    def schedule_initial_runs(self, stagger_seconds: float):
+        """
+        Schedules the first cycle of each account, spaced by the given interval
+        :param stagger_seconds:
+        :return:
+        """
+        now = get_clock().time()
+        for index, account in enumerate(self.accounts):
+            account.next_run_at = now + index * stagger_seconds
+
+    def start_account_cycle(self, account: Account):
+        """
+        Starts a worker process running a cycle of the given account
+        :param account:
+        :return:
+        """
+        log(f"Starting the cycle of account '{account.name}'", LogLevels.LOG_LEVEL_NOTICE)
+        process = multiprocessing.Process(
+            target=run_account_cycle,
+            args=(account.get_environment(data_folder=self.data_folder),),
+            name=f'account-{account.name}',
+        )
+        process.start()
+
+        account.status = AccountStatus.RUNNING
+        account.last_started_at = get_clock().time()
+        account.runs += 1
+        self._processes[account.name] = process
+
+    def collect_finished_cycles(self) -> int:
+        """
+        Collects the worker processes that finished, scheduling the next cycle of their accounts, and returns the amount
+        of collected processes
+        :return:
+        """
+        accounts = {account.name: account for account in self.accounts}
+        finished_names = [name for name, process in self._processes.items() if not process.is_alive()]
+        for name in finished_names:
+            process = self._processes.pop(name)
+            process.join()
+
+            account = accounts[name]
+            account.last_duration = get_clock().time() - account.last_started_at
+            if process.exitcode == 0:
+                account.status = AccountStatus.SUCCESS
+                account.next_run_at = get_clock().time() + random.randint(
+                    int(os.getenv('WAIT_TIME_MIN', 60*60*5)),
+                    int(os.getenv('WAIT_TIME_MAX', 60*60*8)),
+                )
+            else:
+                log(
+                    f"The cycle of account '{name}' failed (exit code {process.exitcode})",
+                    LogLevels.LOG_LEVEL_ERROR,
+                )
+                account.status = AccountStatus.FAILED
+                account.failures += 1
+                account.next_run_at = get_clock().time() + int(os.getenv('SCHEDULER_ERROR_RETRY_SECONDS', 600))
+
+        return len(finished_names)
+
+    def start_due_cycles(self) -> int:
+        """
+        Starts the cycles of the accounts that are due (while there are free process slots), the most overdue first,
+        and returns the amount of started cycles
+        :return:
+        """
+        now = get_clock().time()
+        due_accounts = sorted(
+            [
+                account for account in self.accounts
+                if account.name not in self._processes and account.next_run_at <= now
+            ],
+            key=lambda account: account.next_run_at,
+        )
+        free_slots = self.max_processes - len(self._processes)
+        for account in due_accounts[:free_slots]:
+            self.start_account_cycle(account)
+
+        return min(len(due_accounts), max(0, free_slots))
+
+    def get_status(self) -> Dict:
+        """
+        Retrieve the combined status report of the accounts
+        :return:
+        """
+        return {
+            'updated_at': get_clock().time(),
+            'running': len(self._processes),
+            'max_processes': self.max_processes,
+            'accounts': [account.serialize() for account in self.accounts],
+        }
+
+    def persist_status(self):
+        """
+        Persist the combined status report to the file stored locally
+        :return:
+        """
+        save_dict_to_json(input_dict=self.get_status(), output_filepath=self.status_filepath)
+
+    def run_forever(self, poll_interval: float = 5):
+        """
+        Supervises the accounts cycles forever
+        :param poll_interval:
+        :return:
+        """
+        log(f"Supervising {len(self.accounts)} account(s) with up to {self.max_processes} process(es)")
+        while True:
+            changes = self.collect_finished_cycles() + self.start_due_cycles()
+            if changes > 0:
+                self.persist_status()
+
+            get_clock().sleep(poll_interval)
+
+
+def log_accounts_status(status: Dict):
+    """
+    Logs a combined status report of the accounts
+    :param status:
+    :return:
+    """
+    updated_at = datetime.datetime.fromtimestamp(status['updated_at']).strftime('%Y-%m-%d %H:%M:%S')
+    log(f"Accounts status at {updated_at} ({status['running']} of {status['max_processes']} process(es) running):")
+    for account in status['accounts']:
+        next_run = '-'
+        if account['next_run_at'] is not None:
+            next_run = datetime.datetime.fromtimestamp(account['next_run_at']).strftime('%Y-%m-%d %H:%M:%S')
+
+        duration = f"{account['last_duration']:.0f}s" if account['last_duration'] is not None else '-'
+        log(
+            f"{account['name']}: {account['status'].upper()} (last cycle: {duration}, next: {next_run}, "
+            f"runs: {account['runs']}, failures: {account['failures']})"
+        )
+
+
+def get_accounts_supervisor() -> AccountsSupervisor:
+    """
+    Build the accounts supervisor (configured from the environment)
+    :return:
+    """
+    log("Entering get_accounts_supervisor method", LogLevels.LOG_LEVEL_DEBUG)
+
+    return AccountsSupervisor(
+        accounts=load_accounts_from_file(filepath=os.getenv('ACCOUNTS_FILEPATH', '/data/accounts.json')),
+        data_folder=os.getenv('ACCOUNTS_DATA_FOLDER', '/data/accounts'),
+        status_filepath=os.getenv('ACCOUNTS_STATUS_FILEPATH', '/data/accounts_status.json'),
+        max_processes=int(os.getenv('ACCOUNTS_MAX_PROCESSES', os.cpu_count() or 1)),
+    )
+
+
+def execute_accounts_command(arguments: List):
+    """
+    Execute an accounts supervisor command: 'run' (default) supervises the accounts forever, 'status' logs the
+    combined status report of the running supervisor
+    :param arguments:
+    :return:
+    """
+    log("Entering execute_accounts_command method", LogLevels.LOG_LEVEL_DEBUG)
+    command = arguments[0] if len(arguments) > 0 else 'run'
+
+    if command == 'run':
+        supervisor = get_accounts_supervisor()
+        supervisor.schedule_initial_runs(stagger_seconds=float(os.getenv('ACCOUNTS_STAGGER_SECONDS', 5*60)))
+        supervisor.persist_status()
+        supervisor.run_forever()
+        return
+
+    if command == 'status':
+        status_filepath = os.getenv('ACCOUNTS_STATUS_FILEPATH', '/data/accounts_status.json')
+        if not os.path.isfile(status_filepath):
+            log(f"No accounts status report found at {status_filepath}", LogLevels.LOG_LEVEL_WARNING)
+            return
+
+        log_accounts_status(status=json.loads(read_text_file(filepath=status_filepath)))
+        return
+
+    log(f"Unknown accounts command '{command}' (expected 'run' or 'status')", LogLevels.LOG_LEVEL_ERROR)
@@ -1,99 +1,189 @@
-import os
-
-from bs4 import BeautifulSoup
-from bs4.element import ResultSet
-from typing import Tuple, Dict, List
-
-from modules.file import save_dict_to_csv, save_error_dump_file
-from modules.logger import log, LogLevels
-from modules.pagination import check_has_next_page
-from modules.session_manager import SessionManager
-from modules.strings import sanitize_text
-
-
-def fetch_all_airplanes_list(session_manager: SessionManager) -> List:
-    """
-    Retrieves a list with all the airplanes registered in the account (and their summarized data), saving the output
-    to a CSV file.
-    :param session_manager:
-    :return:
-    """
-    log("Entering fetch_all_airplanes method", LogLevels.LOG_LEVEL_DEBUG)
-    has_next = True
-    page = 1
-    airplanes = []
-
-    while has_next:
-        page_airplanes, has_next = get_page_airplanes(session_manager=session_manager, page=page)
-        airplanes.extend(page_airplanes)
-        page += 1
-
-    airplanes_summary_filepath = os.getenv('AIRPLANES_SUMMARY_FILEPATH', '/data/airplanes_summary.csv')
-    save_dict_to_csv(airplanes, airplanes_summary_filepath)
-    log(f"Finished listing {len(airplanes)} airplanes! (summary exported to {airplanes_summary_filepath})")
-
-    return airplanes
-
-
-def get_page_airplanes(session_manager: SessionManager, page: int = 1) -> Tuple:
-    """
-    Retrieves a tuple of 2 items, containing the List of the airplanes in that page and if there's a next page
-    available.
-    :param session_manager:
-    :param page:
-    :return:
-    """
-    log("Entering get_page_airplanes method", LogLevels.LOG_LEVEL_DEBUG)
-    referer_endpoint = 'home/' if page <= 1 else f'aircraft?page={page - 1}'
-    airplanes = session_manager.request(
-        url='http://tycoon.airlines-manager.com/aircraft?page=' + str(page),
-        method=SessionManager.Methods.GET,
-        extra_headers={
-            'Referer': f'http://tycoon.airlines-manager.com/{referer_endpoint}',
-        },
-    )
-    airplanes_bs = BeautifulSoup(airplanes.text, 'html.parser')
-
-    airplanes_table = airplanes_bs.find('table', attrs={'class': 'aircraftListViewTable'})
-    if airplanes_table is None:
-        log("Aborting airplanes reading as the airplanes table was not found!", LogLevels.LOG_LEVEL_ERROR)
-        save_error_dump_file(dump=airplanes.text, tag='airplanes_table_not_found')
-        raise ReferenceError("Table with class aircraftListViewTable was not found")
-
-    airplanes_rows = airplanes_table.find_all('tr')
-    log("Found a total of {} rows in page {}.".format(len(airplanes_rows), page), LogLevels.LOG_LEVEL_NOTICE)
-    airplanes = [parse_airplane_row(row) for row in airplanes_rows]
-    airplanes = [airplane for airplane in airplanes if not len(airplane) == 0]
-
-    return airplanes, check_has_next_page(airplanes_bs)
-
-
-def parse_airplane_row(row: ResultSet) -> Dict:
-    """
-    Parses a BS4 table row from the airplanes results page into a dict represent one single airplane.
-    :param row:
-    :return:
-    """
-    log("Entering parse_airplane_row method", LogLevels.LOG_LEVEL_DEBUG)
-    if len(row.find_all('th')) > 0:
-        return {}
-
-    airplane_name_cell = row.find('span', attrs={'class': 'editAircraftName'})
-    cells = row.find_all('td')
-
-    return {
-        'id': int(str(airplane_name_cell['data-url']).split('/')[-1]),
-        'name': airplane_name_cell.text,
-        'model': sanitize_text(str(cells[0].text).split('/')[0]),
-        'model_img_url': cells[0].find('img', attrs={'class': 'zoomAircraft'})['data-aircraftimg'],
-        'url': str(airplane_name_cell['data-url']),
-        'hub': sanitize_text(cells[1].text[:3]),
-        'hub_flag_alt': cells[1].find('img')['alt'],
-        'hub_flag_url': cells[1].find('img')['src'],
-        'range': sanitize_text(cells[2].text),
-        'usage': sanitize_text(cells[3].text),
-        'wearing': sanitize_text(cells[4].text),
-        'age': sanitize_text(cells[5].text),
-        'capacity': sanitize_text(cells[6].text),
-        'result_last_7_days': sanitize_text(cells[7].text),
-    }
+import functools
+import os
+
+from bs4.element import ResultSet
+from typing import Dict, Iterator, List, Tuple
+
+from modules.change_detection import (
+    ChangeEventTypes,
+    ChangeIndexNames,
+    create_listing_changes,
+    detect_airplane_changes,
+    is_change_detection_enabled,
+)
+from modules.error_dumps import save_error_dump_file
+from modules.file import CsvColumnTypes, CsvStreamWriter, FileWriteBatch
+from modules.html_parser import parse_html, release_html
+from modules.incremental_crawl import create_incremental_crawl, IncrementalCrawl, is_incremental_crawl_enabled
+from modules.logger import log, LogLevels
+from modules.memory import is_low_memory_mode, track_memory_stage
+from modules.pagination import check_has_next_page, get_pages_count, iterate_pages
+from modules.session_manager import SessionManager
+from modules.strings import sanitize_text
+from modules.urls import build_url
+
+# Columns (in order) and types of the airplanes summary CSV export
+AIRPLANES_SUMMARY_SCHEMA = {
+    'id': CsvColumnTypes.INTEGER,
+    'name': CsvColumnTypes.TEXT,
+    'model': CsvColumnTypes.TEXT,
+    'model_img_url': CsvColumnTypes.TEXT,
+    'url': CsvColumnTypes.TEXT,
+    'hub': CsvColumnTypes.TEXT,
+    'hub_flag_alt': CsvColumnTypes.TEXT,
+    'hub_flag_url': CsvColumnTypes.TEXT,
+    'range': CsvColumnTypes.INTEGER,
+    'usage': CsvColumnTypes.DECIMAL,
+    'wearing': CsvColumnTypes.DECIMAL,
+    'age': CsvColumnTypes.INTEGER,
+    'capacity': CsvColumnTypes.INTEGER,
+    'result_last_7_days': CsvColumnTypes.INTEGER,
+}
+
+def fetch_all_airplanes_list(session_manager: SessionManager) -> List:
+    """
+    Retrieves a list with all the airplanes registered in the account (and their summarized data), streaming the
+    output to a CSV file as the pages arrive. In low-memory mode, the airplanes are only streamed to the CSV file and
+    an empty list is returned. In the incremental crawl mode (or with the change detection enabled), the CSV file is
+    only replaced if the pages (or the airplanes) changed.
+    :param session_manager:
+    :return:
+    """
+    log("Entering fetch_all_airplanes method", LogLevels.LOG_LEVEL_DEBUG)
+    airplanes_summary_filepath = os.getenv('AIRPLANES_SUMMARY_FILEPATH', '/data/airplanes_summary.csv')
+    crawl = create_incremental_crawl('airplanes') if is_incremental_crawl_enabled() else None
+    changes = None
+    if is_change_detection_enabled():
+        changes = create_listing_changes(
+            name=ChangeIndexNames.AIRPLANES,
+            added_event_type=ChangeEventTypes.AIRPLANE_ADDED,
+            removed_event_type=ChangeEventTypes.AIRPLANE_REMOVED,
+        )
+    keep_airplanes = not is_low_memory_mode()
+    airplanes = []
+
+    with track_memory_stage('fetch_all_airplanes_list'), FileWriteBatch():
+        with CsvStreamWriter(airplanes_summary_filepath, schema=AIRPLANES_SUMMARY_SCHEMA) as csv_writer:
+            for airplane in iterate_airplanes(session_manager=session_manager, crawl=crawl):
+                csv_writer.write_row(airplane)
+                if changes is not None:
+                    detect_airplane_changes(listing_changes=changes, airplane=airplane)
+                if keep_airplanes:
+                    airplanes.append(airplane)
+
+            if changes is not None:
+                changes.finish()
+
+            is_unchanged = os.path.isfile(csv_writer.filepath) and (
+                (crawl is not None and not crawl.has_changes) or (changes is not None and not changes.has_changes)
+            )
+            if is_unchanged:
+                csv_writer.discard()
+
+    if is_unchanged:
+        log(f"Finished listing {csv_writer.rows_count} airplanes! (unchanged since the previous listing)")
+        return airplanes
+
+    log(f"Finished listing {csv_writer.rows_count} airplanes! (summary exported to {csv_writer.filepath})")
+
+    return airplanes
+
+
+def iterate_airplanes(session_manager: SessionManager, crawl: IncrementalCrawl = None) -> Iterator[Dict]:
+    """
+    Yields each airplane registered in the account (and its summarized data) in order, fetching the pages
+    concurrently once the first one tells the pages count. If an incremental crawl is given, it stops paging when the
+    pages didn't change since its previous crawl.
+    :param session_manager:
+    :param crawl:
+    :return:
+    """
+    log("Entering iterate_airplanes method", LogLevels.LOG_LEVEL_DEBUG)
+    fetch_page = functools.partial(get_page_airplanes, session_manager)
+    if crawl is not None:
+        yield from crawl.iterate_rows(fetch_page)
+        return
+
+    for page_airplanes, _, _ in iterate_pages(fetch_page):
+        yield from page_airplanes
+
+
+def get_page_airplanes(session_manager: SessionManager, page: int = 1) -> Tuple:
+    """
+    Retrieves a tuple of 3 items, containing the List of the airplanes in that page, if there's a next page available
+    and the total amount of pages (None if unknown).
+    :param session_manager:
+    :param page:
+    :return:
+    """
+    log("Entering get_page_airplanes method", LogLevels.LOG_LEVEL_DEBUG)
+    referer_endpoint = 'home/' if page <= 1 else f'aircraft?page={page - 1}'
+    airplanes_response = session_manager.request(
+        url=build_url('/aircraft?page=' + str(page)),
+        method=SessionManager.Methods.GET,
+        extra_headers={
+            'Referer': build_url(f'/{referer_endpoint}'),
+        },
+    )
+
+    return parse_airplanes_page(html_text=airplanes_response.text, page=page)
+
+
+def parse_airplanes_page(html_text: str, page: int = 1) -> Tuple:
+    """
+    Parses an airplanes results page into a tuple of 3 items, containing the List of the airplanes in that page, if
+    there's a next page available and the total amount of pages (None if unknown).
+    :param html_text:
+    :param page:
+    :return:
+    """
+    log("Entering parse_airplanes_page method", LogLevels.LOG_LEVEL_DEBUG)
+    airplanes_bs = parse_html(html_text, page='aircraft')
+    try:
+        airplanes_table = airplanes_bs.find('table', attrs={'class': 'aircraftListViewTable'})
+        if airplanes_table is None:
+            log("Aborting airplanes reading as the airplanes table was not found!", LogLevels.LOG_LEVEL_ERROR)
+            save_error_dump_file(dump=html_text, tag='airplanes_table_not_found')
+            raise ReferenceError("Table with class aircraftListViewTable was not found")
+
+        airplanes_rows = airplanes_table.find_all('tr')
+        log("Found a total of {} rows in page {}.".format(len(airplanes_rows), page), LogLevels.LOG_LEVEL_NOTICE)
+        airplanes = [parse_airplane_row(row) for row in airplanes_rows]
+        airplanes = [airplane for airplane in airplanes if not len(airplane) == 0]
+        has_next_page = check_has_next_page(airplanes_bs)
+        pages_count = get_pages_count(airplanes_bs)
+    finally:
+        release_html(airplanes_bs)
+
+    return airplanes, has_next_page, pages_count
+
+
+def parse_airplane_row(row: ResultSet) -> Dict:
+    """
+    Parses a BS4 table row from the airplanes results page into a dict represent one single airplane.
+    :param row:
+    :return:
+    """
+    log("Entering parse_airplane_row method", LogLevels.LOG_LEVEL_DEBUG)
+    if len(row.find_all('th')) > 0:
+        return {}
+
+    airplane_name_cell = row.find('span', attrs={'class': 'editAircraftName'})
+    cells = row.find_all('td')
+
+    return {
+        'id': int(str(airplane_name_cell['data-url']).split('/')[-1]),
+        'name': airplane_name_cell.text,
+        'model': sanitize_text(str(cells[0].text).split('/')[0]),
+        'model_img_url': cells[0].find('img', attrs={'class': 'zoomAircraft'})['data-aircraftimg'],
+        'url': str(airplane_name_cell['data-url']),
+        'hub': sanitize_text(cells[1].text[:3]),
+        'hub_flag_alt': cells[1].find('img')['alt'],
+        'hub_flag_url': cells[1].find('img')['src'],
+        'range': sanitize_text(cells[2].text),
+        'usage': sanitize_text(cells[3].text),
+        'wearing': sanitize_text(cells[4].text),
+        'age': sanitize_text(cells[5].text),
+        'capacity': sanitize_text(cells[6].text),
+        'result_last_7_days': sanitize_text(cells[7].text),
+    }
@@ -1,204 +1,242 @@
-import json
-import os
-
-from bs4 import BeautifulSoup
-from datetime import datetime
-from typing import Dict
-
-from modules.file import save_dict_to_json, save_error_dump_file
-from modules.logger import log, LogLevels
-from modules.session_manager import SessionManager
-from modules.strings import sanitize_text
-
-
-def get_free_card_holder_if_available(session_manager: SessionManager):
-    """
-    Checks if the free Card Holder is available, and open it if so
-    :param session_manager:
-    :return:
-    """
-    log("Entering get_free_card_holder_if_available method", LogLevels.LOG_LEVEL_DEBUG)
-    if not is_free_card_holder_available(session_manager=session_manager):
-        return
-
-    card_holder_result = open_free_card_holder(session_manager=session_manager)
-    log("Free card holder results: {}".format(json.dumps(card_holder_result)))
-
-
-def is_free_card_holder_available(session_manager: SessionManager) -> bool:
-    """
-    Determines if the free Card Holder is available to open
-    :param session_manager:
-    :return:
-    """
-    log("Entering is_free_card_holder_available method", LogLevels.LOG_LEVEL_DEBUG)
-    card_holder_response = session_manager.request(
-        url='http://tycoon.airlines-manager.com/shop/cardholder',
-        method=SessionManager.Methods.GET,
-        extra_headers={
-            'Referer': 'http://tycoon.airlines-manager.com/home',
-        },
-    )
-    card_holder_bs = BeautifulSoup(card_holder_response.text, 'html.parser')
-
-    card_holder_title = card_holder_bs.find('div', attrs={'class': 'cardholder-title'})
-    if card_holder_title is None:
-        log("Aborting card hold opening as the page title was not found!", LogLevels.LOG_LEVEL_ERROR)
-        save_error_dump_file(dump=card_holder_response.text, tag='card_holder_title_div_not_found')
-        raise ReferenceError("Div with class cardholder-title was not found")
-
-    has_countdown = card_holder_bs.find('div', attrs={'id': 'timerFree'})
-    log("Free Card Holder available: {}".format('NO' if has_countdown else 'YES'))
-
-    return not has_countdown
-
-
-def open_free_card_holder(session_manager: SessionManager) -> Dict:
-    """
-    Opens the free Card Holder, save and return the results (must check if available first!)
-    :param session_manager:
-    :return:
-    """
-    log("Entering open_free_card_holder method", LogLevels.LOG_LEVEL_DEBUG)
-    card_holder_page_response = session_manager.request(
-        url='http://tycoon.airlines-manager.com/shop/cardholder',
-        method=SessionManager.Methods.GET,
-        extra_headers={
-            'Referer': 'http://tycoon.airlines-manager.com/home',
-        },
-    )
-    log(f'Card holder page response got {len(card_holder_page_response.text)} bytes!', LogLevels.LOG_LEVEL_NOTICE)
-
-    # ToDo: Discover how to find the localized URL from the previous page
-    free_card_url = 'http://tycoon.airlines-manager.com/shop/buycards/5/0/Econ%C3%B4mica'
-
-    free_card_holder_modal_response = session_manager.request(
-        url=free_card_url,
-        method=SessionManager.Methods.GET,
-        extra_headers={
-            'Accept': '*/*',
-            'Authority': 'tycoon.airlines-manager.com',
-            'Referer': 'http://tycoon.airlines-manager.com/shop/cardholder',
-            'X-Requested-With': 'XMLHttpRequest',
-        },
-    )
-    log(
-        f'Free card holder modal response got {len(free_card_holder_modal_response.text)} bytes!',
-        LogLevels.LOG_LEVEL_NOTICE
-    )
-
-    free_card_holder_modal_response_bs = BeautifulSoup(free_card_holder_modal_response.text, 'html.parser')
-    free_card_csrf_token_input = free_card_holder_modal_response_bs.find('input', attrs={'id': 'form__token'})
-    free_card_form_id_input = free_card_holder_modal_response_bs.find('input', attrs={'id': 'form_id'})
-
-    csrf_token_value = free_card_csrf_token_input['value']
-    form_id_value = free_card_form_id_input['value']
-    free_card_opening_payload = {
-        'form[id]': form_id_value,
-        'form[_token]': csrf_token_value,
-    }
-
-    free_card_holder_opening_response = session_manager.request(
-        url=free_card_url,
-        method=SessionManager.Methods.POST,
-        payload=free_card_opening_payload,
-        extra_headers={
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'Referer': free_card_url,
-            'X-Requested-With': 'XMLHttpRequest',
-        },
-    )
-    log(
-        f'Free card holder opening response got {len(free_card_holder_opening_response.text)} bytes!',
-        LogLevels.LOG_LEVEL_NOTICE
-    )
-
-    parsed_results = parse_card_holder_bonuses(free_card_holder_opening_response.text)
-
-    save_card_holder_results(parsed_results)
-
-    return parsed_results
-
-
-def parse_card_holder_bonuses(card_holder_response: str) -> Dict:
-    """
-    Parse the HTML response of the card holder into a dict
-    :param card_holder_response:
-    :return:
-    """
-    log("Entering parse_card_holder_bonuses method", LogLevels.LOG_LEVEL_DEBUG)
-    bonuses_response_bs = BeautifulSoup(card_holder_response, 'html.parser')
-
-    bonus_container = bonuses_response_bs.find('div', attrs={'id': 'bonusCards-container'})
-    if bonus_container is None:
-        log("Aborting card hold opening as the bonus response div was not found!", LogLevels.LOG_LEVEL_ERROR)
-        save_error_dump_file(dump=bonuses_response_bs.text, tag='card_holder_bonuses_div_not_found')
-        raise ReferenceError("Div with class bonusCards-container was not found")
-
-    bonuses_divs = bonus_container.find_all('div', attrs={'class': 'showCards-card front-card'})
-    parsed_bonuses = [parse_card_holder_bonus(bonus_bs) for bonus_bs in bonuses_divs]
-
-    return {
-        'bonuses': parsed_bonuses,
-        'total_bonuses': len(bonuses_divs),
-    }
-
-
-def parse_card_holder_bonus(bonus_bs: BeautifulSoup) -> Dict:
-    """
-    Parse a single bonus element of BeautifulSoup type
-    :param bonus_bs:
-    :return:
-    """
-    log("Entering parse_card_holder_bonus method", LogLevels.LOG_LEVEL_DEBUG)
-    bonus_div = bonus_bs.find('div', attrs={'class': 'front-side-title textFill'})
-    if bonus_div is None:
-        log("Aborting card hold opening as the bonus div was not found!", LogLevels.LOG_LEVEL_ERROR)
-        save_error_dump_file(dump=bonus_bs.text, tag='card_holder_bonus_div_not_found')
-        raise ReferenceError("Div not found in the bonus card container")
-
-    bonus_type = 'OTHER'
-    bonus_text = sanitize_text(bonus_div.text)
-
-    bonus_image = bonus_div.find('img')
-    if bonus_image is None:
-        log("No image on card hold bonus opening!", LogLevels.LOG_LEVEL_WARNING)
-    else:
-        bonus_type = get_bonus_type_from_image_src(bonus_image['src'])
-
-    return {
-        'bonus_type': bonus_type,
-        'bonus_text': bonus_text,
-    }
-
-
-def get_bonus_type_from_image_src(bonus_image_src: str):
-    """
-    Retrieve the type of the bonus based on the bonus image source
-    :param bonus_image_src:
-    :return:
-    """
-    log("Entering get_bonus_type_from_image_src method", LogLevels.LOG_LEVEL_DEBUG)
-    image_src_parts = bonus_image_src.split('/')
-
-    if image_src_parts[-1] == 'researchDollars.png':
-        return 'RESEARCH_DOLLARS'
-    elif image_src_parts[-1] == 'dollars.png':
-        return 'DOLLARS'
-    else:
-        log(f"The bonus type could not be retrieved for image src '{bonus_image_src}'!", LogLevels.LOG_LEVEL_WARNING)
-        return 'UNKNOWN'
-
-
-def save_card_holder_results(parsed_results: Dict):
-    """
-    Saves the free Card Holder results to a json file
-    :param parsed_results:
-    :return:
-    """
-    log("Entering save_card_holder_results method", LogLevels.LOG_LEVEL_DEBUG)
-    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    filename = f'card_holder_results__{timestamp}.json'
-    filepath = os.path.join(os.getenv('CARD_HOLD_RESULTS_FOLDER', '/data/card_hold_results'), filename)
-
-    save_dict_to_json(parsed_results, filepath)
+import json
+
+from bs4 import BeautifulSoup
+from typing import Dict, Optional, Tuple
+
+from modules.error_dumps import save_error_dump_file
+from modules.html_parser import parse_html
+from modules.journal import EventTypes, record_event
+from modules.logger import log, LogLevels
+from modules.session_manager import SessionManager
+from modules.strings import parse_countdown_seconds, sanitize_text
+from modules.urls import build_url, get_base_host
+
+
+def get_free_card_holder_if_available(session_manager: SessionManager) -> Optional[int]:
+    """
+    Checks if the free Card Holder is available, and open it if so. Returns the seconds until the next free Card Holder
+    when a countdown is shown (None if unknown).
+    :param session_manager:
+    :return:
+    """
+    log("Entering get_free_card_holder_if_available method", LogLevels.LOG_LEVEL_DEBUG)
+    is_available, countdown_seconds = fetch_free_card_holder_status(session_manager=session_manager)
+    if not is_available:
+        return countdown_seconds
+
+    card_holder_result = open_free_card_holder(session_manager=session_manager)
+    log("Free card holder results: {}".format(json.dumps(card_holder_result)))
+
+    return None
+
+
+def is_free_card_holder_available(session_manager: SessionManager) -> bool:
+    """
+    Determines if the free Card Holder is available to open
+    :param session_manager:
+    :return:
+    """
+    log("Entering is_free_card_holder_available method", LogLevels.LOG_LEVEL_DEBUG)
+    is_available, _ = fetch_free_card_holder_status(session_manager=session_manager)
+
+    return is_available
+
+
+def fetch_free_card_holder_status(session_manager: SessionManager) -> Tuple:
+    """
+    Retrieves a tuple of 2 items, containing if the free Card Holder is available to open and the seconds left in its
+    countdown (None if available or if the countdown could not be parsed).
+    :param session_manager:
+    :return:
+    """
+    log("Entering fetch_free_card_holder_status method", LogLevels.LOG_LEVEL_DEBUG)
+    card_holder_response = session_manager.request(
+        url=build_url('/shop/cardholder'),
+        method=SessionManager.Methods.GET,
+        extra_headers={
+            'Referer': build_url('/home'),
+        },
+    )
+    card_holder_bs = parse_html(card_holder_response.text, page='card_holder')
+
+    card_holder_title = card_holder_bs.find('div', attrs={'class': 'cardholder-title'})
+    if card_holder_title is None:
+        log("Aborting card hold opening as the page title was not found!", LogLevels.LOG_LEVEL_ERROR)
+        save_error_dump_file(dump=card_holder_response.text, tag='card_holder_title_div_not_found')
+        raise ReferenceError("Div with class cardholder-title was not found")
+
+    countdown_div = card_holder_bs.find('div', attrs={'id': 'timerFree'})
+    log("Free Card Holder available: {}".format('NO' if countdown_div else 'YES'))
+    if countdown_div is None:
+        return True, None
+
+    countdown_seconds = parse_card_holder_countdown(countdown_div)
+    if countdown_seconds is not None:
+        log(f"Next free Card Holder in {countdown_seconds} seconds", LogLevels.LOG_LEVEL_NOTICE)
+
+    return False, countdown_seconds
+
+
+def parse_card_holder_countdown(countdown_div: BeautifulSoup) -> Optional[int]:
+    """
+    Parses the free Card Holder countdown div into the seconds left (from a numeric data attribute or from its text)
+    :param countdown_div:
+    :return:
+    """
+    log("Entering parse_card_holder_countdown method", LogLevels.LOG_LEVEL_DEBUG)
+    for attribute, value in countdown_div.attrs.items():
+        if attribute.startswith('data-') and str(value).isdigit():
+            return int(value)
+
+    countdown_seconds = parse_countdown_seconds(countdown_div.text)
+    if countdown_seconds is None:
+        log(f"Unable to parse the free Card Holder countdown '{countdown_div.text}'", LogLevels.LOG_LEVEL_WARNING)
+
+    return countdown_seconds
+
+
+def open_free_card_holder(session_manager: SessionManager) -> Dict:
+    """
+    Opens the free Card Holder, save and return the results (must check if available first!)
+    :param session_manager:
+    :return:
+    """
+    log("Entering open_free_card_holder method", LogLevels.LOG_LEVEL_DEBUG)
+    card_holder_page_response = session_manager.request(
+        url=build_url('/shop/cardholder'),
+        method=SessionManager.Methods.GET,
+        extra_headers={
+            'Referer': build_url('/home'),
+        },
+    )
+    log(f'Card holder page response got {len(card_holder_page_response.text)} bytes!', LogLevels.LOG_LEVEL_NOTICE)
+
+    # ToDo: Discover how to find the localized URL from the previous page
+    free_card_url = build_url('/shop/buycards/5/0/Econ%C3%B4mica')
+
+    free_card_holder_modal_response = session_manager.request(
+        url=free_card_url,
+        method=SessionManager.Methods.GET,
+        extra_headers={
+            'Accept': '*/*',
+            'Authority': get_base_host(),
+            'Referer': build_url('/shop/cardholder'),
+            'X-Requested-With': 'XMLHttpRequest',
+        },
+    )
+    log(
+        f'Free card holder modal response got {len(free_card_holder_modal_response.text)} bytes!',
+        LogLevels.LOG_LEVEL_NOTICE
+    )
+
+    free_card_holder_modal_response_bs = parse_html(free_card_holder_modal_response.text, page='card_holder_modal')
+    free_card_csrf_token_input = free_card_holder_modal_response_bs.find('input', attrs={'id': 'form__token'})
+    free_card_form_id_input = free_card_holder_modal_response_bs.find('input', attrs={'id': 'form_id'})
+
+    csrf_token_value = free_card_csrf_token_input['value']
+    form_id_value = free_card_form_id_input['value']
+    free_card_opening_payload = {
+        'form[id]': form_id_value,
+        'form[_token]': csrf_token_value,
+    }
+
+    free_card_holder_opening_response = session_manager.request(
+        url=free_card_url,
+        method=SessionManager.Methods.POST,
+        payload=free_card_opening_payload,
+        extra_headers={
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Referer': free_card_url,
+            'X-Requested-With': 'XMLHttpRequest',
+        },
+    )
+    log(
+        f'Free card holder opening response got {len(free_card_holder_opening_response.text)} bytes!',
+        LogLevels.LOG_LEVEL_NOTICE
+    )
+
+    parsed_results = parse_card_holder_bonuses(free_card_holder_opening_response.text)
+
+    save_card_holder_results(parsed_results)
+
+    return parsed_results
+
+
+def parse_card_holder_bonuses(card_holder_response: str) -> Dict:
+    """
+    Parse the HTML response of the card holder into a dict
+    :param card_holder_response:
+    :return:
+    """
+    log("Entering parse_card_holder_bonuses method", LogLevels.LOG_LEVEL_DEBUG)
+    bonuses_response_bs = parse_html(card_holder_response, page='card_holder_bonuses')
+
+    bonus_container = bonuses_response_bs.find('div', attrs={'id': 'bonusCards-container'})
+    if bonus_container is None:
+        log("Aborting card hold opening as the bonus response div was not found!", LogLevels.LOG_LEVEL_ERROR)
+        save_error_dump_file(dump=bonuses_response_bs.text, tag='card_holder_bonuses_div_not_found')
+        raise ReferenceError("Div with class bonusCards-container was not found")
+
+    bonuses_divs = bonus_container.find_all('div', attrs={'class': 'showCards-card front-card'})
+    parsed_bonuses = [parse_card_holder_bonus(bonus_bs) for bonus_bs in bonuses_divs]
+
+    return {
+        'bonuses': parsed_bonuses,
+        'total_bonuses': len(bonuses_divs),
+    }
+
+
+def parse_card_holder_bonus(bonus_bs: BeautifulSoup) -> Dict:
+    """
+    Parse a single bonus element of BeautifulSoup type
+    :param bonus_bs:
+    :return:
+    """
+    log("Entering parse_card_holder_bonus method", LogLevels.LOG_LEVEL_DEBUG)
+    bonus_div = bonus_bs.find('div', attrs={'class': 'front-side-title textFill'})
+    if bonus_div is None:
+        log("Aborting card hold opening as the bonus div was not found!", LogLevels.LOG_LEVEL_ERROR)
+        save_error_dump_file(dump=bonus_bs.text, tag='card_holder_bonus_div_not_found')
+        raise ReferenceError("Div not found in the bonus card container")
+
+    bonus_type = 'OTHER'
+    bonus_text = sanitize_text(bonus_div.text)
+
+    bonus_image = bonus_div.find('img')
+    if bonus_image is None:
+        log("No image on card hold bonus opening!", LogLevels.LOG_LEVEL_WARNING)
+    else:
+        bonus_type = get_bonus_type_from_image_src(bonus_image['src'])
+
+    return {
+        'bonus_type': bonus_type,
+        'bonus_text': bonus_text,
+    }
+
+
+def get_bonus_type_from_image_src(bonus_image_src: str):
+    """
+    Retrieve the type of the bonus based on the bonus image source
+    :param bonus_image_src:
+    :return:
+    """
+    log("Entering get_bonus_type_from_image_src method", LogLevels.LOG_LEVEL_DEBUG)
+    image_src_parts = bonus_image_src.split('/')
+
+    if image_src_parts[-1] == 'researchDollars.png':
+        return 'RESEARCH_DOLLARS'
+    elif image_src_parts[-1] == 'dollars.png':
+        return 'DOLLARS'
+    else:
+        log(f"The bonus type could not be retrieved for image src '{bonus_image_src}'!", LogLevels.LOG_LEVEL_WARNING)
+        return 'UNKNOWN'
+
+
+def save_card_holder_results(parsed_results: Dict):
+    """
+    Saves the free Card Holder results to the events journal
+    :param parsed_results:
+    :return:
+    """
+    log("Entering save_card_holder_results method", LogLevels.LOG_LEVEL_DEBUG)
+    record_event(event_type=EventTypes.CARD_HOLDER, data=parsed_results)
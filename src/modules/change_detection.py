@@ -0,0 +1,427 @@
+import hashlib
+import json
+import os
+import threading
+
+from typing import Dict, List, Optional, Tuple
+
+from modules.clock import get_clock
+from modules.file import FileLock, read_text_file, save_dict_to_json
+from modules.journal import EventJournal
+from modules.logger import log, LogLevels
+from modules.strings import return_signed_decimal
+
+# Line fields left out of the comparison, as they change on every update
+LINE_IGNORED_FIELDS = ['last_updated_at']
+
+LINE_PRICE_FIELDS = ['ideal_cost', 'current_cost']
+
+
+class ChangeIndexNames:
+    """
+    Enum class for the kinds of entities kept on the change indexes
+    """
+    LINES = 'lines'
+    LINES_SUMMARY = 'lines_summary'
+    AIRPLANES = 'airplanes'
+
+
+class ChangeEventTypes:
+    """
+    Enum class for the types of the change events stored in the changes journal
+    """
+    PRICE_CHANGED = 'price_changed'
+    DEMAND_DROPPED = 'demand_dropped'
+    WEAR_THRESHOLD_CROSSED = 'wear_threshold_crossed'
+    LINE_ADDED = 'line_added'
+    LINE_REMOVED = 'line_removed'
+    AIRPLANE_ADDED = 'airplane_added'
+    AIRPLANE_REMOVED = 'airplane_removed'
+
+
+def is_change_detection_enabled() -> bool:
+    """
+    Determines if the change detection (skipping the writes of the unchanged lines and listings, and recording the
+    change events) is enabled in the environment
+    :return:
+    """
+    return os.getenv('CHANGE_DETECTION', 'false').lower() in ['1', 'true', 'yes']
+
+
+def get_field_hash(value) -> str:
+    """
+    Retrieve the (short) hash of a field value
+    :param value:
+    :return:
+    """
+    value_json = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+    return hashlib.blake2b(value_json.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class ChangeIndex:
+    """
+    Index of the stored version of each entity of a kind (e.g. the lines or the airplanes), keeping the hash of each of
+    its fields (and the values of the fields watched by the change events) so a freshly parsed version can be compared
+    field by field without loading the stored one. It's persisted as a whole in one file, shared with the other
+    processes (e.g. the work queue workers).
+    """
+    def __init__(self, name: str, filepath: str):
+        """
+        ChangeIndex class constructor
+        :param name:
+        :param filepath:
+        """
+        log("Instantiating ChangeIndex class", LogLevels.LOG_LEVEL_DEBUG)
+        self.name = name
+        self.filepath = filepath
+        self.is_dirty = False
+        self._entries: Dict[str, Dict] = {}
+        self._removed_keys = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_keys(self) -> List[str]:
+        """
+        Retrieve the keys of the indexed entities
+        :return:
+        """
+        with self._lock:
+            return list(self._entries.keys())
+
+    def get_checked_at(self, key) -> Optional[float]:
+        """
+        Retrieve when an entity was last compared (None if it's not indexed)
+        :param key:
+        :return:
+        """
+        entry = self._entries.get(str(key))
+
+        return entry['checked_at'] if entry is not None else None
+
+    def compare(self, key, fields: Dict, watched_fields: List[str] = None) -> Tuple[Optional[Dict], List[str]]:
+        """
+        Compares the fields of an entity with its indexed version, indexing the new version. Retrieve the previous
+        entry (None if the entity wasn't indexed) and the names of the changed fields.
+        :param key:
+        :param fields:
+        :param watched_fields: fields whose values are kept on the index (to be reported by the change events)
+        :return:
+        """
+        key = str(key)
+        hashes = {field: get_field_hash(value) for field, value in fields.items()}
+
+        with self._lock:
+            previous_entry = self._entries.get(key)
+            previous_hashes = previous_entry['hashes'] if previous_entry is not None else {}
+            changed_fields = [field for field, field_hash in hashes.items() if previous_hashes.get(field) != field_hash]
+            self._entries[key] = {
+                'hashes': hashes,
+                'values': {field: fields.get(field) for field in watched_fields or []},
+                'checked_at': get_clock().time(),
+            }
+            self._removed_keys.discard(key)
+            self.is_dirty = True
+
+        return previous_entry, changed_fields
+
+    def remove(self, key) -> Optional[Dict]:
+        """
+        Removes an entity from the index, retrieving its entry (None if it wasn't indexed)
+        :param key:
+        :return:
+        """
+        key = str(key)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            self._removed_keys.add(key)
+            self.is_dirty = True
+
+        return entry
+
+    def load_from_file(self):
+        """
+        Load the index from the file stored locally
+        :return:
+        """
+        log("Entering ChangeIndex.load_from_file method", LogLevels.LOG_LEVEL_DEBUG)
+
+        if not os.path.isfile(self.filepath):
+            return self
+
+        self.merge_from_file()
+        self.is_dirty = False
+
+        return self
+
+    def merge_from_file(self):
+        """
+        Merge the index file stored locally into the index (keeping the most recently compared version of each entity,
+        unless it was removed by this process)
+        :return:
+        """
+        index_json = json.loads(read_text_file(filepath=self.filepath))
+        with self._lock:
+            for key, entry in index_json.items():
+                if key in self._removed_keys:
+                    continue
+
+                if key not in self._entries or entry['checked_at'] > self._entries[key]['checked_at']:
+                    self._entries[key] = entry
+
+    def persist_to_file(self):
+        """
+        Persist the index to the file stored locally (only if it has changed)
+        :return:
+        """
+        log("Entering ChangeIndex.persist_to_file method", LogLevels.LOG_LEVEL_DEBUG)
+
+        if not self.is_dirty:
+            return
+
+        with FileLock(self.filepath):
+            if os.path.isfile(self.filepath):
+                self.merge_from_file()
+            with self._lock:
+                entries = dict(self._entries)
+            save_dict_to_json(input_dict=entries, output_filepath=self.filepath, compact=True)
+
+        self.is_dirty = False
+        log(f"Persisted {len(entries)} {self.name} to change index {self.filepath}!", LogLevels.LOG_LEVEL_DEBUG)
+
+
+_change_indexes: Dict[str, ChangeIndex] = {}
+_change_indexes_lock = threading.Lock()
+
+
+def get_change_index(name: str) -> ChangeIndex:
+    """
+    Retrieve the process-wide change index of the given kind of entities (loaded from the file on the first call)
+    :param name:
+    :return:
+    """
+    with _change_indexes_lock:
+        if name not in _change_indexes:
+            folder = os.getenv('CHANGE_DETECTION_FOLDER', '/data/change_detection')
+            index = ChangeIndex(name=name, filepath=os.path.join(folder, f'{name}.json'))
+            _change_indexes[name] = index.load_from_file()
+
+        return _change_indexes[name]
+
+
+def persist_change_indexes():
+    """
+    Persist the change indexes loaded by this process (the ones that have changed) and the rollups of the changes
+    journal
+    :return:
+    """
+    with _change_indexes_lock:
+        indexes = list(_change_indexes.values())
+
+    for index in indexes:
+        index.persist_to_file()
+
+    if _change_journal is not None:
+        _change_journal.flush_rollups()
+
+
+_change_journal: Optional[EventJournal] = None
+
+
+def get_change_journal() -> EventJournal:
+    """
+    Retrieve the process-wide changes journal (configured from the environment)
+    :return:
+    """
+    global _change_journal
+
+    if _change_journal is None:
+        _change_journal = EventJournal(
+            folder=os.getenv('CHANGE_EVENTS_FOLDER', '/data/change_events'),
+            segment_max_bytes=int(os.getenv('CHANGE_EVENTS_SEGMENT_MAX_BYTES', 10 * 1024 * 1024)),
+            rollups_flush_events=int(os.getenv('EVENTS_JOURNAL_ROLLUPS_FLUSH_EVENTS', 100)),
+        )
+
+    return _change_journal
+
+
+def record_change_event(event_type: str, data: Dict) -> Dict:
+    """
+    Records a change event on the changes journal
+    :param event_type:
+    :param data:
+    :return:
+    """
+    log(f"Change detected ({event_type}): {json.dumps(data, ensure_ascii=False)}", LogLevels.LOG_LEVEL_NOTICE)
+
+    return get_change_journal().record(event_type=event_type, data=data, timestamp=get_clock().now())
+
+
+def detect_line_changes(line_id: int, line_dict: Dict) -> bool:
+    """
+    Compares a freshly updated line (serialized) with its stored version, recording the price changes and the demand
+    drops. Retrieve if the line has changed (so it has to be persisted).
+    :param line_id:
+    :param line_dict:
+    :return:
+    """
+    log("Entering detect_line_changes method", LogLevels.LOG_LEVEL_DEBUG)
+    fields = {field: value for field, value in line_dict.items() if field not in LINE_IGNORED_FIELDS}
+    previous_entry, changed_fields = get_change_index(ChangeIndexNames.LINES).compare(
+        key=line_id,
+        fields=fields,
+        watched_fields=LINE_PRICE_FIELDS + ['total_demand'],
+    )
+    if previous_entry is None:
+        return True
+
+    previous_values = previous_entry['values']
+    for field in LINE_PRICE_FIELDS:
+        if field in changed_fields and previous_values.get(field) is not None:
+            record_change_event(ChangeEventTypes.PRICE_CHANGED, {
+                'line_id': line_id,
+                'name': fields['name'],
+                'field': field,
+                'from': previous_values[field],
+                'to': fields[field],
+            })
+
+    if 'total_demand' in changed_fields and previous_values.get('total_demand') is not None:
+        tolerance = float(os.getenv('CHANGE_DEMAND_DROP_TOLERANCE', 0.1))
+        dropped_categories = {
+            category: {'from': previous_demand, 'to': fields['total_demand'].get(category)}
+            for category, previous_demand in previous_values['total_demand'].items()
+            if previous_demand and (fields['total_demand'].get(category) or 0) < previous_demand * (1 - tolerance)
+        }
+        if len(dropped_categories) > 0:
+            record_change_event(ChangeEventTypes.DEMAND_DROPPED, {
+                'line_id': line_id,
+                'name': fields['name'],
+                'categories': dropped_categories,
+            })
+
+    return len(changed_fields) > 0
+
+
+class ListingChanges:
+    """
+    Comparison of a listing (the lines summary or the airplanes list) with its indexed version, row by row as they're
+    fetched, recording the change events of the added and removed rows. The first listing only seeds the index.
+    """
+    def __init__(self, index: ChangeIndex, added_event_type: str, removed_event_type: str):
+        """
+        ListingChanges class constructor
+        :param index:
+        :param added_event_type:
+        :param removed_event_type:
+        """
+        log("Instantiating ListingChanges class", LogLevels.LOG_LEVEL_DEBUG)
+        self.index = index
+        self.added_event_type = added_event_type
+        self.removed_event_type = removed_event_type
+        self.is_seeding = len(index) == 0
+        self.has_changes = False
+        self.removed_keys = []
+        self._seen_keys = set()
+
+    def compare_row(self, row: Dict, watched_fields: List[str] = None) -> Tuple[Optional[Dict], List[str]]:
+        """
+        Compares a listing row with its indexed version (see ChangeIndex.compare), recording its addition
+        :param row:
+        :param watched_fields:
+        :return:
+        """
+        self._seen_keys.add(str(row['id']))
+        previous_entry, changed_fields = self.index.compare(
+            key=row['id'],
+            fields=row,
+            watched_fields=['name'] + (watched_fields or []),
+        )
+        if len(changed_fields) > 0:
+            self.has_changes = True
+
+        if previous_entry is None and not self.is_seeding:
+            record_change_event(self.added_event_type, {'id': row['id'], 'name': row.get('name')})
+
+        return previous_entry, changed_fields
+
+    def finish(self):
+        """
+        Finishes the comparison once all the rows were compared, recording the removal of the rows missing from the
+        listing and persisting the index
+        :return:
+        """
+        log("Entering ListingChanges.finish method", LogLevels.LOG_LEVEL_DEBUG)
+        for key in sorted(set(self.index.get_keys()) - self._seen_keys):
+            entry = self.index.remove(key)
+            self.removed_keys.append(key)
+            self.has_changes = True
+            record_change_event(self.removed_event_type, {'id': int(key), 'name': entry['values'].get('name')})
+
+        if self.is_seeding:
+            log(f"Seeded the {self.index.name} change index with {len(self.index)} row(s)", LogLevels.LOG_LEVEL_NOTICE)
+        else:
+            log(f"Compared the {self.index.name} listing: {'changed' if self.has_changes else 'unchanged'}")
+
+        self.index.persist_to_file()
+
+
+def create_listing_changes(name: str, added_event_type: str, removed_event_type: str) -> ListingChanges:
+    """
+    Creates the comparison of a listing with its change index
+    :param name:
+    :param added_event_type:
+    :param removed_event_type:
+    :return:
+    """
+    return ListingChanges(
+        index=get_change_index(name),
+        added_event_type=added_event_type,
+        removed_event_type=removed_event_type,
+    )
+
+
+def detect_airplane_changes(listing_changes: ListingChanges, airplane: Dict):
+    """
+    Compares an airplane of the airplanes list with its indexed version, recording when its wear crosses the threshold
+    (in either direction)
+    :param listing_changes:
+    :param airplane:
+    :return:
+    """
+    previous_entry, changed_fields = listing_changes.compare_row(row=airplane, watched_fields=['wearing'])
+    if previous_entry is None or 'wearing' not in changed_fields:
+        return
+
+    threshold = int(os.getenv('CHANGE_WEAR_THRESHOLD', 80))
+    previous_wear = return_signed_decimal(previous_entry['values'].get('wearing'))
+    wear = return_signed_decimal(airplane.get('wearing'))
+    if previous_wear is None or wear is None or (previous_wear >= threshold) == (wear >= threshold):
+        return
+
+    record_change_event(ChangeEventTypes.WEAR_THRESHOLD_CROSSED, {
+        'id': airplane['id'],
+        'name': airplane.get('name'),
+        'threshold': threshold,
+        'from': previous_wear,
+        'to': wear,
+    })
+
+
+def execute_changes_command(arguments: List):
+    """
+    Prints the totals of each change event type for the last given days (or the whole changes journal if not given),
+    or rebuilds the rollups of the changes journal from its segments ('rebuild')
+    :param arguments:
+    :return:
+    """
+    log("Entering execute_changes_command method", LogLevels.LOG_LEVEL_DEBUG)
+    if arguments == ['rebuild']:
+        get_change_journal().rebuild_rollups()
+        return
+
+    days = int(arguments[0]) if len(arguments) > 0 else None
+    print(f"Change events totals ({'last {} day(s)'.format(days) if days is not None else 'whole journal'}):")
+    print(json.dumps(get_change_journal().get_totals(days=days), indent=4, sort_keys=True))
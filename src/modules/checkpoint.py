@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+
+from typing import Any, Dict, Tuple
+
+from modules.clock import get_clock
+from modules.file import FileMode, read_text_file, remove_file, save_text_to_file
+from modules.logger import log, LogLevels
+from modules.run_report import add_run_usage
+
+
+class CheckpointUnits:
+    """
+    Enum class for the units of work recorded in the cycle checkpoints
+    """
+    SUMMARY_PAGE = 'summary_page'
+    LINE_UPDATED = 'line_updated'
+    PRICE_POSTED = 'price_posted'
+
+
+class CycleCheckpoint:
+    """
+    Durable journal of the units of work completed in an update cycle (one JSON line appended per unit), reloaded on
+    start so an interrupted cycle resumes where it stopped
+    """
+    def __init__(self, cycle_name: str, folder: str):
+        """
+        CycleCheckpoint class constructor
+        :param cycle_name:
+        :param folder:
+        """
+        log("Instantiating CycleCheckpoint class", LogLevels.LOG_LEVEL_DEBUG)
+        self.cycle_name = cycle_name
+        self.filepath = os.path.join(folder, f'{cycle_name}.jsonl')
+        self._records: Dict[Tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def load(self, max_age_seconds: float):
+        """
+        Loads the units of work recorded by a previous (interrupted) run of the cycle, discarding the checkpoint if it
+        is older than the given max age
+        :param max_age_seconds:
+        :return:
+        """
+        log("Entering CycleCheckpoint.load method", LogLevels.LOG_LEVEL_DEBUG)
+        if not os.path.isfile(self.filepath):
+            return self
+
+        if get_clock().time() - os.path.getmtime(self.filepath) > max_age_seconds:
+            log(f"Discarding outdated checkpoint of cycle '{self.cycle_name}'", LogLevels.LOG_LEVEL_WARNING)
+            self.discard()
+            return self
+
+        checkpoint_text = read_text_file(filepath=self.filepath)
+        if not checkpoint_text.endswith('\n'):
+            # Terminates a record truncated by the interruption, so the next ones start on a new line
+            save_text_to_file(input_text='\n', output_filepath=self.filepath, file_mode=FileMode.FILE_MODE_APPEND)
+
+        for record_line in checkpoint_text.splitlines():
+            try:
+                record = json.loads(record_line)
+            except json.JSONDecodeError:
+                log(f"Ignoring truncated record on checkpoint {self.filepath}", LogLevels.LOG_LEVEL_WARNING)
+                continue
+
+            self._records[(record['unit'], str(record['key']))] = record
+
+        log(f"Resuming cycle '{self.cycle_name}' from a checkpoint with {len(self)} completed unit(s) of work")
+
+        return self
+
+    def is_done(self, unit: str, key, max_age_seconds: float = None) -> bool:
+        """
+        Determines if a given unit of work was already completed in this cycle, and not longer than the given max age
+        ago if given (reusing it counts as a cache hit on the run report)
+        :param unit:
+        :param key:
+        :param max_age_seconds:
+        :return:
+        """
+        record = self._records.get((unit, str(key)))
+        is_done = record is not None and (
+            max_age_seconds is None or get_clock().time() - record.get('done_at', 0) <= max_age_seconds
+        )
+        if is_done:
+            add_run_usage(cache_hits=1)
+
+        return is_done
+
+    def get(self, unit: str, key) -> Any:
+        """
+        Retrieve the data recorded with a completed unit of work
+        :param unit:
+        :param key:
+        :return:
+        """
+        return self._records.get((unit, str(key)), {}).get('data')
+
+    def mark_done(self, unit: str, key, data: Any = None):
+        """
+        Records a unit of work as completed (appending it to the checkpoint file, locked so the records of the units
+        completed concurrently don't interleave). Inside a write batch, the record is appended when the batch is
+        committed, after the files written for the unit of work, so it never outlives a lost write.
+        :param unit:
+        :param key:
+        :param data:
+        :return:
+        """
+        record = {'unit': unit, 'key': str(key), 'data': data, 'done_at': round(get_clock().time(), 3)}
+        with self._lock:
+            self._records[(unit, str(key))] = record
+            save_text_to_file(
+                input_text=json.dumps(record, ensure_ascii=False) + '\n',
+                output_filepath=self.filepath,
+                file_mode=FileMode.FILE_MODE_APPEND,
+            )
+
+    def complete(self):
+        """
+        Finishes the cycle, removing its checkpoint so the next run starts from scratch
+        :return:
+        """
+        log(f"Cycle '{self.cycle_name}' completed ({len(self)} unit(s) of work)", LogLevels.LOG_LEVEL_NOTICE)
+        self.discard()
+
+    def discard(self):
+        """
+        Removes the checkpoint file and the loaded records
+        :return:
+        """
+        self._records = {}
+        remove_file(self.filepath)
+
+
+def open_cycle_checkpoint(cycle_name: str, restart: bool = False) -> CycleCheckpoint:
+    """
+    Opens the checkpoint of an update cycle, resuming the previous run unless a restart is requested
+    :param cycle_name:
+    :param restart:
+    :return:
+    """
+    log("Entering open_cycle_checkpoint method", LogLevels.LOG_LEVEL_DEBUG)
+    checkpoint = CycleCheckpoint(
+        cycle_name=cycle_name,
+        folder=os.getenv('CHECKPOINTS_FOLDER', '/data/checkpoints'),
+    )
+
+    if restart:
+        log(f"Restarting cycle '{cycle_name}' from scratch", LogLevels.LOG_LEVEL_NOTICE)
+        checkpoint.discard()
+        return checkpoint
+
+    return checkpoint.load(max_age_seconds=float(os.getenv('CHECKPOINT_MAX_AGE_HOURS', 24)) * 3600)
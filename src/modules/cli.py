@@ -1,92 +1,134 @@
-import datetime
-import os
-import subprocess
-import time
-
-from typing import List
-
-from modules.airplanes import fetch_all_airplanes_list
-from modules.card_holder import get_free_card_holder_if_available
-from modules.lines import fetch_all_lines_list
-from modules.lines_data import update_all_lines_data
-from modules.logger import log, LogLevels
-from modules.session_manager import SessionManager
-from modules.time import wait_random_interval
-from modules.travel_cards_wheel import spin_travel_cards_wheel_if_available
-from modules.workshop import get_free_workshop_items
-
-
-def execute_from_arguments(arguments: List):
-    """
-    Execute the program based on the given arguments
-    :param arguments:
-    :return:
-    """
-    log(f"Executing from arguments: [ {' , '.join(arguments)} ]", LogLevels.LOG_LEVEL_DEBUG)
-    if len(arguments) == 0:
-        execute_infinite_loop()
-        return
-
-    if arguments == ['-d'] or arguments == ['--daemon']:
-        log("CLI: Running as a daemon")
-        subprocess.run(['python3', 'main.py', '-a'])
-        return
-
-    if arguments == ['-u'] or arguments == ['--update-lines-ticket']:
-        log("CLI: Updating lines ticket values")
-        session_manager = SessionManager()
-        update_all_lines_data(session_manager=session_manager)
-        return
-
-    log("Unknown set of arguments ['{}']!".format("','".join(arguments)), LogLevels.LOG_LEVEL_ERROR)
-
-
-def execute_infinite_loop():
-    """
-    Execute the main tasks in an eternal loop, waiting a random interval between each of the executions
-    :return:
-    """
-    log("Entering execute_infinite_loop method", LogLevels.LOG_LEVEL_DEBUG)
-    while True:
-        try:
-            execute_tasks()
-            wait_random_interval(
-                wait_time_min=os.getenv('WAIT_TIME_MIN', 60*60*5),
-                wait_time_max=os.getenv('WAIT_TIME_MAX', 60*60*8),
-            )
-        except ReferenceError:
-            log("An error occurred when parsing a page, executing again in 10 seconds...")
-            time.sleep(10)
-
-
-def execute_tasks():
-    """
-    Main execution block of the regular tasks
-    :return:
-    """
-    log("")
-    log("Executing main tasks!")
-
-    start_time = time.time()
-
-    session_manager = SessionManager()
-
-    # Travel cards wheel
-    spin_travel_cards_wheel_if_available(session_manager=session_manager)
-
-    # Free card holder
-    get_free_card_holder_if_available(session_manager=session_manager)
-
-    # Free workshop items
-    get_free_workshop_items(session_manager=session_manager)
-
-    # Fetch the airplanes
-    fetch_all_airplanes_list(session_manager=session_manager)
-
-    # Fetch the lines
-    fetch_all_lines_list(session_manager=session_manager)
-
-    total_interval = round(time.time() - start_time)
-    total_timedelta = datetime.timedelta(seconds=total_interval)
-
-    log(f"Finished executing main tasks! Total execution time: {total_interval} seconds ({str(total_timedelta)})")
+import importlib
+
+from typing import Callable, List, Optional
+
+from modules.logger import log, LogLevels
+
+
+class CliCommand:
+    """
+    Class representing a CLI command: its flags, the accepted amount of arguments after the flag and its handler, given
+    as '<module>:<function>' so the modules it depends on are only imported when the command runs
+    """
+    def __init__(self, flags: List[str], handler: str, max_arguments: Optional[int] = None, message: str = None):
+        """
+        CliCommand class constructor
+        :param flags:
+        :param handler: '<module>:<function>' receiving the arguments after the flag (if it accepts any)
+        :param max_arguments: max amount of arguments after the flag (None if unlimited)
+        :param message: logged when the command runs
+        """
+        self.flags = flags
+        self.handler = handler
+        self.max_arguments = max_arguments
+        self.message = message
+
+    def matches(self, arguments: List) -> bool:
+        """
+        Determines if the given arguments call this command
+        :param arguments:
+        :return:
+        """
+        return arguments[0] in self.flags and (self.max_arguments is None or len(arguments) - 1 <= self.max_arguments)
+
+    def load_handler(self) -> Callable:
+        """
+        Imports the command handler
+        :return:
+        """
+        module_name, function_name = self.handler.split(':')
+
+        return getattr(importlib.import_module(module_name), function_name)
+
+
+# Handler of the main tasks loop (running without arguments)
+LOOP_HANDLER = 'modules.cycle:execute_infinite_loop'
+
+COMMANDS = [
+    CliCommand(['-d', '--daemon'], 'modules.scheduler:execute_daemon', 0, "Running as a daemon"),
+    CliCommand(
+        ['-u', '--update-lines-ticket'], 'modules.cycle:execute_update_lines_command', 2,
+        "Updating lines ticket values",
+    ),
+    CliCommand(
+        ['--queue-coordinator'], 'modules.lines_queue:execute_queue_coordinator', 0,
+        "Queueing the lines update on the work queue",
+    ),
+    CliCommand(['--queue-worker'], 'modules.lines_queue:execute_queue_workers', 1, "Running the work queue workers"),
+    CliCommand(['--report-trend'], 'modules.run_report:execute_report_trend_command', 1),
+    CliCommand(['-e', '--error-dumps'], 'modules.error_dumps:execute_error_dumps_command'),
+    CliCommand(['-a', '--accounts'], 'modules.accounts:execute_accounts_command', message="Supervising the accounts"),
+    CliCommand(
+        ['--stand-in-server'], 'loadtest.server:execute_stand_in_server_command', 1, "Running the stand-in server",
+    ),
+    CliCommand(
+        ['--profile'], 'modules.cycle:execute_profile_command', 0,
+        "Executing the main tasks once with the sampling profiler",
+    ),
+    CliCommand(
+        ['--simulate'], 'loadtest.simulation:execute_simulation_command', 2, "Simulating the bot on a virtual clock",
+    ),
+    CliCommand(['-b', '--benchmark'], 'benchmarks.runner:execute_benchmark_command'),
+    CliCommand(['-j', '--journal'], 'modules.journal:execute_journal_command'),
+    CliCommand(['--changes'], 'modules.change_detection:execute_changes_command', 1),
+    CliCommand(['--reparse'], 'modules.reparse:execute_reparse_command', 1, "Reparsing the archived pages"),
+    CliCommand(['-s', '--status'], 'modules.status:execute_status_command', 0),
+    CliCommand(['--import-time'], 'modules.startup:execute_import_time_command'),
+    CliCommand(['--precompile'], 'modules.startup:execute_precompile_command', 0, "Compiling the bytecode cache"),
+]
+
+
+def get_command(arguments: List) -> Optional[CliCommand]:
+    """
+    Retrieve the command called by the given arguments (None if there's no such command)
+    :param arguments:
+    :return:
+    """
+    for command in COMMANDS:
+        if command.matches(arguments):
+            return command
+
+    return None
+
+
+def load_command_handler(arguments: List) -> Optional[Callable]:
+    """
+    Imports the handler of the command called by the given arguments (the main tasks loop if there's no argument),
+    retrieving None if there's no such command
+    :param arguments:
+    :return:
+    """
+    if len(arguments) == 0:
+        module_name, function_name = LOOP_HANDLER.split(':')
+        return getattr(importlib.import_module(module_name), function_name)
+
+    command = get_command(arguments)
+
+    return command.load_handler() if command is not None else None
+
+
+def execute_from_arguments(arguments: List):
+    """
+    Execute the program based on the given arguments
+    :param arguments:
+    :return:
+    """
+    log(f"Executing from arguments: [ {' , '.join(arguments)} ]", LogLevels.LOG_LEVEL_DEBUG)
+    if len(arguments) == 0:
+        load_command_handler(arguments)()
+        return
+
+    command = get_command(arguments)
+    if command is None:
+        log("Unknown set of arguments ['{}']!".format("','".join(arguments)), LogLevels.LOG_LEVEL_ERROR)
+        return
+
+    if command.message is not None:
+        log(f"CLI: {command.message}")
+
+    # The handlers of the commands without arguments don't receive them
+    handler = command.load_handler()
+    if command.max_arguments == 0:
+        handler()
+    else:
+        handler(arguments[1:])
@@ -0,0 +1,146 @@
+import datetime
+import threading
+import time
+
+from typing import Optional
+
+
+class SystemClock:
+    """
+    Clock used by the scheduling and pacing paths (cycle waits, request pacing, task due times and lines staleness),
+    following the system time
+    """
+    is_simulated = False
+
+    def time(self) -> float:
+        """
+        Retrieve the current timestamp (in seconds)
+        :return:
+        """
+        return time.time()
+
+    def now(self) -> datetime.datetime:
+        """
+        Retrieve the current (local) datetime
+        :return:
+        """
+        return datetime.datetime.fromtimestamp(self.time())
+
+    def sleep(self, seconds: float):
+        """
+        Blocks for the given seconds
+        :param seconds:
+        :return:
+        """
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def sleep_until(self, timestamp: float):
+        """
+        Blocks until the given timestamp
+        :param timestamp:
+        :return:
+        """
+        self.sleep(timestamp - self.time())
+
+    def wait(self, condition: threading.Condition, timeout: float = None) -> bool:
+        """
+        Waits on a condition (must be held) until notified or until the timeout, returning False if it timed out
+        :param condition:
+        :param timeout:
+        :return:
+        """
+        return condition.wait(timeout=timeout)
+
+
+class SimulatedClock(SystemClock):
+    """
+    Clock advancing instantly: sleeping (or waiting on a condition with a timeout) moves the simulated time forward
+    instead of blocking, so days of scheduling can be replayed in seconds. The simulated time slept is accounted.
+    """
+    is_simulated = True
+    # Real time a wait on a condition lasts, so the other threads can notify it before the simulated timeout elapses
+    notify_window_seconds = 0.001
+
+    def __init__(self, started_at: float = None):
+        """
+        SimulatedClock class constructor
+        :param started_at:
+        """
+        self.started_at = started_at if started_at is not None else time.time()
+        self.slept_seconds = 0.0
+        self._now = self.started_at
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        with self._lock:
+            return self._now
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def sleep_until(self, timestamp: float):
+        # Moves to the timestamp at once, so the threads sleeping concurrently don't add up their sleeps
+        with self._lock:
+            if timestamp > self._now:
+                self.slept_seconds += timestamp - self._now
+                self._now = timestamp
+
+    def wait(self, condition: threading.Condition, timeout: float = None) -> bool:
+        if timeout is None:
+            return condition.wait()
+
+        # Notified within the window, the simulated time doesn't move (as the wait ended before the timeout)
+        if condition.wait(timeout=self.notify_window_seconds):
+            return True
+
+        self.advance(timeout)
+
+        return False
+
+    def advance(self, seconds: float):
+        """
+        Moves the simulated time forward by the given seconds (accounted as slept)
+        :param seconds:
+        :return:
+        """
+        if seconds <= 0:
+            return
+
+        with self._lock:
+            self._now += seconds
+            self.slept_seconds += seconds
+
+    def get_elapsed_seconds(self) -> float:
+        """
+        Retrieve the simulated seconds elapsed since the clock started
+        :return:
+        """
+        return self.time() - self.started_at
+
+
+_clock: Optional[SystemClock] = None
+
+
+def get_clock() -> SystemClock:
+    """
+    Retrieve the process-wide clock (the system one unless another was set)
+    :return:
+    """
+    global _clock
+
+    if _clock is None:
+        _clock = SystemClock()
+
+    return _clock
+
+
+def set_clock(clock: SystemClock):
+    """
+    Replaces the process-wide clock (e.g. with a simulated one)
+    :param clock:
+    :return:
+    """
+    global _clock
+
+    _clock = clock
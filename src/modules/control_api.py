@@ -0,0 +1,164 @@
+import json
+import os
+import re
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+from modules.daemon_state import get_daemon_state
+from modules.logger import log, LogLevels
+from modules.tasks import refresh_lines
+
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the local control API requests. The reads are answered from the daemon in-memory state, while the
+    writes are handed to the scheduler, so they run on the daemon thread (with its session and request pacer).
+
+    GET  /status                 scheduling status and the last run of each task
+    GET  /lines                  lines snapshot
+    GET  /lines/<id>             snapshot of a single line
+    GET  /airplanes              airplanes snapshot
+    POST /tasks/<name>/run       runs a task now
+    POST /lines/refresh          refreshes the lines in the body ({"ids": [...]})
+    POST /scheduler/pause        pauses the scheduling
+    POST /scheduler/resume       resumes the scheduling
+    """
+    def do_GET(self):
+        self.run_handler(self.handle_get)
+
+    def do_POST(self):
+        self.run_handler(self.handle_post)
+
+    def run_handler(self, handler: Callable):
+        """
+        Runs a request handler, logging any error raised by it and answering the request with an error response
+        :param handler:
+        :return:
+        """
+        try:
+            handler()
+        except Exception as error:
+            log(f"Control API request {self.command} {self.path} failed: {repr(error)}", LogLevels.LOG_LEVEL_ERROR)
+            try:
+                self.send_json(500, {'error': f"Internal error: {repr(error)}"})
+            except OSError:
+                # The client is gone (or the response was already being sent)
+                pass
+
+    def handle_get(self):
+        daemon_state = get_daemon_state()
+
+        if self.path == '/status':
+            self.send_json(200, {
+                'started_at': daemon_state.started_at,
+                'scheduler': self.server.scheduler.get_status(),
+            })
+            return
+
+        if self.path == '/lines':
+            self.send_json(200, {'lines': daemon_state.get_lines()})
+            return
+
+        line_match = re.fullmatch(r'/lines/(\d+)', self.path)
+        if line_match is not None:
+            line = daemon_state.get_line(int(line_match.group(1)))
+            if line is None:
+                self.send_json(404, {'error': f"Line {line_match.group(1)} is not known by the daemon"})
+                return
+
+            self.send_json(200, line)
+            return
+
+        if self.path == '/airplanes':
+            self.send_json(200, {'airplanes': daemon_state.get_airplanes()})
+            return
+
+        self.send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def handle_post(self):
+        scheduler = self.server.scheduler
+
+        task_match = re.fullmatch(r'/tasks/([\w-]+)/run', self.path)
+        if task_match is not None:
+            if not scheduler.trigger(task_match.group(1)):
+                self.send_json(404, {'error': f"Unknown task '{task_match.group(1)}'"})
+                return
+
+            self.send_json(202, {'triggered': task_match.group(1)})
+            return
+
+        if self.path == '/lines/refresh':
+            body = self.read_json_body()
+            line_ids = body.get('ids') if body is not None else None
+            if not isinstance(line_ids, list) or not all(str(line_id).isdigit() for line_id in line_ids):
+                self.send_json(400, {'error': "Expected a JSON body with the list of line ids ({\"ids\": [...]})"})
+                return
+
+            line_ids = [int(line_id) for line_id in line_ids]
+            scheduler.submit('refresh_lines', refresh_lines, line_ids=line_ids)
+            self.send_json(202, {'queued': line_ids})
+            return
+
+        if self.path in ['/scheduler/pause', '/scheduler/resume']:
+            scheduler.set_paused(self.path == '/scheduler/pause')
+            self.send_json(200, {'is_paused': scheduler.is_paused})
+            return
+
+        self.send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def read_json_body(self) -> Optional[Dict]:
+        """
+        Reads the request body as JSON (None if it's empty or invalid)
+        :return:
+        """
+        body_length = int(self.headers.get('Content-Length') or 0)
+        if body_length == 0:
+            return None
+
+        try:
+            body = json.loads(self.rfile.read(body_length))
+        except json.JSONDecodeError:
+            return None
+
+        return body if isinstance(body, dict) else None
+
+    def send_json(self, status: int, body):
+        """
+        Sends a JSON response
+        :param status:
+        :param body:
+        :return:
+        """
+        response = json.dumps(body, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        log(f"Control API: {format % args}", LogLevels.LOG_LEVEL_DEBUG)
+
+
+def start_control_api(scheduler) -> Optional[ThreadingHTTPServer]:
+    """
+    Starts serving the local control API of the daemon on a background thread (disabled if the port is empty)
+    :param scheduler:
+    :return:
+    """
+    log("Entering start_control_api method", LogLevels.LOG_LEVEL_DEBUG)
+    host = os.getenv('CONTROL_API_HOST', '127.0.0.1')
+    port = os.getenv('CONTROL_API_PORT', '8765')
+    if port == '':
+        log("Control API disabled", LogLevels.LOG_LEVEL_NOTICE)
+        return None
+
+    server = ThreadingHTTPServer((host, int(port)), ControlRequestHandler)
+    server.daemon_threads = True
+    server.scheduler = scheduler
+    threading.Thread(target=server.serve_forever, name='control-api', daemon=True).start()
+    log(f"Control API listening on http://{host}:{server.server_address[1]}")
+
+    return server
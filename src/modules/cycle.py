@@ -0,0 +1,139 @@
+import datetime
+import os
+import random
+
+from typing import List
+
+from modules.clock import get_clock
+from modules.journal import get_event_journal
+from modules.lines_data import update_all_lines_data
+from modules.logger import log, LogLevels
+from modules.memory import log_memory_report
+from modules.metrics import observe_cycle, start_metrics_exporter
+from modules.profiler import profile_cycle
+from modules.retry_queue import get_retry_queue, RetryItemKinds
+from modules.run_report import open_run_report, track_task
+from modules.session_manager import SessionManager
+from modules.task_runner import TaskRunner
+from modules.tasks import build_main_tasks, drain_retry_queue
+
+
+def execute_infinite_loop():
+    """
+    Execute the main tasks in an eternal loop, waiting a random interval between each of the executions (the failed
+    units of work are retried in between, as soon as they are due)
+    :return:
+    """
+    log("Entering execute_infinite_loop method", LogLevels.LOG_LEVEL_DEBUG)
+    start_metrics_exporter()
+    session_manager = SessionManager()
+    while True:
+        try:
+            execute_tasks(session_manager=session_manager)
+        except ReferenceError:
+            log("An error occurred when parsing a page, the failed work will be retried", LogLevels.LOG_LEVEL_ERROR)
+
+        wait_next_cycle(
+            wait_time_min=int(os.getenv('WAIT_TIME_MIN', 60*60*5)),
+            wait_time_max=int(os.getenv('WAIT_TIME_MAX', 60*60*8)),
+            session_manager=session_manager,
+        )
+
+
+def wait_next_cycle(wait_time_min: int, wait_time_max: int, session_manager: SessionManager = None):
+    """
+    Block the execution for a random interval between the given limits (in seconds), draining the retry queue
+    whenever one of its items is due in the meantime (with the given session manager, reused by the drains)
+    :param wait_time_min:
+    :param wait_time_max:
+    :param session_manager:
+    :return:
+    """
+    log("Entering wait_next_cycle method", LogLevels.LOG_LEVEL_DEBUG)
+    interval = random.randint(wait_time_min, wait_time_max)
+    next_cycle_at = get_clock().time() + interval
+    log(f"Sleeping for {interval} seconds ({str(datetime.timedelta(seconds=interval))})...")
+
+    while True:
+        seconds_until_retry = get_retry_queue().get_seconds_until_next_attempt()
+        seconds_until_cycle = next_cycle_at - get_clock().time()
+        if seconds_until_retry is None or seconds_until_retry >= seconds_until_cycle:
+            get_clock().sleep(max(0.0, seconds_until_cycle))
+            return
+
+        get_clock().sleep(seconds_until_retry)
+        if session_manager is None:
+            session_manager = SessionManager()
+        try:
+            drain_retry_queue(session_manager=session_manager)
+        except ReferenceError:
+            log("An error occurred when retrying the failed work", LogLevels.LOG_LEVEL_ERROR)
+
+
+def execute_tasks(session_manager: SessionManager = None):
+    """
+    Main execution block of the regular tasks (the independent branches run concurrently, the failed ones are queued
+    to be retried individually), on the given session manager or a new one
+    :param session_manager:
+    :return:
+    """
+    log("")
+    log("Executing main tasks!")
+
+    start_time = get_clock().time()
+
+    if session_manager is None:
+        session_manager = SessionManager()
+
+    with open_run_report(run_name='cycle'), profile_cycle():
+        with track_task('retry_queue'):
+            drain_retry_queue(session_manager=session_manager)
+
+        task_runner = TaskRunner(tasks=build_main_tasks(), max_workers=int(os.getenv('TASKS_MAX_WORKERS', 3)))
+        task_runner.run(raise_errors=False, session_manager=session_manager)
+        # A task succeeding on the graph doesn't need to be retried anymore
+        for task in task_runner.get_succeeded_tasks():
+            get_retry_queue().resolve(RetryItemKinds.TASK, task.name)
+        for task in task_runner.get_failed_tasks():
+            if not isinstance(task.error, ReferenceError):
+                raise task.error
+
+            get_retry_queue().enqueue(RetryItemKinds.TASK, task.name, task.error)
+
+    get_event_journal().flush_rollups()
+    observe_cycle(duration=get_clock().time() - start_time, timestamp=get_clock().time())
+    total_interval = round(get_clock().time() - start_time)
+    total_timedelta = datetime.timedelta(seconds=total_interval)
+
+    log(f"Finished executing main tasks! Total execution time: {total_interval} seconds ({str(total_timedelta)})")
+    log_memory_report()
+
+
+def execute_update_lines_command(arguments: List):
+    """
+    Updates the ticket values of all the lines, resuming the previous cycle if it was interrupted (unless a restart
+    is requested): 'update-lines-ticket [--resume|--restart-cycle]'
+    :param arguments:
+    :return:
+    """
+    if not set(arguments) <= {'--resume', '--restart-cycle'}:
+        log("Unknown options ['{}']!".format("','".join(arguments)), LogLevels.LOG_LEVEL_ERROR)
+        return
+
+    if '--resume' in arguments and '--restart-cycle' in arguments:
+        log("CLI: The --resume and --restart-cycle options can't be used together!", LogLevels.LOG_LEVEL_ERROR)
+        return
+
+    session_manager = SessionManager()
+    with open_run_report(run_name='update_lines'):
+        update_all_lines_data(session_manager=session_manager, restart_cycle='--restart-cycle' in arguments)
+    log_memory_report()
+
+
+def execute_profile_command():
+    """
+    Executes the main tasks once with the sampling profiler enabled
+    :return:
+    """
+    os.environ['SAMPLING_PROFILE'] = 'true'
+    execute_tasks()
@@ -0,0 +1,131 @@
+import threading
+
+from typing import Dict, List, Optional
+
+from modules.clock import get_clock
+from modules.logger import log, LogLevels
+
+
+class DaemonState:
+    """
+    In-memory snapshot of what the daemon knows and is doing (lines, airplanes and the tasks runs), updated by the
+    scheduler thread and read by the control API without touching the disk or the network
+    """
+    def __init__(self):
+        """
+        DaemonState class constructor
+        """
+        log("Instantiating DaemonState class", LogLevels.LOG_LEVEL_DEBUG)
+        self.started_at = get_clock().time()
+        self._lines: Dict[int, Dict] = {}
+        self._airplanes: List[Dict] = []
+        self._task_runs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_line_complete(line) -> bool:
+        """
+        Determines if a Line object was loaded or updated successfully (the lines whose update failed, or with no
+        stored data, still have some of their fields unset, so they are kept out of the snapshot)
+        :param line:
+        :return:
+        """
+        return line.last_updated_at is not None
+
+    def set_lines(self, lines: List):
+        """
+        Replaces the lines snapshot with the given Line objects (only the complete ones)
+        :param lines:
+        :return:
+        """
+        serialized_lines = {line.id: line.serialize() for line in lines if self.is_line_complete(line)}
+        with self._lock:
+            self._lines = serialized_lines
+
+    def update_line(self, line):
+        """
+        Updates the snapshot of a single Line object (left as is if the line is not complete)
+        :param line:
+        :return:
+        """
+        if not self.is_line_complete(line):
+            return
+
+        serialized_line = line.serialize()
+        with self._lock:
+            self._lines[line.id] = serialized_line
+
+    def get_lines(self) -> List[Dict]:
+        """
+        Retrieve the lines snapshot
+        :return:
+        """
+        with self._lock:
+            return list(self._lines.values())
+
+    def get_line(self, line_id: int) -> Optional[Dict]:
+        """
+        Retrieve the snapshot of a single line (None if it's unknown)
+        :param line_id:
+        :return:
+        """
+        with self._lock:
+            return self._lines.get(line_id)
+
+    def set_airplanes(self, airplanes: List[Dict]):
+        """
+        Replaces the airplanes snapshot
+        :param airplanes:
+        :return:
+        """
+        with self._lock:
+            self._airplanes = list(airplanes)
+
+    def get_airplanes(self) -> List[Dict]:
+        """
+        Retrieve the airplanes snapshot
+        :return:
+        """
+        with self._lock:
+            return list(self._airplanes)
+
+    def record_task_run(self, name: str, started_at: float, duration: float, error: Exception = None):
+        """
+        Records the last run of a task
+        :param name:
+        :param started_at:
+        :param duration:
+        :param error:
+        :return:
+        """
+        with self._lock:
+            self._task_runs[name] = {
+                'started_at': started_at,
+                'duration': duration,
+                'status': 'failed' if error is not None else 'success',
+                'error': repr(error) if error is not None else None,
+            }
+
+    def get_task_runs(self) -> Dict[str, Dict]:
+        """
+        Retrieve the last run of each task
+        :return:
+        """
+        with self._lock:
+            return dict(self._task_runs)
+
+
+_daemon_state: Optional[DaemonState] = None
+
+
+def get_daemon_state() -> DaemonState:
+    """
+    Retrieve the process-wide daemon state
+    :return:
+    """
+    global _daemon_state
+
+    if _daemon_state is None:
+        _daemon_state = DaemonState()
+
+    return _daemon_state
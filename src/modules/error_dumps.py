@@ -0,0 +1,235 @@
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from modules.clock import get_clock
+from modules.file import FileLock, read_text_file, save_dict_to_json, write_file_atomically
+from modules.logger import log, LogLevels
+
+ERROR_DUMPS_INDEX_FILENAME = 'index.json'
+
+
+class ErrorDumpStore:
+    """
+    Class used to store the error dumps compressed and deduplicated by content hash plus tag, keeping an index with
+    the occurrences of each dump and evicting the old ones when the store exceeds the configured size or age. The
+    store is updated holding a file lock, so the dumps and the index are written right away (outside any write batch)
+    and the processes sharing the store don't overwrite each other's index.
+    """
+    def __init__(self, folder: str, max_bytes: int, max_age_days: int):
+        """
+        ErrorDumpStore class constructor
+        :param folder:
+        :param max_bytes:
+        :param max_age_days:
+        """
+        log("Instantiating ErrorDumpStore class", LogLevels.LOG_LEVEL_DEBUG)
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self._index: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    @property
+    def index_filepath(self) -> str:
+        return os.path.join(self.folder, ERROR_DUMPS_INDEX_FILENAME)
+
+    def get_index(self) -> Dict:
+        """
+        Retrieve the index of the stored dumps, keyed by the dump key (loaded from the file on the first call)
+        :return:
+        """
+        if self._index is None:
+            if os.path.isfile(self.index_filepath):
+                self._index = json.loads(read_text_file(filepath=self.index_filepath))
+            else:
+                self._index = {}
+
+        return self._index
+
+    def save(self, dump: str, tag: str) -> str:
+        """
+        Stores a dump (only counting a new occurrence if the same content was already stored with the same tag),
+        returning its key
+        :param dump:
+        :param tag:
+        :return:
+        """
+        log("Entering ErrorDumpStore.save method", LogLevels.LOG_LEVEL_DEBUG)
+        dump_bytes = dump.encode('utf-8')
+        key = hashlib.sha256(tag.encode('utf-8') + b'\0' + dump_bytes).hexdigest()[:20]
+        now = get_clock().now().isoformat(timespec='seconds')
+
+        with self._lock, FileLock(self.index_filepath):
+            # Reloaded, as another process may have updated it
+            self._index = None
+            index = self.get_index()
+            entry = index.get(key)
+
+            if entry is not None:
+                entry['count'] += 1
+                entry['last_seen'] = now
+            else:
+                filename = f'{key}_{tag}.txt.gz'
+                compressed_dump = gzip.compress(dump_bytes, mtime=0)
+                write_file_atomically(filepath=os.path.join(self.folder, filename), data=compressed_dump)
+                entry = index[key] = {
+                    'tag': tag,
+                    'filename': filename,
+                    'size': len(dump_bytes),
+                    'compressed_size': len(compressed_dump),
+                    'count': 1,
+                    'first_seen': now,
+                    'last_seen': now,
+                }
+
+            self.evict()
+            save_dict_to_json(input_dict=index, output_filepath=self.index_filepath)
+
+        log(f"Saved error dump {key} (tag '{tag}', {entry['count']} occurrence(s)) to {self.folder}")
+
+        return key
+
+    def evict(self):
+        """
+        Removes the dumps not seen for longer than the max age and, after that, the least recently seen ones until the
+        total compressed size fits the max bytes, along with the dump files missing from the index (must be called with
+        the locks held)
+        :return:
+        """
+        log("Entering ErrorDumpStore.evict method", LogLevels.LOG_LEVEL_DEBUG)
+        index = self.get_index()
+        min_last_seen = (get_clock().now() - timedelta(days=self.max_age_days)).isoformat(timespec='seconds')
+        keys_by_last_seen = sorted(index.keys(), key=lambda dump_key: index[dump_key]['last_seen'])
+
+        total_bytes = sum(entry['compressed_size'] for entry in index.values())
+        for key in keys_by_last_seen:
+            if index[key]['last_seen'] >= min_last_seen and total_bytes <= self.max_bytes:
+                break
+
+            total_bytes -= index[key]['compressed_size']
+            self.remove(key)
+
+        indexed_filenames = {entry['filename'] for entry in index.values()}
+        for filepath in glob.glob(os.path.join(self.folder, '*.txt.gz')):
+            if os.path.basename(filepath) not in indexed_filenames:
+                log(f"Removing orphan error dump {filepath}", LogLevels.LOG_LEVEL_NOTICE)
+                os.remove(filepath)
+
+    def remove(self, key: str):
+        """
+        Removes a dump from the store
+        :param key:
+        :return:
+        """
+        log(f"Evicting error dump {key} from {self.folder}", LogLevels.LOG_LEVEL_NOTICE)
+        entry = self.get_index().pop(key)
+        filepath = os.path.join(self.folder, entry['filename'])
+        if os.path.isfile(filepath):
+            os.remove(filepath)
+
+    def list(self) -> List[Dict]:
+        """
+        Retrieve the stored dumps entries (including their keys), most recently seen first
+        :return:
+        """
+        entries = [dict(entry, key=key) for key, entry in self.get_index().items()]
+
+        return sorted(entries, key=lambda entry: entry['last_seen'], reverse=True)
+
+    def extract(self, key: str) -> str:
+        """
+        Retrieve the original content of a stored dump (the key may be abbreviated if unambiguous)
+        :param key:
+        :return:
+        """
+        matching_keys = [dump_key for dump_key in self.get_index().keys() if dump_key.startswith(key)]
+        if len(matching_keys) != 1:
+            raise KeyError(f"Expected a single error dump matching key '{key}' but found {len(matching_keys)}!")
+
+        filepath = os.path.join(self.folder, self.get_index()[matching_keys[0]]['filename'])
+        with gzip.open(filepath, 'rb') as f:
+            return f.read().decode('utf-8')
+
+
+_error_dump_store: Optional[ErrorDumpStore] = None
+
+
+def is_error_dumps_enabled() -> bool:
+    """
+    Determines if the error dumps are enabled in the environment
+    :return:
+    """
+    return os.getenv('ERROR_DUMPS_ENABLED', 'true').lower() in ['1', 'true', 'yes']
+
+
+def get_error_dump_store() -> ErrorDumpStore:
+    """
+    Retrieve the process-wide error dumps store (configured from the environment)
+    :return:
+    """
+    global _error_dump_store
+
+    if _error_dump_store is None:
+        _error_dump_store = ErrorDumpStore(
+            folder=os.getenv('ERROR_DUMPS_FOLDER', '/data/error_dumps'),
+            max_bytes=int(os.getenv('ERROR_DUMPS_MAX_BYTES', 50 * 1024 * 1024)),
+            max_age_days=int(os.getenv('ERROR_DUMPS_MAX_AGE_DAYS', 30)),
+        )
+
+    return _error_dump_store
+
+
+def save_error_dump_file(dump: str, tag: str = 'dump'):
+    """
+    Saves an error dump to the (compressed and deduplicated) error dumps store
+    :param dump:
+    :param tag:
+    :return:
+    """
+    log("Entering save_error_dump_file method", LogLevels.LOG_LEVEL_DEBUG)
+    if not is_error_dumps_enabled():
+        return
+
+    get_error_dump_store().save(dump=dump, tag=tag)
+
+
+def execute_error_dumps_command(arguments: List):
+    """
+    Executes an error dumps CLI command: 'list' or 'extract <key> [output_filepath]'
+    :param arguments:
+    :return:
+    """
+    log("Entering execute_error_dumps_command method", LogLevels.LOG_LEVEL_DEBUG)
+    store = get_error_dump_store()
+
+    if len(arguments) == 0 or arguments[0] == 'list':
+        entries = store.list()
+        print(f"{'KEY':<20}  {'TAG':<50}  {'COUNT':>6}  {'SIZE':>9}  {'LAST SEEN':<19}")
+        for entry in entries:
+            print(
+                f"{entry['key']:<20}  {entry['tag']:<50}  {entry['count']:>6}  "
+                f"{entry['compressed_size']:>9}  {entry['last_seen']:<19}"
+            )
+        total_bytes = sum(entry['compressed_size'] for entry in entries)
+        print(f"{len(entries)} dump(s) using {total_bytes} bytes (limit {store.max_bytes} bytes)")
+        return
+
+    if arguments[0] == 'extract' and len(arguments) in [2, 3]:
+        dump = store.extract(arguments[1])
+        if len(arguments) == 2:
+            print(dump)
+            return
+
+        with open(arguments[2], 'w') as f:
+            f.write(dump)
+        log(f"Extracted error dump {arguments[1]} to {arguments[2]}")
+        return
+
+    log("Unknown error dumps command ['{}']!".format("','".join(arguments)), LogLevels.LOG_LEVEL_ERROR)
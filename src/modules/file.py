@@ -1,158 +1,705 @@
-import csv
-import json
-import os
-import pickle
-
-from datetime import datetime
-from requests.cookies import RequestsCookieJar
-from typing import Dict
-
-from modules.logger import log, LogLevels
-
-
-class FileMode:
-    """
-    Enum class to store the possible file opening modes
-    """
-    FILE_MODE_READ = 'r'
-    FILE_MODE_WRITE = 'w'
-    FILE_MODE_APPEND = 'a'
-    FILE_MODE_BINARY = 'b'
-    FILE_MODE_EXCLUSIVE = 'x'
-    FILE_MODE_TEXT = 't'
-    FILE_MODE_UPDATING = '+'
-
-
-def save_dict_to_csv(input_dict, output_filepath, file_mode: str = FileMode.FILE_MODE_WRITE):
-    """
-    Saves a dictionary to a CSV file, using the keys of the first element in the dict to determine the CSV headers.
-    :param input_dict:
-    :param output_filepath:
-    :param file_mode:
-    :return:
-    """
-    log("Entering save_dict_to_csv method", LogLevels.LOG_LEVEL_DEBUG)
-    folder = os.path.dirname(output_filepath)
-    os.makedirs(folder, exist_ok=True)
-
-    with open(output_filepath, file_mode, newline='') as output_csv:
-        csv_writer = csv.writer(output_csv, dialect='excel')
-
-        # Headers
-        csv_writer.writerow(input_dict[0].keys())
-
-        # Data
-        for row in input_dict:
-            csv_writer.writerow(row.values())
-
-
-def save_dict_to_json(input_dict: Dict, output_filepath: str, file_mode: str = FileMode.FILE_MODE_WRITE):
-    """
-    Saves a dictionary to a JSON file
-    :param input_dict:
-    :param output_filepath:
-    :param file_mode:
-    :return:
-    """
-    log("Entering save_dict_to_json method", LogLevels.LOG_LEVEL_DEBUG)
-    folder = os.path.dirname(output_filepath)
-    os.makedirs(folder, exist_ok=True)
-
-    with open(output_filepath, file_mode) as f:
-        json.dump(input_dict, f, ensure_ascii=False, indent=4)
-
-
-def save_text_to_file(input_text: str, output_filepath: str, file_mode: str = FileMode.FILE_MODE_WRITE):
-    """
-    Saves a raw text input to a file
-    :param input_text:
-    :param output_filepath:
-    :param file_mode:
-    :return:
-    """
-    log("Entering save_text_to_file method", LogLevels.LOG_LEVEL_DEBUG)
-    folder = os.path.dirname(output_filepath)
-    os.makedirs(folder, exist_ok=True)
-
-    with open(output_filepath, file_mode) as f:
-        f.write(input_text)
-
-
-def check_if_file_exists(filepath: str):
-    """
-    Check if a given filepath exists and raise a FileNotFoundError if not
-    :param filepath:
-    :return:
-    """
-    log("Entering check_if_file_exists method", LogLevels.LOG_LEVEL_DEBUG)
-    if not os.path.isfile(filepath):
-        log(f"Unable to locate file {filepath}!", LogLevels.LOG_LEVEL_ERROR)
-        raise FileNotFoundError(f"Unable to locate file {filepath}!")
-
-
-def read_text_file(filepath: str, file_mode: str = FileMode.FILE_MODE_READ):
-    """
-    Reads a file to a string
-    :param filepath:
-    :param file_mode:
-    :return:
-    """
-    log("Entering read_text_file method", LogLevels.LOG_LEVEL_DEBUG)
-    check_if_file_exists(filepath)
-
-    with open(filepath, file_mode) as f:
-        data = f.read()
-
-    return data
-
-
-def read_binary_file(filepath: str, file_mode: str = FileMode.FILE_MODE_READ + FileMode.FILE_MODE_BINARY):
-    """
-    Reads a file to a string
-    :param filepath:
-    :param file_mode:
-    :return:
-    """
-    log("Entering read_binary_file method", LogLevels.LOG_LEVEL_DEBUG)
-    check_if_file_exists(filepath)
-
-    with open(filepath, file_mode) as f:
-        data = pickle.load(f)
-
-    return data
-
-
-def read_cookies_file() -> RequestsCookieJar:
-    """
-    Reads the cookies data file into a RequestsCookieJar object to be used with authorized requests.
-    :return:
-    """
-    log("Entering read_cookies_file method", LogLevels.LOG_LEVEL_DEBUG)
-    return read_binary_file(filepath=os.getenv('COOKIES_FILEPATH', '/data/cookies.dat'))
-
-
-def save_cookies_file(cookies: RequestsCookieJar):
-    """
-    Saves the cookies data (from a RequestsCookieJar object) to the file.
-    :param cookies:
-    :return:
-    """
-    log("Entering save_cookies_file method", LogLevels.LOG_LEVEL_DEBUG)
-    cookies_filepath = os.getenv('COOKIES_FILEPATH', '/data/cookies.dat')
-    with open(cookies_filepath, 'wb') as cookies_file:
-        pickle.dump(cookies, cookies_file)
-
-
-def save_error_dump_file(dump: str, tag: str = 'dump'):
-    """
-    Saves an error dump to a file
-    :param dump:
-    :param tag:
-    :return:
-    """
-    log("Entering save_error_dump_file method", LogLevels.LOG_LEVEL_DEBUG)
-    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    filename = '{}_{}.txt'.format(timestamp, tag)
-    filepath = os.path.join(os.getenv('ERROR_DUMPS_FOLDER', '/data/error_dumps'), filename)
-    save_text_to_file(dump, filepath)
-    log("Saved error dump to {}".format(filepath))
+import csv
+import fcntl
+import gzip
+import io
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from modules.logger import log, LogLevels
+from modules.metrics import observe_file_write
+from modules.strings import return_signed_decimal, return_signed_number
+
+if TYPE_CHECKING:
+    # Only imported for the annotations, as loading requests slows down the startup of the commands not using it
+    from requests.cookies import RequestsCookieJar
+
+
+class FileMode:
+    """
+    Enum class to store the possible file opening modes
+    """
+    FILE_MODE_READ = 'r'
+    FILE_MODE_WRITE = 'w'
+    FILE_MODE_APPEND = 'a'
+    FILE_MODE_BINARY = 'b'
+    FILE_MODE_EXCLUSIVE = 'x'
+    FILE_MODE_TEXT = 't'
+    FILE_MODE_UPDATING = '+'
+
+
+class FsyncPolicy:
+    """
+    Enum class to store the possible fsync policies of the file writes (with the 'always' policy, each write is synced
+    to disk right away instead of being deferred to the active write batch)
+    """
+    FSYNC_NONE = 'none'
+    FSYNC_BATCH = 'batch'
+    FSYNC_ALWAYS = 'always'
+
+
+_existing_folders = set()
+_batch_context = threading.local()
+
+
+class FileWriteBatch:
+    """
+    Context manager grouping the file writes made inside it: writes to the same path are coalesced (last one wins)
+    and all the files are committed together (temp files, a single fsync pass and atomic renames) when leaving it.
+    The appends made inside it are deferred too, and applied (in order) after the files are replaced, so an append
+    recording that a write was made (e.g. a checkpoint record) never reaches the disk before the write itself. The
+    reads made inside it see the pending writes and appends.
+    """
+    def __init__(self, fsync_policy: str = None, max_pending: int = None):
+        """
+        FileWriteBatch class constructor
+        :param fsync_policy:
+        :param max_pending:
+        """
+        log("Instantiating FileWriteBatch class", LogLevels.LOG_LEVEL_DEBUG)
+        self.fsync_policy = fsync_policy if fsync_policy is not None else get_fsync_policy()
+        self.max_pending = max_pending if max_pending is not None else int(os.getenv('FILE_BATCH_MAX_PENDING', 200))
+        self._pending: Dict[str, bytes] = {}
+        self._pending_appends: List[Tuple[str, bytes]] = []
+        self._parent = None
+
+    def __enter__(self):
+        self._parent = getattr(_batch_context, 'batch', None)
+        _batch_context.batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _batch_context.batch = self._parent
+        self.commit()
+
+    def __len__(self):
+        return len(self._pending) + len(self._pending_appends)
+
+    def __contains__(self, filepath: str):
+        return filepath in self._pending or any(path == filepath for path, _ in self._pending_appends)
+
+    def get_filepaths(self) -> set:
+        """
+        Retrieve the paths of the files with pending writes or appends
+        :return:
+        """
+        return set(self._pending.keys()) | {filepath for filepath, _ in self._pending_appends}
+
+    def add(self, filepath: str, data: bytes):
+        """
+        Schedule the write of the given data to a file (replacing any pending write or append to the same path)
+        :param filepath:
+        :param data:
+        :return:
+        """
+        self._pending[filepath] = data
+        if len(self._pending_appends) > 0:
+            self._pending_appends = [(path, chunk) for path, chunk in self._pending_appends if path != filepath]
+
+        if len(self) >= self.max_pending:
+            self.commit()
+
+    def append(self, filepath: str, data: bytes):
+        """
+        Schedule the append of the given data to a file (applied after the pending writes)
+        :param filepath:
+        :param data:
+        :return:
+        """
+        self._pending_appends.append((filepath, data))
+
+        if len(self) >= self.max_pending:
+            self.commit()
+
+    def apply_pending(self, filepath: str, data: Optional[bytes]) -> Optional[bytes]:
+        """
+        Applies the pending write and appends of a file to its given content (read from the disk when needed),
+        retrieving None if there's nothing pending to it
+        :param filepath:
+        :param data:
+        :return:
+        """
+        if filepath in self._pending:
+            data = self._pending[filepath]
+
+        appended_chunks = [chunk for path, chunk in self._pending_appends if path == filepath]
+        if len(appended_chunks) > 0:
+            if data is None and os.path.isfile(filepath):
+                with open(filepath, 'rb') as f:
+                    data = f.read()
+            data = (data or b'') + b''.join(appended_chunks)
+
+        return data
+
+    def discard(self, filepath: str):
+        """
+        Drop the pending write and appends to a given file (if any)
+        :param filepath:
+        :return:
+        """
+        self._pending.pop(filepath, None)
+        if len(self._pending_appends) > 0:
+            self._pending_appends = [(path, chunk) for path, chunk in self._pending_appends if path != filepath]
+
+    def commit(self):
+        """
+        Write all the pending files to disk atomically
+        :return:
+        """
+        log("Entering FileWriteBatch.commit method", LogLevels.LOG_LEVEL_DEBUG)
+        if len(self) == 0:
+            return
+
+        # The writes still pending on an outer batch to the same files must reach the disk first
+        if self._parent is not None and any(filepath in self._parent for filepath in self.get_filepaths()):
+            self._parent.commit()
+
+        pending, self._pending = self._pending, {}
+        pending_appends, self._pending_appends = self._pending_appends, []
+        started_at = time.perf_counter()
+        should_fsync = self.fsync_policy != FsyncPolicy.FSYNC_NONE
+        temp_filepaths = {
+            filepath: write_temp_file(filepath=filepath, data=data, fsync=should_fsync)
+            for filepath, data in pending.items()
+        }
+
+        for filepath, temp_filepath in temp_filepaths.items():
+            os.replace(temp_filepath, filepath)
+
+        if should_fsync:
+            for folder in {os.path.dirname(filepath) for filepath in temp_filepaths.keys()}:
+                fsync_folder(folder)
+
+        # The appends go after the replaced files are durable (see the class docstring)
+        for filepath in dict.fromkeys(filepath for filepath, _ in pending_appends):
+            append_to_file(
+                filepath=filepath,
+                data=b''.join(chunk for path, chunk in pending_appends if path == filepath),
+                fsync=should_fsync,
+            )
+
+        observe_file_write(
+            mode='batch',
+            files=len(pending),
+            written_bytes=sum(len(data) for data in pending.values()),
+            duration=time.perf_counter() - started_at,
+        )
+        log(
+            f"Committed a batch of {len(pending)} file(s) and {len(pending_appends)} append(s) to disk",
+            LogLevels.LOG_LEVEL_DEBUG,
+        )
+
+
+class FileLock:
+    """
+    Context manager holding an exclusive lock of a file shared by several processes (on a sibling '.lock' file), so
+    their read-modify-write cycles don't interleave. The writes made while holding it skip the active write batch, so
+    they are on disk before the lock is released.
+    """
+    def __init__(self, filepath: str):
+        """
+        FileLock class constructor
+        :param filepath:
+        """
+        self.lock_filepath = f'{filepath}.lock'
+        self._lock_fd = None
+        self._suspended_batch = None
+
+    def __enter__(self):
+        ensure_folder_exists(os.path.dirname(self.lock_filepath))
+        self._lock_fd = os.open(self.lock_filepath, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+
+        self._suspended_batch = get_active_write_batch()
+        _batch_context.batch = None
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _batch_context.batch = self._suspended_batch
+        fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        os.close(self._lock_fd)
+        self._lock_fd = None
+
+
+def get_fsync_policy() -> str:
+    """
+    Retrieve the fsync policy set in the environment (defaults to fsync once per batch)
+    :return:
+    """
+    return os.getenv('FILE_FSYNC_POLICY', FsyncPolicy.FSYNC_BATCH)
+
+
+def get_active_write_batch():
+    """
+    Retrieve the FileWriteBatch currently active in this thread (None if there's none)
+    :return:
+    """
+    return getattr(_batch_context, 'batch', None)
+
+
+def get_pending_file_data(filepath: str) -> Optional[bytes]:
+    """
+    Retrieve the content a file will have once the active write batches (and their parents) are committed, or None if
+    there's no pending write or append to it
+    :param filepath:
+    :return:
+    """
+    batches = []
+    batch = get_active_write_batch()
+    while batch is not None:
+        batches.insert(0, batch)
+        batch = batch._parent
+
+    data = None
+    for batch in batches:
+        data = batch.apply_pending(filepath, data)
+
+    return data
+
+
+def file_exists(filepath: str) -> bool:
+    """
+    Determines if a file exists, on the disk or as a pending write of the active write batch
+    :param filepath:
+    :return:
+    """
+    return os.path.isfile(filepath) or get_pending_file_data(filepath) is not None
+
+
+def ensure_folder_exists(folder: str):
+    """
+    Creates a folder (and its parents) if it wasn't created or checked before by this process
+    :param folder:
+    :return:
+    """
+    if folder == '' or folder in _existing_folders:
+        return
+
+    os.makedirs(folder, exist_ok=True)
+    _existing_folders.add(folder)
+
+
+def fsync_folder(folder: str):
+    """
+    Flushes a folder entry to disk, so the renames made inside it are durable
+    :param folder:
+    :return:
+    """
+    try:
+        folder_fd = os.open(folder or '.', os.O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        os.fsync(folder_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(folder_fd)
+
+
+def write_temp_file(filepath: str, data: bytes, fsync: bool = False) -> str:
+    """
+    Writes the data to a temporary file in the same folder of the given filepath, returning the temporary filepath
+    :param filepath:
+    :param data:
+    :param fsync:
+    :return:
+    """
+    ensure_folder_exists(os.path.dirname(filepath))
+
+    temp_fd, temp_filepath = tempfile.mkstemp(
+        dir=os.path.dirname(filepath) or '.',
+        prefix=f'.{os.path.basename(filepath)}.',
+        suffix='.tmp',
+    )
+    try:
+        with os.fdopen(temp_fd, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+    except BaseException:
+        os.unlink(temp_filepath)
+        raise
+
+    return temp_filepath
+
+
+def remove_file(filepath: str):
+    """
+    Removes a file (if it exists), dropping its pending writes and appends on the active write batches
+    :param filepath:
+    :return:
+    """
+    batch = get_active_write_batch()
+    while batch is not None:
+        batch.discard(filepath)
+        batch = batch._parent
+
+    if os.path.isfile(filepath):
+        os.remove(filepath)
+
+
+def write_file_atomically(filepath: str, data: bytes):
+    """
+    Writes the data to a file through a temp file and an atomic rename (or schedules it on the active write batch,
+    unless the fsync policy is 'always', which syncs the file and its folder right away so the batches stay empty)
+    :param filepath:
+    :param data:
+    :return:
+    """
+    fsync_policy = get_fsync_policy()
+    batch = get_active_write_batch()
+    if batch is not None and fsync_policy != FsyncPolicy.FSYNC_ALWAYS:
+        batch.add(filepath, data)
+        return
+
+    started_at = time.perf_counter()
+    should_fsync = fsync_policy != FsyncPolicy.FSYNC_NONE
+    os.replace(write_temp_file(filepath=filepath, data=data, fsync=should_fsync), filepath)
+    if fsync_policy == FsyncPolicy.FSYNC_ALWAYS:
+        fsync_folder(os.path.dirname(filepath))
+    observe_file_write(mode='atomic', files=1, written_bytes=len(data), duration=time.perf_counter() - started_at)
+
+
+def append_to_file(filepath: str, data: bytes, fsync: bool = False):
+    """
+    Appends the data to a file directly
+    :param filepath:
+    :param data:
+    :param fsync:
+    :return:
+    """
+    started_at = time.perf_counter()
+    ensure_folder_exists(os.path.dirname(filepath))
+    with open(filepath, FileMode.FILE_MODE_APPEND + FileMode.FILE_MODE_BINARY) as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    observe_file_write(mode='append', files=1, written_bytes=len(data), duration=time.perf_counter() - started_at)
+
+
+def write_file(filepath: str, data: bytes, file_mode: str = FileMode.FILE_MODE_WRITE):
+    """
+    Writes the data to a file, atomically when replacing its whole content or appending to it (the appends made inside
+    a write batch are deferred to its commit, unless the fsync policy is 'always', see FileWriteBatch)
+    :param filepath:
+    :param data:
+    :param file_mode:
+    :return:
+    """
+    if FileMode.FILE_MODE_WRITE in file_mode:
+        write_file_atomically(filepath=filepath, data=data)
+        return
+
+    fsync_policy = get_fsync_policy()
+    batch = get_active_write_batch()
+    if batch is not None and fsync_policy != FsyncPolicy.FSYNC_ALWAYS:
+        batch.append(filepath, data)
+        return
+
+    append_to_file(filepath=filepath, data=data, fsync=fsync_policy == FsyncPolicy.FSYNC_ALWAYS)
+
+
+class CsvColumnTypes:
+    """
+    Enum class for the types of the CSV export columns (the typed columns are converted when the typed output is
+    enabled, otherwise the values are written as parsed)
+    """
+    TEXT = 'text'
+    INTEGER = 'integer'
+    DECIMAL = 'decimal'
+
+
+class CsvStreamWriter:
+    """
+    Context manager writing the rows (dicts) to a CSV file as they come, so they don't have to be kept in memory. The
+    columns are given by the export schema (column name and type), or by the keys of the first row if there's none.
+    The rows go (buffered, and gzip-compressed if enabled) to a temp file, which replaces the file when leaving the
+    context. If an error occurs, the rows written so far are kept on a '.partial' file next to it.
+    """
+    def __init__(self, filepath: str, schema: Dict[str, str] = None, compress: bool = None, typed: bool = None):
+        """
+        CsvStreamWriter class constructor (the compression and the typed output follow the environment when not
+        specified)
+        :param filepath: the '.gz' extension is appended to it if the output is compressed
+        :param schema: column names (in order) and their types
+        :param compress:
+        :param typed:
+        """
+        log("Instantiating CsvStreamWriter class", LogLevels.LOG_LEVEL_DEBUG)
+        if compress is None:
+            compress = os.getenv('CSV_COMPRESS', 'false').lower() in ['1', 'true', 'yes']
+        if typed is None:
+            typed = os.getenv('CSV_TYPED_COLUMNS', 'false').lower() in ['1', 'true', 'yes']
+
+        self.filepath = f'{filepath}.gz' if compress and not filepath.endswith('.gz') else filepath
+        self.schema = schema
+        self.compress = compress
+        self.typed = typed
+        self.rows_count = 0
+        self.written_bytes = 0
+        self._is_discarded = False
+        self._temp_filepath = None
+        self._raw_file = None
+        self._file = None
+        self._csv_writer = None
+        self._started_at = None
+
+    def __enter__(self):
+        ensure_folder_exists(os.path.dirname(self.filepath))
+        temp_fd, self._temp_filepath = tempfile.mkstemp(
+            dir=os.path.dirname(self.filepath) or '.',
+            prefix=f'.{os.path.basename(self.filepath)}.',
+            suffix='.tmp',
+        )
+        self._raw_file = os.fdopen(temp_fd, 'wb', buffering=int(os.getenv('CSV_WRITE_BUFFER_SIZE', 1024*1024)))
+        stream = self._raw_file
+        if self.compress:
+            stream = gzip.GzipFile(
+                fileobj=self._raw_file,
+                mode='wb',
+                compresslevel=int(os.getenv('CSV_COMPRESS_LEVEL', 6)),
+            )
+
+        self._file = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        self._csv_writer = csv.writer(self._file, dialect='excel')
+        self._started_at = time.perf_counter()
+        if self.schema is not None:
+            self._csv_writer.writerow(self.schema.keys())
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.compress:
+            # Closing the gzip stream writes its trailer (but doesn't close the temp file under it)
+            self._file.close()
+        else:
+            self._file.flush()
+
+        if exc_type is None and get_fsync_policy() != FsyncPolicy.FSYNC_NONE:
+            self._raw_file.flush()
+            os.fsync(self._raw_file.fileno())
+        self.written_bytes = self._raw_file.tell()
+        self._file.close()
+        self._raw_file.close()
+
+        if exc_type is not None:
+            partial_filepath = f'{self.filepath}.partial'
+            os.replace(self._temp_filepath, partial_filepath)
+            log(
+                f"Kept the {self.rows_count} rows written before the error on {partial_filepath}",
+                LogLevels.LOG_LEVEL_WARNING,
+            )
+            return
+
+        if self._is_discarded:
+            os.unlink(self._temp_filepath)
+            return
+
+        if self.rows_count == 0:
+            log(f"Saving an empty CSV file to {self.filepath} as there are no rows", LogLevels.LOG_LEVEL_WARNING)
+
+        os.replace(self._temp_filepath, self.filepath)
+        if os.path.isfile(f'{self.filepath}.partial'):
+            os.unlink(f'{self.filepath}.partial')
+        observe_file_write(
+            mode='stream',
+            files=1,
+            written_bytes=self.written_bytes,
+            duration=time.perf_counter() - self._started_at,
+        )
+
+    def write_row(self, row: Dict):
+        """
+        Writes a row to the CSV file (preceded by the headers if it's the first one and there's no schema). With a
+        schema, the missing columns are left empty and the extra ones are ignored.
+        :param row:
+        :return:
+        """
+        if self.schema is None:
+            if self.rows_count == 0:
+                self._csv_writer.writerow(row.keys())
+
+            self._csv_writer.writerow(row.values())
+            self.rows_count += 1
+            return
+
+        values = []
+        for column, column_type in self.schema.items():
+            value = row.get(column)
+            if self.typed and column_type == CsvColumnTypes.INTEGER:
+                value = return_signed_number(value)
+            if self.typed and column_type == CsvColumnTypes.DECIMAL:
+                value = return_signed_decimal(value)
+            values.append(value if value is not None else '')
+
+        self._csv_writer.writerow(values)
+        self.rows_count += 1
+
+    def write_rows(self, rows: Iterable[Dict]):
+        """
+        Writes the rows (e.g. from a generator) to the CSV file
+        :param rows:
+        :return:
+        """
+        for row in rows:
+            self.write_row(row)
+
+    def discard(self):
+        """
+        Discards the rows written, so the file is left untouched when leaving the context
+        :return:
+        """
+        self._is_discarded = True
+
+
+def save_dict_to_csv(input_dict, output_filepath, file_mode: str = FileMode.FILE_MODE_WRITE):
+    """
+    Saves a dictionary to a CSV file, using the keys of the first element in the dict to determine the CSV headers.
+    :param input_dict:
+    :param output_filepath:
+    :param file_mode:
+    :return:
+    """
+    log("Entering save_dict_to_csv method", LogLevels.LOG_LEVEL_DEBUG)
+    output_csv = io.StringIO(newline='')
+    csv_writer = csv.writer(output_csv, dialect='excel')
+
+    if len(input_dict) == 0:
+        log(f"Saving an empty CSV file to {output_filepath} as there are no rows", LogLevels.LOG_LEVEL_WARNING)
+    else:
+        # Headers
+        csv_writer.writerow(input_dict[0].keys())
+
+        # Data
+        for row in input_dict:
+            csv_writer.writerow(row.values())
+
+    write_file(filepath=output_filepath, data=output_csv.getvalue().encode('utf-8'), file_mode=file_mode)
+
+
+def save_dict_to_json(
+        input_dict: Dict,
+        output_filepath: str,
+        file_mode: str = FileMode.FILE_MODE_WRITE,
+        compact: bool = None,
+):
+    """
+    Saves a dictionary to a JSON file (the compact encoding is used if set in the environment when not specified)
+    :param input_dict:
+    :param output_filepath:
+    :param file_mode:
+    :param compact:
+    :return:
+    """
+    log("Entering save_dict_to_json method", LogLevels.LOG_LEVEL_DEBUG)
+    if compact is None:
+        compact = os.getenv('JSON_COMPACT', 'false').lower() in ['1', 'true', 'yes']
+
+    if compact:
+        json_text = json.dumps(input_dict, ensure_ascii=False, separators=(',', ':'))
+    else:
+        json_text = json.dumps(input_dict, ensure_ascii=False, indent=4)
+
+    write_file(filepath=output_filepath, data=json_text.encode('utf-8'), file_mode=file_mode)
+
+
+def save_text_to_file(input_text: str, output_filepath: str, file_mode: str = FileMode.FILE_MODE_WRITE):
+    """
+    Saves a raw text input to a file
+    :param input_text:
+    :param output_filepath:
+    :param file_mode:
+    :return:
+    """
+    log("Entering save_text_to_file method", LogLevels.LOG_LEVEL_DEBUG)
+    write_file(filepath=output_filepath, data=input_text.encode('utf-8'), file_mode=file_mode)
+
+
+def check_if_file_exists(filepath: str):
+    """
+    Check if a given filepath exists and raise a FileNotFoundError if not
+    :param filepath:
+    :return:
+    """
+    log("Entering check_if_file_exists method", LogLevels.LOG_LEVEL_DEBUG)
+    if not os.path.isfile(filepath):
+        log(f"Unable to locate file {filepath}!", LogLevels.LOG_LEVEL_ERROR)
+        raise FileNotFoundError(f"Unable to locate file {filepath}!")
+
+
+def read_text_file(filepath: str, file_mode: str = FileMode.FILE_MODE_READ):
+    """
+    Reads a file to a string
+    :param filepath:
+    :param file_mode:
+    :return:
+    """
+    log("Entering read_text_file method", LogLevels.LOG_LEVEL_DEBUG)
+    pending_data = get_pending_file_data(filepath)
+    if pending_data is not None:
+        return pending_data.decode('utf-8')
+
+    check_if_file_exists(filepath)
+
+    with open(filepath, file_mode) as f:
+        data = f.read()
+
+    return data
+
+
+def read_binary_file(filepath: str, file_mode: str = FileMode.FILE_MODE_READ + FileMode.FILE_MODE_BINARY):
+    """
+    Reads a file to a string
+    :param filepath:
+    :param file_mode:
+    :return:
+    """
+    log("Entering read_binary_file method", LogLevels.LOG_LEVEL_DEBUG)
+    pending_data = get_pending_file_data(filepath)
+    if pending_data is not None:
+        return pickle.loads(pending_data)
+
+    check_if_file_exists(filepath)
+
+    with open(filepath, file_mode) as f:
+        data = pickle.load(f)
+
+    return data
+
+
+def read_cookies_file() -> 'RequestsCookieJar':
+    """
+    Reads the cookies data file into a RequestsCookieJar object to be used with authorized requests (an empty one if
+    the file was not saved yet).
+    :return:
+    """
+    log("Entering read_cookies_file method", LogLevels.LOG_LEVEL_DEBUG)
+    cookies_filepath = os.getenv('COOKIES_FILEPATH', '/data/cookies.dat')
+    if not os.path.isfile(cookies_filepath):
+        from requests.cookies import RequestsCookieJar
+
+        return RequestsCookieJar()
+
+    return read_binary_file(filepath=cookies_filepath)
+
+
+def save_cookies_file(cookies: 'RequestsCookieJar'):
+    """
+    Saves the cookies data (from a RequestsCookieJar object) to the file.
+    :param cookies:
+    :return:
+    """
+    log("Entering save_cookies_file method", LogLevels.LOG_LEVEL_DEBUG)
+    cookies_filepath = os.getenv('COOKIES_FILEPATH', '/data/cookies.dat')
+    with FileLock(cookies_filepath):
+        write_file_atomically(filepath=cookies_filepath, data=pickle.dumps(cookies))
+
@@ -0,0 +1,33 @@
+import time
+
+from bs4 import BeautifulSoup
+
+from modules.metrics import is_metrics_enabled, observe_parse
+
+
+def parse_html(html_text: str, page: str) -> BeautifulSoup:
+    """
+    Parses an HTML page, recording the parse time and the tree size in the metrics under the given page name (the tree
+    size only if the metrics are exported, as counting the tags walks the whole tree)
+    :param html_text:
+    :param page:
+    :return:
+    """
+    started_at = time.perf_counter()
+    html_bs = BeautifulSoup(html_text, 'html.parser')
+    duration = time.perf_counter() - started_at
+
+    tree_size = len(html_bs.find_all(True)) if is_metrics_enabled() else None
+    observe_parse(page=page, duration=duration, html_bytes=len(html_text), tree_size=tree_size)
+
+    return html_bs
+
+
+def release_html(html_bs: BeautifulSoup):
+    """
+    Releases the memory of a parsed HTML page right away (its tree has reference cycles, so otherwise it's only freed
+    by the garbage collector), after all the needed data was extracted
+    :param html_bs:
+    :return:
+    """
+    html_bs.decompose()
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+
+from typing import Callable, Dict, Iterator, List, Optional
+
+from modules.clock import get_clock
+from modules.file import file_exists, read_text_file, save_dict_to_json
+from modules.logger import log, LogLevels
+from modules.pagination import iterate_pages
+from modules.run_report import add_run_usage
+
+
+def is_incremental_crawl_enabled() -> bool:
+    """
+    Determines if the incremental crawl of the results pages (lines summary and airplanes) is enabled in the
+    environment
+    :return:
+    """
+    return os.getenv('INCREMENTAL_CRAWL', 'false').lower() in ['1', 'true', 'yes']
+
+
+def get_rows_fingerprint(rows: List[Dict]) -> str:
+    """
+    Retrieve the fingerprint of the rows of a results page
+    :param rows:
+    :return:
+    """
+    return hashlib.sha1(json.dumps(rows, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class IncrementalCrawl:
+    """
+    Crawl of a paginated listing (the lines summary or the airplanes list) that stops paging once a few consecutive
+    pages have the same rows (fingerprint) as in the previous crawl, reusing the rows of the remaining pages from it.
+    A full crawl is done when the pages count changes, when there's no previous crawl or when a full sweep is due (as
+    the changes after the pages where it stopped are only caught by the full sweeps).
+    """
+    def __init__(self, name: str, folder: str, unchanged_pages: int, full_sweep_interval: float):
+        """
+        IncrementalCrawl class constructor
+        :param name:
+        :param folder:
+        :param unchanged_pages: consecutive unchanged pages after which the crawl stops
+        :param full_sweep_interval: max seconds between the full crawls
+        """
+        log("Instantiating IncrementalCrawl class", LogLevels.LOG_LEVEL_DEBUG)
+        self.name = name
+        self.filepath = os.path.join(folder, f'{name}.json')
+        self.unchanged_pages = unchanged_pages
+        self.full_sweep_interval = full_sweep_interval
+        self.has_changes = True
+
+    def load_previous_crawl(self) -> Optional[Dict]:
+        """
+        Loads the previous crawl (its pages count, the fingerprint and rows of each page and when the last full crawl
+        was done), retrieving None if there's none
+        :return:
+        """
+        if not file_exists(self.filepath):
+            return None
+
+        return json.loads(read_text_file(self.filepath))
+
+    def iterate_rows(self, fetch_page: Callable) -> Iterator[Dict]:
+        """
+        Yields the rows of each page as it's fetched (with the given callable, receiving the page number and
+        retrieving a tuple with the page rows, if there's a next page and the pages count), saving the crawl once all
+        the rows were consumed
+        :param fetch_page:
+        :return:
+        """
+        log("Entering IncrementalCrawl.iterate_rows method", LogLevels.LOG_LEVEL_DEBUG)
+        previous_crawl = self.load_previous_crawl()
+        is_full_crawl = previous_crawl is None
+        if not is_full_crawl and get_clock().time() - previous_crawl['full_crawl_at'] >= self.full_sweep_interval:
+            log(f"Full sweep of the {self.name} pages is due")
+            is_full_crawl = True
+
+        first_page = fetch_page(1)
+        pages_count = first_page[2]
+        if not is_full_crawl and pages_count != previous_crawl['pages_count']:
+            log(
+                f"The {self.name} pages count changed from {previous_crawl['pages_count']} to {pages_count}, "
+                f"doing a full crawl",
+            )
+            is_full_crawl = True
+
+        previous_pages = previous_crawl['pages'] if previous_crawl is not None else []
+        pages = []
+        unchanged_pages = 0
+
+        # The full crawls fetch the pages concurrently, the incremental ones one at a time (to stop as soon as they can)
+        pages_results = iterate_pages(fetch_page, first_page=first_page, max_workers=None if is_full_crawl else 1)
+        for rows, has_next, _ in pages_results:
+            page = len(pages) + 1
+            fingerprint = get_rows_fingerprint(rows)
+            pages.append({'fingerprint': fingerprint, 'rows': rows})
+            yield from rows
+
+            is_unchanged = page <= len(previous_pages) and previous_pages[page - 1]['fingerprint'] == fingerprint
+            unchanged_pages = unchanged_pages + 1 if is_unchanged else 0
+            if not is_full_crawl and has_next and unchanged_pages >= self.unchanged_pages:
+                reused_pages = previous_pages[page:]
+                log(
+                    f"Stopping the {self.name} crawl after {page} page(s) as the last {unchanged_pages} didn't change "
+                    f"(the {len(reused_pages)} remaining page(s) are reused from the previous crawl)",
+                    LogLevels.LOG_LEVEL_NOTICE,
+                )
+                pages_results.close()
+                add_run_usage(cache_hits=len(reused_pages))
+                for reused_page in reused_pages:
+                    pages.append(reused_page)
+                    yield from reused_page['rows']
+                break
+
+        self.has_changes = (
+            previous_crawl is None
+            or pages_count != previous_crawl['pages_count']
+            or [page['fingerprint'] for page in pages] != [page['fingerprint'] for page in previous_pages]
+        )
+        save_dict_to_json(
+            input_dict={
+                'pages_count': pages_count,
+                'full_crawl_at': get_clock().time() if is_full_crawl else previous_crawl['full_crawl_at'],
+                'pages': pages,
+            },
+            output_filepath=self.filepath,
+        )
+
+
+def create_incremental_crawl(name: str) -> IncrementalCrawl:
+    """
+    Creates an incremental crawl of the given listing (configured from the environment)
+    :param name:
+    :return:
+    """
+    return IncrementalCrawl(
+        name=name,
+        folder=os.getenv('INCREMENTAL_CRAWL_FOLDER', '/data/incremental_crawl'),
+        unchanged_pages=int(os.getenv('INCREMENTAL_CRAWL_UNCHANGED_PAGES', 2)),
+        full_sweep_interval=float(os.getenv('INCREMENTAL_CRAWL_FULL_SWEEP_INTERVAL', 60*60*24)),
+    )
@@ -0,0 +1,379 @@
+import glob
+import json
+import os
+import re
+import threading
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from modules.clock import get_clock
+from modules.file import FileLock, FileMode, file_exists, read_text_file, save_dict_to_json, save_text_to_file
+from modules.logger import log, LogLevels
+
+ROLLUPS_FILENAME = 'rollups.json'
+SEGMENT_FILENAME_PATTERN = 'events_{:06d}.jsonl'
+
+
+class EventTypes:
+    """
+    Enum class for the types of the reward events stored in the journal
+    """
+    TRAVEL_CARDS_WHEEL = 'travel_cards_wheel'
+    CARD_HOLDER = 'card_holder'
+    WORKSHOP = 'workshop'
+
+
+class EventJournal:
+    """
+    Append-only journal (JSON Lines split in segments) of the reward events (or of the change events, on the changes
+    journal), keeping incrementally maintained daily rollups so the aggregate queries don't need to read the events
+    again. The segments are the source of truth: the rollups file records the position (segment and offset) it covers
+    and is only saved every few events, the events appended after that position being replayed when it's loaded. The
+    journal may be shared with other processes, so the events are appended holding a file lock.
+    """
+    def __init__(self, folder: str, segment_max_bytes: int, rollups_flush_events: int = 100):
+        """
+        EventJournal class constructor
+        :param folder:
+        :param segment_max_bytes:
+        :param rollups_flush_events:
+        """
+        log("Instantiating EventJournal class", LogLevels.LOG_LEVEL_DEBUG)
+        self.folder = folder
+        self.segment_max_bytes = segment_max_bytes
+        self.rollups_flush_events = rollups_flush_events
+        self._rollups: Optional[Dict] = None
+        self._unflushed_events = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rollups_filepath(self) -> str:
+        return os.path.join(self.folder, ROLLUPS_FILENAME)
+
+    def get_rollups(self) -> Dict:
+        """
+        Retrieve the rollups of the journal, up to date with its segments (loaded from the file on the first call)
+        :return:
+        """
+        with self._lock:
+            if self._rollups is None:
+                self._rollups = self.load_rollups()
+
+            self.replay_segments(self._rollups)
+
+            return self._rollups
+
+    def load_rollups(self) -> Dict:
+        """
+        Loads the rollups saved to the file (or empty ones, covering no events, if there's none)
+        :return:
+        """
+        if not file_exists(self.rollups_filepath):
+            return create_empty_rollups()
+
+        rollups = json.loads(read_text_file(filepath=self.rollups_filepath))
+        if 'position' not in rollups:
+            # Saved by a previous version, after every event, so it covers the whole journal
+            segments = self.list_segments()
+            rollups['position'] = {
+                'segment': os.path.basename(segments[-1]) if len(segments) > 0 else '',
+                'offset': os.path.getsize(segments[-1]) if len(segments) > 0 else 0,
+            }
+
+        return rollups
+
+    def replay_segments(self, rollups: Dict):
+        """
+        Applies the events appended to the segments after the position covered by the rollups (the incomplete last
+        event of a segment being written is left for the next replay)
+        :param rollups:
+        :return:
+        """
+        position = rollups['position']
+        for segment_filepath in self.list_segments():
+            segment = os.path.basename(segment_filepath)
+            if segment < position['segment']:
+                continue
+
+            offset = position['offset'] if segment == position['segment'] else 0
+            with open(segment_filepath, 'rb') as f:
+                f.seek(offset)
+                for event_line in f:
+                    if not event_line.endswith(b'\n'):
+                        break
+
+                    offset += len(event_line)
+                    try:
+                        apply_event_to_rollups(rollups=rollups, event=json.loads(event_line))
+                    except (json.JSONDecodeError, KeyError) as error:
+                        log(f"Ignoring invalid event on {segment_filepath}: {error}", LogLevels.LOG_LEVEL_WARNING)
+
+            position = rollups['position'] = {'segment': segment, 'offset': offset}
+
+    def flush_rollups(self):
+        """
+        Saves the rollups to the file (if any event was recorded since the last save)
+        :return:
+        """
+        log("Entering EventJournal.flush_rollups method", LogLevels.LOG_LEVEL_DEBUG)
+        if self._unflushed_events == 0:
+            return
+
+        with FileLock(self.rollups_filepath):
+            rollups = self.get_rollups()
+            with self._lock:
+                save_dict_to_json(input_dict=rollups, output_filepath=self.rollups_filepath, compact=True)
+                self._unflushed_events = 0
+
+    def rebuild_rollups(self) -> Dict:
+        """
+        Rebuilds the rollups from scratch, replaying all the events of the segments, and saves them
+        :return:
+        """
+        log("Entering EventJournal.rebuild_rollups method", LogLevels.LOG_LEVEL_DEBUG)
+        with FileLock(self.rollups_filepath), self._lock:
+            self._rollups = create_empty_rollups()
+            self.replay_segments(self._rollups)
+            save_dict_to_json(input_dict=self._rollups, output_filepath=self.rollups_filepath, compact=True)
+            self._unflushed_events = 0
+
+        log(f"Rebuilt the rollups of the events journal on {self.folder}")
+
+        return self._rollups
+
+    def get_segment_filepath(self) -> str:
+        """
+        Retrieve the path of the segment currently receiving the events, rolling over to a new one when it's full
+        (must be called holding the file lock)
+        :return:
+        """
+        segments = self.list_segments()
+        segment_number = len(segments) if len(segments) > 0 else 1
+        filepath = os.path.join(self.folder, SEGMENT_FILENAME_PATTERN.format(segment_number))
+        if os.path.isfile(filepath) and os.path.getsize(filepath) >= self.segment_max_bytes:
+            filepath = os.path.join(self.folder, SEGMENT_FILENAME_PATTERN.format(segment_number + 1))
+            log(f"Events journal rolled over to segment {filepath}", LogLevels.LOG_LEVEL_NOTICE)
+
+        return filepath
+
+    def list_segments(self) -> List[str]:
+        """
+        Retrieve the paths of all the journal segments (oldest first)
+        :return:
+        """
+        return sorted(glob.glob(os.path.join(self.folder, 'events_*.jsonl')))
+
+    def record(self, event_type: str, data: Dict, timestamp: datetime = None, imported_file: str = None) -> Dict:
+        """
+        Appends an event to the journal (right away, even inside a write batch), saving the rollups every few events.
+        The legacy file an event was imported from is recorded with it, so it's never imported twice.
+        :param event_type:
+        :param data:
+        :param timestamp:
+        :param imported_file:
+        :return:
+        """
+        log("Entering EventJournal.record method", LogLevels.LOG_LEVEL_DEBUG)
+        event = {
+            'type': event_type,
+            'timestamp': (timestamp or get_clock().now()).isoformat(timespec='seconds'),
+            'data': data,
+        }
+        if imported_file is not None:
+            event['imported_file'] = imported_file
+
+        with FileLock(self.rollups_filepath):
+            save_text_to_file(
+                input_text=json.dumps(event, ensure_ascii=False) + '\n',
+                output_filepath=self.get_segment_filepath(),
+                file_mode=FileMode.FILE_MODE_APPEND,
+            )
+
+        with self._lock:
+            self._unflushed_events += 1
+            should_flush = self._unflushed_events >= self.rollups_flush_events
+
+        if should_flush:
+            self.flush_rollups()
+
+        return event
+
+    def get_totals(self, days: int = None) -> Dict:
+        """
+        Retrieve the rollup totals of each event type for the last given days (or the whole journal if not given)
+        :param days:
+        :return:
+        """
+        log("Entering EventJournal.get_totals method", LogLevels.LOG_LEVEL_DEBUG)
+        rollups = self.get_rollups()
+        first_day = (get_clock().now() - timedelta(days=days - 1)).date().isoformat() if days is not None else ''
+
+        totals = {}
+        for day, day_rollups in rollups['daily'].items():
+            if day < first_day:
+                continue
+
+            for event_type, event_rollups in day_rollups.items():
+                merge_counters(totals.setdefault(event_type, {}), event_rollups)
+
+        return totals
+
+    def import_legacy_results(self) -> int:
+        """
+        Imports the per-event result files saved by the previous versions (each file is imported only once)
+        :return:
+        """
+        log("Entering EventJournal.import_legacy_results method", LogLevels.LOG_LEVEL_DEBUG)
+        legacy_sources = [
+            (
+                EventTypes.TRAVEL_CARDS_WHEEL,
+                os.getenv('TRAVEL_CARDS_RESULTS_FOLDER', '/data/travel_cards_wheel_results'),
+                'travel_cards_wheel_results__*.json',
+            ),
+            (
+                EventTypes.CARD_HOLDER,
+                os.getenv('CARD_HOLD_RESULTS_FOLDER', '/data/card_hold_results'),
+                'card_holder_results__*.json',
+            ),
+        ]
+
+        imported_files = set(self.get_rollups()['imported_files'])
+        total_imported = 0
+        for event_type, folder, filename_pattern in legacy_sources:
+            total_imported += self._import_legacy_folder(event_type, folder, filename_pattern, imported_files)
+        self.flush_rollups()
+
+        log(f"Imported {total_imported} legacy result file(s) to the events journal")
+
+        return total_imported
+
+    def _import_legacy_folder(self, event_type: str, folder: str, filename_pattern: str, imported_files: set) -> int:
+        total_imported = 0
+        for filepath in sorted(glob.glob(os.path.join(folder, filename_pattern))):
+            filename = os.path.basename(filepath)
+            if filename in imported_files:
+                continue
+
+            timestamp_match = re.search(r'__(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.json$', filename)
+            if timestamp_match is None:
+                log(f"Skipping legacy results file {filepath} without timestamp", LogLevels.LOG_LEVEL_WARNING)
+                continue
+
+            self.record(
+                event_type=event_type,
+                data=json.loads(read_text_file(filepath=filepath)),
+                timestamp=datetime.strptime(timestamp_match.group(1), '%Y-%m-%d_%H-%M-%S'),
+                imported_file=filename,
+            )
+            total_imported += 1
+
+        return total_imported
+
+
+def create_empty_rollups() -> Dict:
+    """
+    Creates the rollups of an empty journal
+    :return:
+    """
+    return {'daily': {}, 'bonus_types': {}, 'imported_files': [], 'position': {'segment': '', 'offset': 0}}
+
+
+def merge_counters(target: Dict, source: Dict):
+    """
+    Sums the (possibly nested) numeric counters of the source dict into the target dict
+    :param target:
+    :param source:
+    :return:
+    """
+    for key, value in source.items():
+        if isinstance(value, dict):
+            merge_counters(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def apply_event_to_rollups(rollups: Dict, event: Dict):
+    """
+    Updates the daily rollups (event counts, travel cards earned and bonus type counts) and the imported legacy files
+    with a single event
+    :param rollups:
+    :param event:
+    :return:
+    """
+    day = event['timestamp'][:10]
+    data = event['data']
+    day_rollups = rollups['daily'].setdefault(day, {}).setdefault(event['type'], {})
+    day_rollups['count'] = day_rollups.get('count', 0) + 1
+    if 'imported_file' in event:
+        rollups['imported_files'].append(event['imported_file'])
+
+    if event['type'] == EventTypes.TRAVEL_CARDS_WHEEL:
+        day_rollups['earned_travel_cards'] = day_rollups.get('earned_travel_cards', 0) + data['earnedTravelCards']
+
+    if event['type'] == EventTypes.CARD_HOLDER:
+        bonus_types = day_rollups.setdefault('bonus_types', {})
+        for bonus in data['bonuses']:
+            bonus_types[bonus['bonus_type']] = bonus_types.get(bonus['bonus_type'], 0) + 1
+            rollups['bonus_types'][bonus['bonus_type']] = rollups['bonus_types'].get(bonus['bonus_type'], 0) + 1
+
+    if event['type'] == EventTypes.WORKSHOP:
+        day_rollups['retrieved_items'] = day_rollups.get('retrieved_items', 0) + (1 if data['success'] else 0)
+
+
+_event_journal: Optional[EventJournal] = None
+
+
+def get_event_journal() -> EventJournal:
+    """
+    Retrieve the process-wide events journal (configured from the environment)
+    :return:
+    """
+    global _event_journal
+
+    if _event_journal is None:
+        _event_journal = EventJournal(
+            folder=os.getenv('EVENTS_JOURNAL_FOLDER', '/data/events_journal'),
+            segment_max_bytes=int(os.getenv('EVENTS_JOURNAL_SEGMENT_MAX_BYTES', 10 * 1024 * 1024)),
+            rollups_flush_events=int(os.getenv('EVENTS_JOURNAL_ROLLUPS_FLUSH_EVENTS', 100)),
+        )
+
+    return _event_journal
+
+
+def record_event(event_type: str, data: Dict) -> Dict:
+    """
+    Records a reward event on the events journal
+    :param event_type:
+    :param data:
+    :return:
+    """
+    log("Entering record_event method", LogLevels.LOG_LEVEL_DEBUG)
+
+    return get_event_journal().record(event_type=event_type, data=data)
+
+
+def execute_journal_command(arguments: List):
+    """
+    Executes an events journal CLI command: 'import', 'rebuild' (the rollups, from the segments) or 'summary [days]'
+    :param arguments:
+    :return:
+    """
+    log("Entering execute_journal_command method", LogLevels.LOG_LEVEL_DEBUG)
+    journal = get_event_journal()
+
+    if arguments == ['import']:
+        journal.import_legacy_results()
+        return
+
+    if arguments == ['rebuild']:
+        journal.rebuild_rollups()
+        return
+
+    if len(arguments) in [1, 2] and arguments[0] == 'summary':
+        days = int(arguments[1]) if len(arguments) == 2 else None
+        print(f"Reward events totals ({'last {} day(s)'.format(days) if days is not None else 'whole journal'}):")
+        print(json.dumps(journal.get_totals(days=days), indent=4, sort_keys=True))
+        return
+
+    log("Unknown journal command ['{}']!".format("','".join(arguments)), LogLevels.LOG_LEVEL_ERROR)
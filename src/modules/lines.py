@@ -1,55 +1,155 @@
-import datetime
-import os
-
-from typing import List
-
-from models.line import Line
-from modules.lines_data import update_line_data
-from modules.lines_summary import fetch_lines_summary
-from modules.logger import log, LogLevels
-from modules.session_manager import SessionManager
-
-
-def fetch_all_lines_list(session_manager: SessionManager) -> List:
-    """
-    Retrieves a list with all the airplanes registered in the account (and their summarized data), saving the output
-    to a CSV file.
-    :param session_manager:
-    :return:
-    """
-    log("Entering fetch_all_lines_list method", LogLevels.LOG_LEVEL_DEBUG)
-    lines_summary = fetch_lines_summary(session_manager=session_manager)
-    lines = [create_line_object(line_id=line['id'], session_manager=session_manager) for line in lines_summary]
-    lines_objects_folder = os.getenv('LINES_OBJECTS_FOLDER', '/data/models/lines')
-    log(f"Finished fetching {len(lines_summary)} lines! (objects saved to folder {lines_objects_folder})")
-
-    return lines
-
-
-def create_line_object(line_id: int, session_manager: SessionManager) -> Line:
-    """
-    Create the Line object and updates it with the given ID
-    :param session_manager:
-    :param line_id:
-    :return:
-    """
-    log("Entering create_line_object method", LogLevels.LOG_LEVEL_DEBUG)
-    line = Line(id=line_id)
-
-    update_frequency_days = int(os.getenv('LINE_UPDATE_INTERVAL_DAYS', 2))
-    delta_days = (datetime.datetime.now() - line.last_updated_at).days if line.last_updated_at is not None else 0
-    if line.last_updated_at is not None and delta_days < update_frequency_days:
-        log(
-            "No need to update line {} (ID: {}) as only {} day(s) have passed since last update (expected {})".format(
-                line.name,
-                line.id,
-                delta_days,
-                update_frequency_days
-            ),
-            LogLevels.LOG_LEVEL_NOTICE
-        )
-        return line
-
-    update_line_data(line=line, session_manager=session_manager)
-
-    return line
+import datetime
+import os
+
+from typing import List, Optional, Tuple
+
+from models.airport import get_airport_registry
+from models.categorized_value import CategorizedValueTable, create_categorized_value_table
+from models.line import Line
+from models.price import Price
+from modules.change_detection import persist_change_indexes
+from modules.checkpoint import CheckpointUnits, CycleCheckpoint, open_cycle_checkpoint
+from modules.clock import get_clock
+from modules.file import FileWriteBatch
+from modules.lines_data import update_line_data
+from modules.lines_summary import fetch_lines_summary, stream_lines_summary
+from modules.logger import log, LogLevels
+from modules.memory import is_low_memory_mode, track_memory_stage
+from modules.retry_queue import get_retry_queue, RetryItemKinds
+from modules.session_manager import SessionManager
+
+
+def fetch_all_lines_list(session_manager: SessionManager) -> List:
+    """
+    Retrieves a list with all the airplanes registered in the account (and their summarized data), saving the output
+    to a CSV file. In low-memory mode, only the lines updated in this run are returned.
+    :param session_manager:
+    :return:
+    """
+    log("Entering fetch_all_lines_list method", LogLevels.LOG_LEVEL_DEBUG)
+    if is_low_memory_mode():
+        with track_memory_stage('fetch_all_lines_list'):
+            return stream_all_lines_list(session_manager=session_manager)[0]
+
+    with track_memory_stage('fetch_all_lines_list'):
+        checkpoint = open_cycle_checkpoint(cycle_name='fetch_all_lines_list')
+        lines_summary = fetch_lines_summary(session_manager=session_manager, checkpoint=checkpoint)
+        with FileWriteBatch():
+            lines = [
+                create_line_object(line_id=line['id'], session_manager=session_manager, checkpoint=checkpoint)
+                for line in lines_summary
+            ]
+            get_airport_registry().persist_to_file()
+            persist_change_indexes()
+
+        checkpoint.complete()
+
+    lines_objects_folder = os.getenv('LINES_OBJECTS_FOLDER', '/data/models/lines')
+    log(f"Finished fetching {len(lines_summary)} lines! (objects saved to folder {lines_objects_folder})")
+
+    tolerance = float(os.getenv('PRICE_DIFFERENCE_TOLERANCE', 0.05))
+    lines_with_price_difference = filter_lines_with_price_difference(lines=lines, tolerance=tolerance)
+    log(f"{len(lines_with_price_difference)} line(s) with prices differing from ideal by more than {tolerance:.0%}")
+
+    return lines
+
+
+def stream_all_lines_list(session_manager: SessionManager) -> Tuple[List, Optional[datetime.datetime]]:
+    """
+    Low-memory version of fetch_all_lines_list, streaming the lines summary and dropping each line object once it's
+    handled (only their prices are packed to compare them over the whole network). Only the lines updated in this run
+    are kept and returned, along with the last update date of the least recently updated line (of all the lines).
+    :param session_manager:
+    :return:
+    """
+    log("Entering stream_all_lines_list method", LogLevels.LOG_LEVEL_DEBUG)
+    started_at = get_clock().now()
+    checkpoint = open_cycle_checkpoint(cycle_name='fetch_all_lines_list')
+    ideal_costs = CategorizedValueTable(value_class=Price)
+    current_costs = CategorizedValueTable(value_class=Price)
+    updated_lines = []
+    lines_count = 0
+    least_recently_updated_at = None
+
+    with FileWriteBatch():
+        for line_summary in stream_lines_summary(session_manager=session_manager, checkpoint=checkpoint):
+            line = create_line_object(
+                line_id=line_summary['id'],
+                session_manager=session_manager,
+                checkpoint=checkpoint,
+            )
+            lines_count += 1
+            if line.ideal_cost is not None and line.current_cost is not None:
+                ideal_costs.append(line.ideal_cost)
+                current_costs.append(line.current_cost)
+            if line.last_updated_at is not None and line.last_updated_at >= started_at:
+                updated_lines.append(line)
+            if line.last_updated_at is not None and (
+                    least_recently_updated_at is None or line.last_updated_at < least_recently_updated_at):
+                least_recently_updated_at = line.last_updated_at
+        get_airport_registry().persist_to_file()
+        persist_change_indexes()
+
+    checkpoint.complete()
+
+    lines_objects_folder = os.getenv('LINES_OBJECTS_FOLDER', '/data/models/lines')
+    log(f"Finished fetching {lines_count} lines! (objects saved to folder {lines_objects_folder})")
+
+    tolerance = float(os.getenv('PRICE_DIFFERENCE_TOLERANCE', 0.05))
+    price_difference_count = sum(current_costs.mask_relative_difference(ideal_costs, tolerance=tolerance))
+    log(f"{price_difference_count} line(s) with prices differing from ideal by more than {tolerance:.0%}")
+    log(f"Keeping {len(updated_lines)} line(s) updated in this run", LogLevels.LOG_LEVEL_NOTICE)
+
+    return updated_lines, least_recently_updated_at
+
+
+def filter_lines_with_price_difference(lines: List[Line], tolerance: float = 0.0) -> List[Line]:
+    """
+    Retrieves the lines where any class current price differs from the ideal one by more than the given tolerance
+    (relative to the ideal price), comparing the whole network in a single pass.
+    :param lines:
+    :param tolerance:
+    :return:
+    """
+    log("Entering filter_lines_with_price_difference method", LogLevels.LOG_LEVEL_DEBUG)
+    priced_lines = [line for line in lines if line.ideal_cost is not None and line.current_cost is not None]
+    ideal_costs = create_categorized_value_table(line.ideal_cost for line in priced_lines)
+    current_costs = create_categorized_value_table(line.current_cost for line in priced_lines)
+    mask = current_costs.mask_relative_difference(ideal_costs, tolerance=tolerance)
+
+    return [line for line, has_difference in zip(priced_lines, mask) if has_difference]
+
+
+def create_line_object(line_id: int, session_manager: SessionManager, checkpoint: CycleCheckpoint = None) -> Line:
+    """
+    Create the Line object and updates it with the given ID (unless already updated in the checkpointed cycle)
+    :param session_manager:
+    :param line_id:
+    :param checkpoint:
+    :return:
+    """
+    log("Entering create_line_object method", LogLevels.LOG_LEVEL_DEBUG)
+    line = Line(id=line_id)
+    if checkpoint is not None and checkpoint.is_done(CheckpointUnits.LINE_UPDATED, line_id):
+        return line
+
+    update_frequency_days = int(os.getenv('LINE_UPDATE_INTERVAL_DAYS', 2))
+    delta_days = (get_clock().now() - line.last_updated_at).days if line.last_updated_at is not None else 0
+    if line.last_updated_at is not None and delta_days < update_frequency_days:
+        log(
+            "No need to update line {} (ID: {}) as only {} day(s) have passed since last update (expected {})".format(
+                line.name,
+                line.id,
+                delta_days,
+                update_frequency_days
+            ),
+            LogLevels.LOG_LEVEL_NOTICE
+        )
+        return line
+
+    try:
+        update_line_data(line=line, session_manager=session_manager, checkpoint=checkpoint)
+    except ReferenceError as error:
+        get_retry_queue().enqueue(RetryItemKinds.LINE, line_id, error)
+
+    return line
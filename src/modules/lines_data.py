@@ -1,174 +1,247 @@
-import datetime
-
-from bs4 import BeautifulSoup
-
-from models.airport import create_airport_from_dict
-from models.demand import Demand
-from models.line import Line
-from models.price import Price
-from modules.file import save_error_dump_file
-from modules.lines_audit import update_line_audit_data, update_line_cost
-from modules.lines_summary import fetch_lines_summary
-from modules.logger import LogLevels, log
-from modules.session_manager import SessionManager
-from modules.strings import return_only_numbers, sanitize_text
-
-
-def update_all_lines_data(session_manager: SessionManager):
-    """
-    Updates the data for all the account lines
-    :param session_manager:
-    :return:
-    """
-    log("Entering update_all_lines_data method", LogLevels.LOG_LEVEL_DEBUG)
-    lines = fetch_lines_summary(session_manager=session_manager)
-    for line_dict in lines:
-        line_id = int(line_dict['id'])
-        line = Line(id=line_id)
-        update_line_data(line=line, session_manager=session_manager)
-
-
-def update_line_data(line: Line, session_manager: SessionManager):
-    """
-    Update all the data for a given line
-    :param line:
-    :param session_manager:
-    :return:
-    """
-    log("Entering update_line_data method", LogLevels.LOG_LEVEL_DEBUG)
-    log(f"Updating data for line ID {line.id}")
-
-    log(f"Updating basic data for line ID {line.id}", LogLevels.LOG_LEVEL_NOTICE)
-    update_basic_data(line=line, session_manager=session_manager)
-
-    log(f"Updating marketing data for line ID {line.id}", LogLevels.LOG_LEVEL_NOTICE)
-    update_marketing_data(line=line, session_manager=session_manager)
-
-    if line.reliability_level > 50:
-        log(
-            "Last audit for line {} (ID {}) is not trustable ({} > 50), refreshing...".format(
-                line.name,
-                line.id,
-                line.reliability_level
-            )
-        )
-        update_line_audit_data(line=line, session_manager=session_manager)
-        update_marketing_data(line=line, session_manager=session_manager)
-
-    if line.can_update_prices and line.ideal_cost != line.current_cost:
-        log(f"Line {line.name} has a price difference between ideal and actual and can be updated, updating...")
-        update_line_cost(line=line, session_manager=session_manager)
-        update_marketing_data(line=line, session_manager=session_manager)
-
-    line.last_updated_at = datetime.datetime.now()
-    line.persist_to_file()
-    log(f"Finished fetching data for line {line.name} (ID: {line.id})!")
-
-
-def update_basic_data(line: Line, session_manager: SessionManager):
-    """
-    Update the line basic data
-    :param line:
-    :param session_manager:
-    :return:
-    """
-    log("Entering update_basic_data method", LogLevels.LOG_LEVEL_DEBUG)
-    line_details_response = session_manager.request(
-        url=f'http://tycoon.airlines-manager.com/network/showline/{line.id}',
-        method=SessionManager.Methods.GET,
-        extra_headers={
-            'Referer': 'http://tycoon.airlines-manager.com/network/',
-        },
-    )
-    line_details_bs = BeautifulSoup(line_details_response.text, 'html.parser')
-
-    content_div = line_details_bs.find('div', attrs={'id': 'content'})
-    if content_div is None:
-        log(
-            "Aborting line basic data update on ID {} as the show line div was not found!".format(line.id),
-            LogLevels.LOG_LEVEL_ERROR
-        )
-        save_error_dump_file(dump=line_details_response.text, tag='lines_basic_data_update_content_div_not_found')
-        raise ReferenceError("Div with id showLine was not found")
-
-    box1_li_items = content_div.find('ul', attrs={'id': 'box1'}).find_all('li')
-    box2_li_items = content_div.find('ul', attrs={'id': 'box2'}).find_all('li')
-
-    origin_text = sanitize_text(box1_li_items[3].find('b').text)
-    destination_text = sanitize_text(box2_li_items[3].find('b').text)
-
-    line.distance_km = return_only_numbers(box2_li_items[1].find('b').text)
-    line.taxes = return_only_numbers(box2_li_items[2].find('b').text)
-
-    line.origin = create_airport_from_dict({
-        'abbrev': sanitize_text(origin_text.split('/')[0]),
-        'name': sanitize_text(origin_text.split('/')[1]),
-    })
-
-    line.destination = create_airport_from_dict({
-        'abbrev': sanitize_text(destination_text.split('/')[0]),
-        'name': sanitize_text(destination_text.split('/')[1]),
-    })
-
-    line_title = content_div.find('div', attrs={'class': 'lineTitle'})
-    line_title.find('span').decompose()
-    line.display_name = sanitize_text(line_title.text)
-    line.name = f'{line.origin.abbrev} / {line.destination.abbrev}'
-
-
-def update_marketing_data(line: Line, session_manager: SessionManager):
-    """
-    Update the line marketing data
-    :param line:
-    :param session_manager:
-    :return:
-    """
-    log("Entering update_marketing_data method", LogLevels.LOG_LEVEL_DEBUG)
-    line_pricing_response = session_manager.request(
-        url=f'http://tycoon.airlines-manager.com/marketing/pricing/{line.id}',
-        method=SessionManager.Methods.GET,
-        extra_headers={
-            'Referer': f'http://tycoon.airlines-manager.com/network/showline/{line.id}/',
-        },
-    )
-    line_pricing_bs = BeautifulSoup(line_pricing_response.text, 'html.parser')
-
-    line_pricing_div = line_pricing_bs.find('div', attrs={'id': 'marketing_linePricing'})
-    if line_pricing_div is None:
-        log(
-            "Aborting line update on ID {} as the line pricing div was not found!".format(line.id),
-            LogLevels.LOG_LEVEL_ERROR
-        )
-        save_error_dump_file(dump=line_pricing_response.text, tag='lines_ticket_update_pricing_div_not_found')
-        raise ReferenceError("Div with id marketing_linePricing was not found")
-
-    line_pricing_div_children = line_pricing_div.findChildren()
-    line.total_demand = Demand(
-        economic = return_only_numbers(line_pricing_div_children[17].text),
-        executive = return_only_numbers(line_pricing_div_children[25].text),
-        first_class = return_only_numbers(line_pricing_div_children[33].text),
-        cargo = return_only_numbers(line_pricing_div_children[41].text),
-    )
-    line.ideal_cost = Price(
-        economic = return_only_numbers(line_pricing_div_children[15].text),
-        executive = return_only_numbers(line_pricing_div_children[23].text),
-        first_class = return_only_numbers(line_pricing_div_children[31].text),
-        cargo = return_only_numbers(line_pricing_div_children[39].text),
-    )
-    line.turnover = Price(
-        economic = return_only_numbers(line_pricing_div_children[19].text),
-        executive = return_only_numbers(line_pricing_div_children[27].text),
-        first_class = return_only_numbers(line_pricing_div_children[35].text),
-        cargo = return_only_numbers(line_pricing_div_children[43].text),
-    )
-    line.current_cost = Price(
-        economic = return_only_numbers(line_pricing_div_children[62].text),
-        executive = return_only_numbers(line_pricing_div_children[71].text),
-        first_class = return_only_numbers(line_pricing_div_children[80].text),
-        cargo = return_only_numbers(line_pricing_div_children[89].text),
-    )
-    internal_audit_cost_field = line_pricing_div.find('input', attrs={'id': 'internalAuditCost'})
-    line.internal_audit_cost = int(internal_audit_cost_field['value'])
-    line.last_audit_date = datetime.datetime.strptime(line_pricing_div_children[47].text, '%d/%m/%Y')
-    line.reliability_level = return_only_numbers(str(line_pricing_div_children[54]['class']).split(' ')[1])
-    line.can_update_prices = line_pricing_div.find('form') is not None
\ No newline at end of file
+import datetime
+
+from models.airport import create_airport_from_dict, get_airport_registry
+from models.demand import Demand
+from models.line import Line
+from models.price import Price
+from modules.change_detection import detect_line_changes, is_change_detection_enabled, persist_change_indexes
+from modules.checkpoint import CheckpointUnits, CycleCheckpoint, open_cycle_checkpoint
+from modules.clock import get_clock
+from modules.error_dumps import save_error_dump_file
+from modules.file import FileWriteBatch, file_exists
+from modules.html_parser import parse_html, release_html
+from modules.lines_audit import update_line_audit_data, update_line_cost
+from modules.lines_summary import fetch_lines_summary, stream_lines_summary
+from modules.logger import LogLevels, log
+from modules.memory import is_low_memory_mode, track_memory_stage
+from modules.retry_queue import get_retry_queue, RetryItemKinds
+from modules.session_manager import SessionManager
+from modules.strings import return_only_numbers, sanitize_text
+from modules.urls import build_url
+
+
+def update_all_lines_data(session_manager: SessionManager, restart_cycle: bool = False):
+    """
+    Updates the data for all the account lines, resuming the previous cycle if it was interrupted (unless a restart
+    is requested). In low-memory mode, the lines summary is streamed instead of being fetched upfront.
+    :param session_manager:
+    :param restart_cycle:
+    :return:
+    """
+    log("Entering update_all_lines_data method", LogLevels.LOG_LEVEL_DEBUG)
+    checkpoint = open_cycle_checkpoint(cycle_name='update_all_lines_data', restart=restart_cycle)
+    with track_memory_stage('update_all_lines_data'):
+        if is_low_memory_mode():
+            lines = stream_lines_summary(session_manager=session_manager, checkpoint=checkpoint)
+        else:
+            lines = fetch_lines_summary(session_manager=session_manager, checkpoint=checkpoint)
+
+        with FileWriteBatch():
+            for line_dict in lines:
+                line_id = int(line_dict['id'])
+                if checkpoint.is_done(CheckpointUnits.LINE_UPDATED, line_id):
+                    log(
+                        f"Skipping line ID {line_id} as it was already updated in this cycle",
+                        LogLevels.LOG_LEVEL_NOTICE,
+                    )
+                    continue
+
+                line = Line(id=line_id)
+                try:
+                    update_line_data(line=line, session_manager=session_manager, checkpoint=checkpoint)
+                except ReferenceError as error:
+                    get_retry_queue().enqueue(RetryItemKinds.LINE, line_id, error)
+
+            get_airport_registry().persist_to_file()
+            persist_change_indexes()
+
+    checkpoint.complete()
+
+
+def update_line_data(line: Line, session_manager: SessionManager, checkpoint: CycleCheckpoint = None):
+    """
+    Update all the data for a given line (recording the price updates and the line completion in the checkpointed
+    cycle, if given). With the change detection enabled, the line is only persisted if it has changed.
+    :param line:
+    :param session_manager:
+    :param checkpoint:
+    :return:
+    """
+    log("Entering update_line_data method", LogLevels.LOG_LEVEL_DEBUG)
+    log(f"Updating data for line ID {line.id}")
+
+    log(f"Updating basic data for line ID {line.id}", LogLevels.LOG_LEVEL_NOTICE)
+    update_basic_data(line=line, session_manager=session_manager)
+
+    log(f"Updating marketing data for line ID {line.id}", LogLevels.LOG_LEVEL_NOTICE)
+    update_marketing_data(line=line, session_manager=session_manager)
+
+    if line.reliability_level > 50:
+        log(
+            "Last audit for line {} (ID {}) is not trustable ({} > 50), refreshing...".format(
+                line.name,
+                line.id,
+                line.reliability_level
+            )
+        )
+        update_line_audit_data(line=line, session_manager=session_manager)
+        update_marketing_data(line=line, session_manager=session_manager)
+
+    price_update_key = '{}:{}'.format(line.id, ','.join(str(value) for value in line.ideal_cost.as_tuple()))
+    if checkpoint is not None and checkpoint.is_done(CheckpointUnits.PRICE_POSTED, price_update_key):
+        log(f"Skipping price update of line {line.name} as the same prices were already posted in this cycle")
+    elif line.can_update_prices and line.ideal_cost != line.current_cost:
+        log(f"Line {line.name} has a price difference between ideal and actual and can be updated, updating...")
+        update_line_cost(line=line, session_manager=session_manager)
+        if checkpoint is not None:
+            checkpoint.mark_done(CheckpointUnits.PRICE_POSTED, price_update_key)
+        update_marketing_data(line=line, session_manager=session_manager)
+
+    line.last_updated_at = get_clock().now()
+    has_changes = True
+    if is_change_detection_enabled():
+        has_changes = detect_line_changes(line_id=line.id, line_dict=line.serialize())
+    if has_changes or not file_exists(line.get_filepath()):
+        line.persist_to_file()
+    else:
+        log(f"Skipping the persistence of line {line.name} as it didn't change", LogLevels.LOG_LEVEL_NOTICE)
+    if checkpoint is not None:
+        checkpoint.mark_done(CheckpointUnits.LINE_UPDATED, line.id)
+    get_retry_queue().resolve(RetryItemKinds.LINE, line.id)
+    log(f"Finished fetching data for line {line.name} (ID: {line.id})!")
+
+
+def update_basic_data(line: Line, session_manager: SessionManager):
+    """
+    Update the line basic data
+    :param line:
+    :param session_manager:
+    :return:
+    """
+    log("Entering update_basic_data method", LogLevels.LOG_LEVEL_DEBUG)
+    line_details_response = session_manager.request(
+        url=build_url(f'/network/showline/{line.id}'),
+        method=SessionManager.Methods.GET,
+        extra_headers={
+            'Referer': build_url('/network/'),
+        },
+    )
+    parse_basic_data(line=line, html_text=line_details_response.text)
+
+
+def parse_basic_data(line: Line, html_text: str):
+    """
+    Parses the line details page into the line basic data
+    :param line:
+    :param html_text:
+    :return:
+    """
+    log("Entering parse_basic_data method", LogLevels.LOG_LEVEL_DEBUG)
+    line_details_bs = parse_html(html_text, page='line_details')
+    try:
+        content_div = line_details_bs.find('div', attrs={'id': 'content'})
+        if content_div is None:
+            log(
+                "Aborting line basic data update on ID {} as the show line div was not found!".format(line.id),
+                LogLevels.LOG_LEVEL_ERROR
+            )
+            save_error_dump_file(dump=html_text, tag='lines_basic_data_update_content_div_not_found')
+            raise ReferenceError("Div with id showLine was not found")
+
+        box1_li_items = content_div.find('ul', attrs={'id': 'box1'}).find_all('li')
+        box2_li_items = content_div.find('ul', attrs={'id': 'box2'}).find_all('li')
+
+        origin_text = sanitize_text(box1_li_items[3].find('b').text)
+        destination_text = sanitize_text(box2_li_items[3].find('b').text)
+
+        line.distance_km = return_only_numbers(box2_li_items[1].find('b').text)
+        line.taxes = return_only_numbers(box2_li_items[2].find('b').text)
+
+        line.origin = create_airport_from_dict({
+            'abbrev': sanitize_text(origin_text.split('/')[0]),
+            'name': sanitize_text(origin_text.split('/')[1]),
+        })
+
+        line.destination = create_airport_from_dict({
+            'abbrev': sanitize_text(destination_text.split('/')[0]),
+            'name': sanitize_text(destination_text.split('/')[1]),
+        })
+        get_airport_registry().index_line(line.id, line.origin, line.destination)
+
+        line_title = content_div.find('div', attrs={'class': 'lineTitle'})
+        line_title.find('span').decompose()
+        line.display_name = sanitize_text(line_title.text)
+        line.name = f'{line.origin.abbrev} / {line.destination.abbrev}'
+    finally:
+        release_html(line_details_bs)
+
+
+def update_marketing_data(line: Line, session_manager: SessionManager):
+    """
+    Update the line marketing data
+    :param line:
+    :param session_manager:
+    :return:
+    """
+    log("Entering update_marketing_data method", LogLevels.LOG_LEVEL_DEBUG)
+    line_pricing_response = session_manager.request(
+        url=build_url(f'/marketing/pricing/{line.id}'),
+        method=SessionManager.Methods.GET,
+        extra_headers={
+            'Referer': build_url(f'/network/showline/{line.id}/'),
+        },
+    )
+    parse_marketing_data(line=line, html_text=line_pricing_response.text)
+
+
+def parse_marketing_data(line: Line, html_text: str):
+    """
+    Parses the line pricing page into the line marketing data
+    :param line:
+    :param html_text:
+    :return:
+    """
+    log("Entering parse_marketing_data method", LogLevels.LOG_LEVEL_DEBUG)
+    line_pricing_bs = parse_html(html_text, page='line_pricing')
+    try:
+        line_pricing_div = line_pricing_bs.find('div', attrs={'id': 'marketing_linePricing'})
+        if line_pricing_div is None:
+            log(
+                "Aborting line update on ID {} as the line pricing div was not found!".format(line.id),
+                LogLevels.LOG_LEVEL_ERROR
+            )
+            save_error_dump_file(dump=html_text, tag='lines_ticket_update_pricing_div_not_found')
+            raise ReferenceError("Div with id marketing_linePricing was not found")
+
+        line_pricing_div_children = line_pricing_div.findChildren()
+        line.total_demand = Demand(
+            economic = return_only_numbers(line_pricing_div_children[17].text),
+            executive = return_only_numbers(line_pricing_div_children[25].text),
+            first_class = return_only_numbers(line_pricing_div_children[33].text),
+            cargo = return_only_numbers(line_pricing_div_children[41].text),
+        )
+        line.ideal_cost = Price(
+            economic = return_only_numbers(line_pricing_div_children[15].text),
+            executive = return_only_numbers(line_pricing_div_children[23].text),
+            first_class = return_only_numbers(line_pricing_div_children[31].text),
+            cargo = return_only_numbers(line_pricing_div_children[39].text),
+        )
+        line.turnover = Price(
+            economic = return_only_numbers(line_pricing_div_children[19].text),
+            executive = return_only_numbers(line_pricing_div_children[27].text),
+            first_class = return_only_numbers(line_pricing_div_children[35].text),
+            cargo = return_only_numbers(line_pricing_div_children[43].text),
+        )
+        line.current_cost = Price(
+            economic = return_only_numbers(line_pricing_div_children[62].text),
+            executive = return_only_numbers(line_pricing_div_children[71].text),
+            first_class = return_only_numbers(line_pricing_div_children[80].text),
+            cargo = return_only_numbers(line_pricing_div_children[89].text),
+        )
+        internal_audit_cost_field = line_pricing_div.find('input', attrs={'id': 'internalAuditCost'})
+        line.internal_audit_cost = int(internal_audit_cost_field['value'])
+        line.last_audit_date = datetime.datetime.strptime(line_pricing_div_children[47].text, '%d/%m/%Y')
+        line.reliability_level = return_only_numbers(str(line_pricing_div_children[54]['class']).split(' ')[1])
+        line.can_update_prices = line_pricing_div.find('form') is not None
+    finally:
+        release_html(line_pricing_bs)
@@ -0,0 +1,129 @@
+import multiprocessing
+import os
+import threading
+
+from typing import List
+
+from models.airport import get_airport_registry
+from models.line import Line
+from modules.change_detection import persist_change_indexes
+from modules.clock import get_clock
+from modules.lines_data import update_line_data
+from modules.lines_summary import fetch_lines_summary
+from modules.logger import log, LogLevels
+from modules.session_manager import SessionManager
+from modules.work_queue import get_work_queue, WorkItemStates, WorkQueue
+
+LINES_QUEUE_NAME = 'lines'
+
+
+def execute_queue_coordinator():
+    """
+    Fetches the lines summary and queues the update of each line on the work queue (to be processed by the workers)
+    :return:
+    """
+    log("Entering execute_queue_coordinator method", LogLevels.LOG_LEVEL_DEBUG)
+    lines = fetch_lines_summary(session_manager=SessionManager())
+    work_queue = get_work_queue()
+    queued_count = work_queue.enqueue(LINES_QUEUE_NAME, [int(line_dict['id']) for line_dict in lines])
+
+    counts = work_queue.get_counts(LINES_QUEUE_NAME)
+    log(
+        f"Queued {queued_count} of {len(lines)} line(s) for update ({counts[WorkItemStates.PENDING]} pending, "
+        f"{counts[WorkItemStates.LEASED]} leased)"
+    )
+
+
+def keep_lease_alive(work_queue: WorkQueue, key: str, owner: str, stop_event: threading.Event):
+    """
+    Sends the heartbeats of a leased item until the given event is set
+    :param work_queue:
+    :param key:
+    :param owner:
+    :param stop_event:
+    :return:
+    """
+    while not stop_event.wait(timeout=work_queue.lease_seconds / 3):
+        if not work_queue.heartbeat(LINES_QUEUE_NAME, key, owner):
+            log(f"Lost the lease of line ID {key} (it may be updated twice)", LogLevels.LOG_LEVEL_WARNING)
+            return
+
+
+def run_queue_worker(worker_name: str):
+    """
+    Entrypoint of the work queue worker processes: leases the lines and updates them until the queue is finished (a
+    failed line is released back to the queue, to be retried until its max attempts, and the worker keeps going)
+    :param worker_name:
+    :return:
+    """
+    log(f"Starting work queue worker '{worker_name}'", LogLevels.LOG_LEVEL_NOTICE)
+    work_queue = get_work_queue()
+    session_manager = SessionManager()
+    owner = f'{worker_name}:{os.getpid()}'
+    poll_interval = float(os.getenv('WORK_QUEUE_POLL_SECONDS', 10))
+
+    updated_count = 0
+    while True:
+        key = work_queue.lease(LINES_QUEUE_NAME, owner)
+        if key is None:
+            if work_queue.get_counts(LINES_QUEUE_NAME)[WorkItemStates.LEASED] == 0:
+                break
+
+            # Other workers hold leases which may expire and return to the queue
+            get_clock().sleep(poll_interval)
+            continue
+
+        stop_event = threading.Event()
+        heartbeat_thread = threading.Thread(
+            target=keep_lease_alive,
+            args=(work_queue, key, owner, stop_event),
+            daemon=True,
+        )
+        heartbeat_thread.start()
+        try:
+            update_line_data(line=Line(id=int(key)), session_manager=session_manager)
+        except Exception as error:
+            work_queue.fail(LINES_QUEUE_NAME, key, owner, error)
+            continue
+        finally:
+            stop_event.set()
+            heartbeat_thread.join()
+
+        work_queue.complete(LINES_QUEUE_NAME, key, owner)
+        updated_count += 1
+
+    get_airport_registry().persist_to_file()
+    persist_change_indexes()
+    log(f"Work queue worker '{worker_name}' finished after updating {updated_count} line(s)")
+
+
+def execute_queue_workers(arguments: List):
+    """
+    Runs the given amount of work queue workers (each one on its own process, sharing the request pacer) until the
+    queue is finished
+    :param arguments:
+    :return:
+    """
+    log("Entering execute_queue_workers method", LogLevels.LOG_LEVEL_DEBUG)
+    workers_count = int(arguments[0]) if len(arguments) > 0 else int(os.getenv('WORK_QUEUE_WORKERS', 2))
+
+    # The workers must share the request pacer so the global request rate is kept
+    os.environ.setdefault('REQUEST_PACER_STATE_FILEPATH', '/data/request_pacer.state')
+
+    processes = [
+        multiprocessing.Process(target=run_queue_worker, args=(f'worker-{index + 1}',), name=f'worker-{index + 1}')
+        for index in range(workers_count)
+    ]
+    for process in processes:
+        process.start()
+
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            log(f"Work queue {process.name} exited with code {process.exitcode}", LogLevels.LOG_LEVEL_ERROR)
+
+    counts = get_work_queue().get_counts(LINES_QUEUE_NAME)
+    log(
+        f"Work queue finished: {counts[WorkItemStates.DONE]} line(s) updated, {counts[WorkItemStates.DEAD]} gave up, "
+        f"{counts[WorkItemStates.PENDING] + counts[WorkItemStates.LEASED]} left"
+    )
@@ -1,91 +1,216 @@
-import os
-
-from bs4 import BeautifulSoup
-from bs4.element import ResultSet
-from typing import List, Dict, Tuple
-
-from modules.file import save_dict_to_csv, save_error_dump_file
-from modules.logger import log, LogLevels
-from modules.pagination import check_has_next_page
-from modules.session_manager import SessionManager
-from modules.strings import sanitize_text
-
-
-def fetch_lines_summary(session_manager: SessionManager) -> List:
-    """
-    Fetches the summary of all lines for the user account
-    :param session_manager:
-    :return:
-    """
-    log("Entering fetch_lines_summary method", LogLevels.LOG_LEVEL_DEBUG)
-    has_next = True
-    page = 1
-    lines_summary = []
-
-    while has_next:
-        page_lines, has_next = fetch_lines_summary_from_page(session_manager, page)
-        lines_summary.extend(page_lines)
-        page += 1
-
-    lines_summary_filepath = os.getenv('LINES_SUMMARY_FILEPATH', '/data/lines_summary.csv')
-    save_dict_to_csv(lines_summary, lines_summary_filepath)
-    log(f"Finished listing {len(lines_summary)} lines! (summary exported to {lines_summary_filepath})")
-
-    return lines_summary
-
-
-def fetch_lines_summary_from_page(session_manager: SessionManager, page: int = 1) -> Tuple:
-    """
-    Retrieves a tuple of 2 items, containing the List of the lines in that page and if there's a next page available.
-    :param session_manager:
-    :param page:
-    :return:
-    """
-    log("Entering fetch_lines_summary_from_page method", LogLevels.LOG_LEVEL_DEBUG)
-    lines = session_manager.request(
-        url='http://tycoon.airlines-manager.com/network/?page=' + str(page),
-        method=SessionManager.Methods.GET,
-    )
-    lines_bs = BeautifulSoup(lines.text, 'html.parser')
-
-    amgold_lines_table = lines_bs.find('div', attrs={'id': 'displayPro'})
-    if amgold_lines_table is None:
-        log("Aborting lines reading as the AM Gold lines table was not found!", LogLevels.LOG_LEVEL_ERROR)
-        save_error_dump_file(dump=lines.text, tag='lines_amgold_table_not_found')
-        raise ReferenceError("Div with id displayPro was not found")
-
-    lines_table = amgold_lines_table.find_all('table')[1]
-    lines_rows = lines_table.find_all('tr')
-    log("Found a total of {} rows in page {}.".format(len(lines_rows), page), LogLevels.LOG_LEVEL_NOTICE)
-    lines = [parse_line_summary_row(row) for row in lines_rows]
-    lines = [line for line in lines if not len(line) == 0]
-
-    return lines, check_has_next_page(lines_bs)
-
-
-def parse_line_summary_row(row: ResultSet) -> Dict:
-    """
-    Parses a BS4 table row from the lines results page into a dict represent one single line.
-    :param row:
-    :return:
-    """
-    log("Entering parse_line_summary_row method", LogLevels.LOG_LEVEL_DEBUG)
-    if len(row.find_all('th')) > 0:
-        return {}
-
-    cells = row.find_all('td')
-
-    return {
-        'id': int(str(cells[6].find('a')['href']).split('/')[-1]),
-        'name': sanitize_text(cells[0].text),
-        'origin': sanitize_text(str(cells[0].text).split('/')[0]),
-        'destination': sanitize_text(str(cells[0].text).split('/')[1]),
-        'country_flag_alt': cells[0].find('img')['alt'],
-        'country_flag_url': cells[0].find('img')['src'],
-        'distance': sanitize_text(cells[1].text),
-        'remaining_demand': sanitize_text(cells[2].text),
-        'turnover': sanitize_text(cells[3].text),
-        'result_last_1_day': sanitize_text(cells[4].text),
-        'result_last_7_days': '--ToDo--',
-        'url': cells[6].find('a')['href'],
-    }
+import functools
+import os
+
+from bs4.element import ResultSet
+from typing import Dict, Iterator, List, Tuple
+
+from modules.change_detection import (
+    ChangeEventTypes,
+    ChangeIndexNames,
+    create_listing_changes,
+    get_change_index,
+    is_change_detection_enabled,
+)
+from modules.checkpoint import CheckpointUnits, CycleCheckpoint
+from modules.error_dumps import save_error_dump_file
+from modules.file import CsvColumnTypes, CsvStreamWriter
+from modules.html_parser import parse_html, release_html
+from modules.incremental_crawl import create_incremental_crawl, IncrementalCrawl, is_incremental_crawl_enabled
+from modules.logger import log, LogLevels
+from modules.pagination import check_has_next_page, get_pages_count, iterate_pages
+from modules.session_manager import SessionManager
+from modules.strings import sanitize_text
+from modules.urls import build_url
+
+# Columns (in order) and types of the lines summary CSV export
+LINES_SUMMARY_SCHEMA = {
+    'id': CsvColumnTypes.INTEGER,
+    'name': CsvColumnTypes.TEXT,
+    'origin': CsvColumnTypes.TEXT,
+    'destination': CsvColumnTypes.TEXT,
+    'country_flag_alt': CsvColumnTypes.TEXT,
+    'country_flag_url': CsvColumnTypes.TEXT,
+    'distance': CsvColumnTypes.INTEGER,
+    'remaining_demand': CsvColumnTypes.INTEGER,
+    'turnover': CsvColumnTypes.INTEGER,
+    'result_last_1_day': CsvColumnTypes.INTEGER,
+    'result_last_7_days': CsvColumnTypes.INTEGER,
+    'url': CsvColumnTypes.TEXT,
+}
+
+def fetch_lines_summary(session_manager: SessionManager, checkpoint: CycleCheckpoint = None) -> List:
+    """
+    Fetches the summary of all lines for the user account (the pages already fetched in the checkpointed cycle, if
+    given, are reused), streaming it to the summary CSV file as the pages arrive (see stream_lines_summary)
+    :param session_manager:
+    :param checkpoint:
+    :return:
+    """
+    log("Entering fetch_lines_summary method", LogLevels.LOG_LEVEL_DEBUG)
+
+    return list(stream_lines_summary(session_manager=session_manager, checkpoint=checkpoint))
+
+
+def stream_lines_summary(session_manager: SessionManager, checkpoint: CycleCheckpoint = None) -> Iterator[Dict]:
+    """
+    Yields the summary of each line of the user account as its page is fetched, writing it to the summary CSV file
+    along the way (which is only replaced once all the lines were consumed). In the incremental crawl mode (or with the
+    change detection enabled), the summary CSV file is only replaced if the pages (or the lines) changed.
+    :param session_manager:
+    :param checkpoint:
+    :return:
+    """
+    log("Entering stream_lines_summary method", LogLevels.LOG_LEVEL_DEBUG)
+    lines_summary_filepath = os.getenv('LINES_SUMMARY_FILEPATH', '/data/lines_summary.csv')
+    crawl = create_incremental_crawl('lines_summary') if is_incremental_crawl_enabled() else None
+    changes = None
+    if is_change_detection_enabled():
+        changes = create_listing_changes(
+            name=ChangeIndexNames.LINES_SUMMARY,
+            added_event_type=ChangeEventTypes.LINE_ADDED,
+            removed_event_type=ChangeEventTypes.LINE_REMOVED,
+        )
+
+    with CsvStreamWriter(lines_summary_filepath, schema=LINES_SUMMARY_SCHEMA) as csv_writer:
+        for line_summary in iterate_lines_summary(session_manager=session_manager, checkpoint=checkpoint, crawl=crawl):
+            csv_writer.write_row(line_summary)
+            if changes is not None:
+                changes.compare_row(line_summary)
+            yield line_summary
+
+        if changes is not None:
+            changes.finish()
+            for line_id in changes.removed_keys:
+                get_change_index(ChangeIndexNames.LINES).remove(line_id)
+
+        is_unchanged = os.path.isfile(csv_writer.filepath) and (
+            (crawl is not None and not crawl.has_changes) or (changes is not None and not changes.has_changes)
+        )
+        if is_unchanged:
+            csv_writer.discard()
+
+    if is_unchanged:
+        log(f"Finished listing {csv_writer.rows_count} lines! (unchanged since the previous listing)")
+        return
+
+    log(f"Finished listing {csv_writer.rows_count} lines! (summary exported to {csv_writer.filepath})")
+
+
+def iterate_lines_summary(
+        session_manager: SessionManager,
+        checkpoint: CycleCheckpoint = None,
+        crawl: IncrementalCrawl = None,
+) -> Iterator[Dict]:
+    """
+    Yields the summary of each line of the user account in order, fetching the pages concurrently once the first one
+    tells the pages count (the pages already fetched in the checkpointed cycle, if given, are reused). If an
+    incremental crawl is given, it stops paging when the pages didn't change since its previous crawl.
+    :param session_manager:
+    :param checkpoint:
+    :param crawl:
+    :return:
+    """
+    log("Entering iterate_lines_summary method", LogLevels.LOG_LEVEL_DEBUG)
+    fetch_page = functools.partial(get_lines_summary_page, session_manager, checkpoint=checkpoint)
+    if crawl is not None:
+        yield from crawl.iterate_rows(fetch_page)
+        return
+
+    for page_lines, _, _ in iterate_pages(fetch_page):
+        yield from page_lines
+
+
+def get_lines_summary_page(session_manager: SessionManager, page: int, checkpoint: CycleCheckpoint = None) -> Tuple:
+    """
+    Retrieves the result of a lines results page (see fetch_lines_summary_from_page), reusing it if it was recently
+    fetched in the checkpointed cycle (if given), as the lines listed on the page change between the fetches
+    :param session_manager:
+    :param page:
+    :param checkpoint:
+    :return:
+    """
+    max_age_seconds = float(os.getenv('CHECKPOINT_SUMMARY_PAGE_MAX_AGE_MINUTES', 30)) * 60
+    if checkpoint is not None and checkpoint.is_done(CheckpointUnits.SUMMARY_PAGE, page, max_age_seconds):
+        # The pages checkpointed before the pages count was parsed don't have it
+        return tuple(checkpoint.get(CheckpointUnits.SUMMARY_PAGE, page) + [None])[:3]
+
+    page_result = fetch_lines_summary_from_page(session_manager, page)
+    if checkpoint is not None:
+        checkpoint.mark_done(CheckpointUnits.SUMMARY_PAGE, page, list(page_result))
+
+    return page_result
+
+
+def fetch_lines_summary_from_page(session_manager: SessionManager, page: int = 1) -> Tuple:
+    """
+    Retrieves a tuple of 3 items, containing the List of the lines in that page, if there's a next page available and
+    the total amount of pages (None if unknown).
+    :param session_manager:
+    :param page:
+    :return:
+    """
+    log("Entering fetch_lines_summary_from_page method", LogLevels.LOG_LEVEL_DEBUG)
+    lines_response = session_manager.request(
+        url=build_url('/network/?page=' + str(page)),
+        method=SessionManager.Methods.GET,
+    )
+
+    return parse_lines_summary_page(html_text=lines_response.text, page=page)
+
+
+def parse_lines_summary_page(html_text: str, page: int = 1) -> Tuple:
+    """
+    Parses a lines results page into a tuple of 3 items, containing the List of the lines in that page, if there's a
+    next page available and the total amount of pages (None if unknown).
+    :param html_text:
+    :param page:
+    :return:
+    """
+    log("Entering parse_lines_summary_page method", LogLevels.LOG_LEVEL_DEBUG)
+    lines_bs = parse_html(html_text, page='network')
+    try:
+        amgold_lines_table = lines_bs.find('div', attrs={'id': 'displayPro'})
+        if amgold_lines_table is None:
+            log("Aborting lines reading as the AM Gold lines table was not found!", LogLevels.LOG_LEVEL_ERROR)
+            save_error_dump_file(dump=html_text, tag='lines_amgold_table_not_found')
+            raise ReferenceError("Div with id displayPro was not found")
+
+        lines_table = amgold_lines_table.find_all('table')[1]
+        lines_rows = lines_table.find_all('tr')
+        log("Found a total of {} rows in page {}.".format(len(lines_rows), page), LogLevels.LOG_LEVEL_NOTICE)
+        lines = [parse_line_summary_row(row) for row in lines_rows]
+        lines = [line for line in lines if not len(line) == 0]
+        has_next_page = check_has_next_page(lines_bs)
+        pages_count = get_pages_count(lines_bs)
+    finally:
+        release_html(lines_bs)
+
+    return lines, has_next_page, pages_count
+
+
+def parse_line_summary_row(row: ResultSet) -> Dict:
+    """
+    Parses a BS4 table row from the lines results page into a dict represent one single line.
+    :param row:
+    :return:
+    """
+    log("Entering parse_line_summary_row method", LogLevels.LOG_LEVEL_DEBUG)
+    if len(row.find_all('th')) > 0:
+        return {}
+
+    cells = row.find_all('td')
+
+    return {
+        'id': int(str(cells[6].find('a')['href']).split('/')[-1]),
+        'name': sanitize_text(cells[0].text),
+        'origin': sanitize_text(str(cells[0].text).split('/')[0]),
+        'destination': sanitize_text(str(cells[0].text).split('/')[1]),
+        'country_flag_alt': cells[0].find('img')['alt'],
+        'country_flag_url': cells[0].find('img')['src'],
+        'distance': sanitize_text(cells[1].text),
+        'remaining_demand': sanitize_text(cells[2].text),
+        'turnover': sanitize_text(cells[3].text),
+        'result_last_1_day': sanitize_text(cells[4].text),
+        'result_last_7_days': '--ToDo--',
+        'url': cells[6].find('a')['href'],
+    }
@@ -0,0 +1,107 @@
+import os
+import resource
+import threading
+import tracemalloc
+
+from contextlib import contextmanager
+from typing import Dict, List
+
+from modules.logger import log, LogLevels
+
+_stages_lock = threading.Lock()
+_stages_context = threading.local()
+_stages_report: Dict[str, Dict] = {}
+
+
+def is_low_memory_mode() -> bool:
+    """
+    Determines if the low-memory mode is enabled in the environment (the lines and airplanes are streamed instead of
+    being kept in memory)
+    :return:
+    """
+    return os.getenv('LOW_MEMORY_MODE', 'false').lower() in ['1', 'true', 'yes']
+
+
+def is_memory_profiling_enabled() -> bool:
+    """
+    Determines if the per-stage memory profiling (tracemalloc) is enabled in the environment
+    :return:
+    """
+    return os.getenv('MEMORY_PROFILE', 'false').lower() in ['1', 'true', 'yes']
+
+
+@contextmanager
+def track_memory_stage(stage: str):
+    """
+    Context manager recording the peak of the memory allocated while its block runs (relative to the memory already
+    allocated when it started) when the memory profiling is enabled. The stages may be nested, but the ones running
+    concurrently on other threads are accounted in each other's peaks, as tracemalloc traces the whole process.
+    :param stage:
+    :return:
+    """
+    if not is_memory_profiling_enabled():
+        yield
+        return
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    stack = getattr(_stages_context, 'stack', None)
+    if stack is None:
+        stack = _stages_context.stack = []
+
+    # Keeps the peak reached so far by the parent stage, as the peak is reset for this one
+    if len(stack) > 0:
+        stack[-1]['peak'] = max(stack[-1]['peak'], tracemalloc.get_traced_memory()[1])
+
+    started_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    stack.append({'peak': 0})
+    try:
+        yield
+    finally:
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        peak_memory = max(peak_memory, stack.pop()['peak'])
+        if len(stack) > 0:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak_memory)
+
+        with _stages_lock:
+            stage_report = _stages_report.setdefault(stage, {'runs': 0, 'peak_bytes': 0, 'retained_bytes': 0})
+            stage_report['runs'] += 1
+            stage_report['peak_bytes'] = max(stage_report['peak_bytes'], peak_memory - started_memory)
+            stage_report['retained_bytes'] = current_memory - started_memory
+
+        log(
+            f"Memory of stage '{stage}': peak +{(peak_memory - started_memory) / 1024 / 1024:.1f} MiB, "
+            f"retained {(current_memory - started_memory) / 1024 / 1024:+.1f} MiB",
+            LogLevels.LOG_LEVEL_NOTICE,
+        )
+
+
+def get_memory_report() -> List[Dict]:
+    """
+    Retrieve the memory report of the stages tracked so far (with the process max RSS)
+    :return:
+    """
+    with _stages_lock:
+        stages = [{'stage': stage, **stage_report} for stage, stage_report in _stages_report.items()]
+
+    return sorted(stages, key=lambda stage_report: stage_report['peak_bytes'], reverse=True)
+
+
+def log_memory_report():
+    """
+    Logs the memory report of the stages tracked so far (if the memory profiling is enabled)
+    :return:
+    """
+    if not is_memory_profiling_enabled():
+        return
+
+    # The max RSS is reported in KiB on Linux
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    log(f"Memory report (process max RSS: {max_rss:.1f} MiB):")
+    for stage_report in get_memory_report():
+        log(
+            f"{stage_report['stage']}: peak +{stage_report['peak_bytes'] / 1024 / 1024:.1f} MiB, "
+            f"last retained {stage_report['retained_bytes'] / 1024 / 1024:+.1f} MiB ({stage_report['runs']} run(s))"
+        )
@@ -0,0 +1,451 @@
+import bisect
+import os
+import re
+import tempfile
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from modules.logger import log, LogLevels
+from modules.run_report import add_run_usage
+
+DEFAULT_DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600,
+)
+
+
+def format_labels(label_names: Tuple, label_values: Tuple, extra: Dict = None) -> str:
+    """
+    Formats the labels of a sample in the text exposition format
+    :param label_names:
+    :param label_values:
+    :param extra:
+    :return:
+    """
+    labels = list(zip(label_names, label_values)) + list((extra or {}).items())
+    if len(labels) == 0:
+        return ''
+
+    escaped_labels = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    ]
+
+    return '{' + ','.join(escaped_labels) + '}'
+
+
+def format_value(value: float) -> str:
+    """
+    Formats a sample value in the text exposition format
+    :param value:
+    :return:
+    """
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    Base class of the metrics: a named family of samples, one per combination of the label values
+    """
+    metric_type = None
+
+    def __init__(self, name: str, documentation: str, label_names: List[str] = None):
+        """
+        Metric class constructor
+        :param name:
+        :param documentation:
+        :param label_names:
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names or [])
+        self._values: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def get_label_values(self, labels: Dict) -> Tuple:
+        """
+        Retrieve the label values tuple for the given labels dict (which must have all the metric labels)
+        :param labels:
+        :return:
+        """
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        """
+        Renders the metric in the text exposition format
+        :return:
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.extend(self.render_samples(label_values, value))
+
+        return lines
+
+    def render_samples(self, label_values: Tuple, value) -> List[str]:
+        """
+        Renders the samples of a single combination of the label values
+        :param label_values:
+        :param value:
+        :return:
+        """
+        return [f'{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}']
+
+
+class Counter(Metric):
+    """
+    Metric holding a value that only increases (e.g. the amount of requests)
+    """
+    metric_type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        Increments the counter of the given labels
+        :param amount:
+        :param labels:
+        :return:
+        """
+        label_values = self.get_label_values(labels)
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Metric holding a value that may go up and down (e.g. the duration of the last cycle)
+    """
+    metric_type = 'gauge'
+
+    def set(self, value: float, **labels):
+        """
+        Sets the gauge of the given labels
+        :param value:
+        :param labels:
+        :return:
+        """
+        label_values = self.get_label_values(labels)
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(Metric):
+    """
+    Metric counting the observed values in fixed buckets (plus their sum and count), e.g. the requests latencies
+    """
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: List[str] = None, buckets: Tuple = None):
+        """
+        Histogram class constructor
+        :param name:
+        :param documentation:
+        :param label_names:
+        :param buckets:
+        """
+        super().__init__(name=name, documentation=documentation, label_names=label_names)
+        self.buckets = tuple(sorted(buckets or DEFAULT_DURATION_BUCKETS))
+
+    def observe(self, value: float, **labels):
+        """
+        Observes a value for the given labels
+        :param value:
+        :param labels:
+        :return:
+        """
+        label_values = self.get_label_values(labels)
+        with self._lock:
+            bucket_counts, total = self._values.get(label_values, ([0] * (len(self.buckets) + 1), 0.0))
+            bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[label_values] = (bucket_counts, total + value)
+
+    def render_samples(self, label_values: Tuple, value) -> List[str]:
+        bucket_counts, total = value
+        lines = []
+        cumulative_count = 0
+        for upper_bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+            cumulative_count += bucket_count
+            labels = format_labels(self.label_names, label_values, {'le': format_value(upper_bound)})
+            lines.append(f'{self.name}_bucket{labels} {cumulative_count}')
+
+        labels = format_labels(self.label_names, label_values)
+        lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative_count}')
+
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Registry of the process metrics, rendered in the Prometheus text exposition format
+    """
+    def __init__(self):
+        """
+        MetricsRegistry class constructor
+        """
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Registers a metric, returning the one already registered with the same name (if any)
+        :param metric:
+        :return:
+        """
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, label_names: List[str] = None) -> Counter:
+        """
+        Retrieve the counter with the given name (registering it if needed)
+        :param name:
+        :param documentation:
+        :param label_names:
+        :return:
+        """
+        return self.register(Counter(name=name, documentation=documentation, label_names=label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: List[str] = None) -> Gauge:
+        """
+        Retrieve the gauge with the given name (registering it if needed)
+        :param name:
+        :param documentation:
+        :param label_names:
+        :return:
+        """
+        return self.register(Gauge(name=name, documentation=documentation, label_names=label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: List[str] = None, buckets: Tuple = None):
+        """
+        Retrieve the histogram with the given name (registering it with the given buckets if needed)
+        :param name:
+        :param documentation:
+        :param label_names:
+        :param buckets:
+        :return:
+        """
+        histogram = Histogram(name=name, documentation=documentation, label_names=label_names, buckets=buckets)
+
+        return self.register(histogram)
+
+    def render(self) -> str:
+        """
+        Renders all the metrics in the text exposition format
+        :return:
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+    def write_textfile(self, filepath: str):
+        """
+        Writes the metrics to a textfile (atomically, so the node-exporter textfile collector never reads a partial
+        file)
+        :param filepath:
+        :return:
+        """
+        folder = os.path.dirname(filepath) or '.'
+        os.makedirs(folder, exist_ok=True)
+        temp_fd, temp_filepath = tempfile.mkstemp(dir=folder, prefix=f'.{os.path.basename(filepath)}.', suffix='.tmp')
+        with os.fdopen(temp_fd, 'w') as f:
+            f.write(self.render())
+
+        os.replace(temp_filepath, filepath)
+
+
+_metrics_registry: Optional[MetricsRegistry] = None
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """
+    Retrieve the process-wide metrics registry
+    :return:
+    """
+    global _metrics_registry
+
+    if _metrics_registry is None:
+        _metrics_registry = MetricsRegistry()
+
+    return _metrics_registry
+
+
+def get_endpoint_pattern(url: str) -> str:
+    """
+    Retrieve the endpoint pattern of a URL, replacing the numeric path segments by a placeholder and dropping the query
+    (e.g. 'http://host/marketing/pricing/123?x=1' -> '/marketing/pricing/{id}')
+    :param url:
+    :return:
+    """
+    return re.sub(r'/\d+(?=/|$)', '/{id}', urlparse(url).path) or '/'
+
+
+def is_metrics_enabled() -> bool:
+    """
+    Determines if the metrics are exported (served or written to a textfile), so the costly ones can be skipped if not
+    :return:
+    """
+    return os.getenv('METRICS_PORT', '') != '' or os.getenv('METRICS_TEXTFILE_PATH', '') != ''
+
+
+def observe_request(url: str, method: str, status_code: Optional[int], duration: float, response_bytes: int):
+    """
+    Records the metrics of a request made to the game (the status of a request failed without response is 'error')
+    :param url:
+    :param method:
+    :param status_code:
+    :param duration:
+    :param response_bytes:
+    :return:
+    """
+    registry = get_metrics_registry()
+    endpoint = get_endpoint_pattern(url)
+    registry.counter(
+        'am_requests_total', 'Requests made to the game', ['endpoint', 'method', 'status'],
+    ).inc(endpoint=endpoint, method=method, status=status_code if status_code is not None else 'error')
+    registry.histogram(
+        'am_request_duration_seconds', 'Latency of the requests made to the game', ['endpoint'],
+    ).observe(duration, endpoint=endpoint)
+    registry.counter(
+        'am_response_bytes_total', 'Bytes received from the game', ['endpoint'],
+    ).inc(response_bytes, endpoint=endpoint)
+    add_run_usage(requests=1, response_bytes=response_bytes, network_seconds=duration)
+
+
+def observe_parse(page: str, duration: float, html_bytes: int, tree_size: Optional[int]):
+    """
+    Records the metrics of an HTML page parse (the tree size is skipped if not given)
+    :param page:
+    :param duration:
+    :param html_bytes:
+    :param tree_size:
+    :return:
+    """
+    registry = get_metrics_registry()
+    registry.histogram(
+        'am_parse_duration_seconds', 'Time spent parsing the HTML pages', ['page'],
+    ).observe(duration, page=page)
+    if tree_size is not None:
+        registry.histogram(
+            'am_parse_tree_size_tags', 'Amount of tags of the parsed HTML pages', ['page'],
+            buckets=(100, 500, 1000, 2500, 5000, 10000, 25000, 50000),
+        ).observe(tree_size, page=page)
+    registry.counter(
+        'am_parsed_bytes_total', 'Bytes of HTML parsed', ['page'],
+    ).inc(html_bytes, page=page)
+    add_run_usage(parse_seconds=duration)
+
+
+def observe_file_write(mode: str, files: int, written_bytes: int, duration: float):
+    """
+    Records the metrics of a file write (or of a batch of file writes)
+    :param mode:
+    :param files:
+    :param written_bytes:
+    :param duration:
+    :return:
+    """
+    registry = get_metrics_registry()
+    registry.counter('am_file_writes_total', 'Files written', ['mode']).inc(files, mode=mode)
+    registry.counter('am_file_written_bytes_total', 'Bytes written to files', ['mode']).inc(written_bytes, mode=mode)
+    registry.counter('am_file_write_seconds_total', 'Time spent writing files', ['mode']).inc(duration, mode=mode)
+    add_run_usage(persist_seconds=duration)
+
+
+def observe_pacer_wait(duration: float):
+    """
+    Records the time slept by the request pacer
+    :param duration:
+    :return:
+    """
+    get_metrics_registry().counter(
+        'am_pacer_sleep_seconds_total', 'Time slept by the request pacer between the requests',
+    ).inc(duration)
+    add_run_usage(sleep_seconds=duration)
+
+
+def observe_task(task: str, duration: float, failed: bool):
+    """
+    Records the metrics of a task run
+    :param task:
+    :param duration:
+    :param failed:
+    :return:
+    """
+    registry = get_metrics_registry()
+    registry.histogram(
+        'am_task_duration_seconds', 'Duration of the task runs', ['task'],
+        buckets=(1, 10, 30, 60, 300, 900, 1800, 3600, 7200, 10800, 21600),
+    ).observe(duration, task=task)
+    registry.counter('am_task_runs_total', 'Task runs', ['task', 'status']).inc(
+        task=task, status='failed' if failed else 'success',
+    )
+
+
+def observe_cycle(duration: float, timestamp: float):
+    """
+    Records the metrics of a main tasks cycle, writing the metrics textfile (if configured)
+    :param duration:
+    :param timestamp:
+    :return:
+    """
+    registry = get_metrics_registry()
+    registry.gauge('am_cycle_duration_seconds', 'Duration of the last main tasks cycle').set(duration)
+    registry.gauge('am_cycle_finished_timestamp_seconds', 'Time the last main tasks cycle finished').set(timestamp)
+    write_metrics_textfile()
+
+
+def write_metrics_textfile():
+    """
+    Writes the metrics to the textfile read by the node-exporter (if configured in the environment)
+    :return:
+    """
+    textfile_path = os.getenv('METRICS_TEXTFILE_PATH', '')
+    if textfile_path == '':
+        return
+
+    get_metrics_registry().write_textfile(filepath=textfile_path)
+    log(f"Metrics written to {textfile_path}", LogLevels.LOG_LEVEL_DEBUG)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handler serving the metrics in the text exposition format on /metrics
+    """
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+
+        response = get_metrics_registry().render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        log(f"Metrics exporter: {format % args}", LogLevels.LOG_LEVEL_DEBUG)
+
+
+def start_metrics_exporter() -> Optional[ThreadingHTTPServer]:
+    """
+    Starts serving the metrics on a background thread (disabled if the port is empty)
+    :return:
+    """
+    log("Entering start_metrics_exporter method", LogLevels.LOG_LEVEL_DEBUG)
+    host = os.getenv('METRICS_HOST', '127.0.0.1')
+    port = os.getenv('METRICS_PORT', '')
+    if port == '':
+        return None
+
+    server = ThreadingHTTPServer((host, int(port)), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-exporter', daemon=True).start()
+    log(f"Metrics exporter listening on http://{host}:{server.server_address[1]}/metrics")
+
+    return server
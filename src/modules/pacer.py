@@ -0,0 +1,90 @@
+import os
+import random
+import threading
+
+from typing import Optional
+
+from modules.clock import get_clock
+from modules.file import FileLock
+from modules.logger import log, LogLevels
+from modules.metrics import observe_pacer_wait
+
+
+class RequestPacer:
+    """
+    Global pacer spacing the requests of all the threads by a random interval between the configured limits (in
+    seconds), so running tasks concurrently doesn't increase the request rate. When a state file is given, the slots
+    are shared by all the processes using it (e.g. the work queue workers).
+    """
+    def __init__(self, interval_min: float, interval_max: float, state_filepath: str = None):
+        """
+        RequestPacer class constructor
+        :param interval_min:
+        :param interval_max:
+        :param state_filepath:
+        """
+        log("Instantiating RequestPacer class", LogLevels.LOG_LEVEL_DEBUG)
+        self.interval_min = interval_min
+        self.interval_max = interval_max
+        self.state_filepath = state_filepath
+        self._next_slot_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> float:
+        """
+        Blocks until the next request slot is available (reserving it), returning the time slept
+        :return:
+        """
+        with self._lock:
+            now = get_clock().time()
+            slot_at = self.reserve_slot(now=now)
+
+        sleep_interval = slot_at - now
+        if sleep_interval > 0:
+            get_clock().sleep_until(slot_at)
+            observe_pacer_wait(sleep_interval)
+
+        return sleep_interval
+
+    def reserve_slot(self, now: float) -> float:
+        """
+        Reserves the next request slot (not earlier than the given time), returning its time
+        :param now:
+        :return:
+        """
+        if self.state_filepath is None:
+            slot_at = max(now, self._next_slot_at)
+            self._next_slot_at = slot_at + random.uniform(self.interval_min, self.interval_max)
+            return slot_at
+
+        with FileLock(self.state_filepath):
+            next_slot_at = 0.0
+            if os.path.isfile(self.state_filepath):
+                with open(self.state_filepath, 'r') as f:
+                    next_slot_at = float(f.read().strip() or 0)
+
+            slot_at = max(now, next_slot_at)
+            with open(self.state_filepath, 'w') as f:
+                f.write(str(slot_at + random.uniform(self.interval_min, self.interval_max)))
+
+        return slot_at
+
+
+_request_pacer: Optional[RequestPacer] = None
+
+
+def get_request_pacer() -> RequestPacer:
+    """
+    Retrieve the process-wide request pacer (configured from the environment)
+    :return:
+    """
+    global _request_pacer
+
+    if _request_pacer is None:
+        _request_pacer = RequestPacer(
+            interval_min=float(os.getenv('REQUEST_INTERVAL_MIN', 1)),
+            interval_max=float(os.getenv('REQUEST_INTERVAL_MAX', 5)),
+            state_filepath=os.getenv('REQUEST_PACER_STATE_FILEPATH') or None,
+        )
+
+    return _request_pacer
@@ -0,0 +1,244 @@
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from typing import Dict, Iterator, Optional
+
+from modules.clock import get_clock
+from modules.file import FileLock, FileMode, save_text_to_file, write_file
+from modules.logger import log, LogLevels
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOBS_INDEX_FILENAME = 'blobs.jsonl'
+FETCHES_INDEX_FILENAME = 'fetches.jsonl'
+SEGMENT_FILENAME_PATTERN = 'pages_{:06d}.seg'
+
+
+class PageArchiveCodecs:
+    """
+    Enum class for the compression codecs of the archived pages
+    """
+    GZIP = 'gzip'
+    ZSTD = 'zstd'
+
+
+def is_page_archive_enabled() -> bool:
+    """
+    Determines if the archive of the fetched pages is enabled in the environment
+    :return:
+    """
+    return os.getenv('PAGE_ARCHIVE', 'false').lower() in ['1', 'true', 'yes']
+
+
+def compress_page(body: bytes, codec: str) -> bytes:
+    """
+    Compresses a page body with the given codec
+    :param body:
+    :param codec:
+    :return:
+    """
+    if codec == PageArchiveCodecs.ZSTD:
+        return zstandard.ZstdCompressor().compress(body)
+
+    return gzip.compress(body, mtime=0)
+
+
+def decompress_page(data: bytes, codec: str) -> bytes:
+    """
+    Decompresses a page body compressed with the given codec
+    :param data:
+    :param codec:
+    :return:
+    """
+    if codec == PageArchiveCodecs.ZSTD:
+        if zstandard is None:
+            raise ValueError("The zstandard package is required to read the pages archived with zstd!")
+
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    return gzip.decompress(data)
+
+
+class PageArchive:
+    """
+    Class used to archive the bodies of the fetched pages (with their URL, fetch time and status) for offline
+    re-parsing. The bodies are deduplicated by content hash, compressed and appended to segment files, keeping an
+    index with the location of each body and a log of the fetches. The archive may be shared with other processes
+    (e.g. the work queue workers), so the appends are made holding a file lock.
+    """
+    def __init__(self, folder: str, codec: str, segment_max_bytes: int):
+        """
+        PageArchive class constructor
+        :param folder:
+        :param codec:
+        :param segment_max_bytes:
+        """
+        log("Instantiating PageArchive class", LogLevels.LOG_LEVEL_DEBUG)
+        self.folder = folder
+        self.codec = codec
+        self.segment_max_bytes = segment_max_bytes
+        self._blobs: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def blobs_index_filepath(self) -> str:
+        return os.path.join(self.folder, BLOBS_INDEX_FILENAME)
+
+    @property
+    def fetches_index_filepath(self) -> str:
+        return os.path.join(self.folder, FETCHES_INDEX_FILENAME)
+
+    def get_blobs(self) -> Dict[str, Dict]:
+        """
+        Retrieve the location of each archived body, keyed by its content hash (loaded from the index on the first
+        call)
+        :return:
+        """
+        if self._blobs is None:
+            self._blobs = {blob['key']: blob for blob in self.iterate_records(self.blobs_index_filepath)}
+
+        return self._blobs
+
+    def iterate_records(self, filepath: str) -> Iterator[Dict]:
+        """
+        Yields the records of an index file (skipping a truncated last record)
+        :param filepath:
+        :return:
+        """
+        if not os.path.isfile(filepath):
+            return
+
+        with open(filepath, 'r') as f:
+            for record_line in f:
+                try:
+                    yield json.loads(record_line)
+                except json.JSONDecodeError:
+                    log(f"Ignoring truncated record on {filepath}", LogLevels.LOG_LEVEL_WARNING)
+
+    def iterate_fetches(self) -> Iterator[Dict]:
+        """
+        Yields the archived fetches (URL, fetch timestamp, status and body key), oldest first
+        :return:
+        """
+        return self.iterate_records(self.fetches_index_filepath)
+
+    def get_segment_filepath(self) -> str:
+        """
+        Retrieve the path of the segment currently receiving the bodies, rolling over to a new one when it's full
+        (must be called holding the file lock)
+        :return:
+        """
+        segments = sorted(glob.glob(os.path.join(self.folder, 'pages_*.seg')))
+        segment_number = len(segments) if len(segments) > 0 else 1
+        filepath = os.path.join(self.folder, SEGMENT_FILENAME_PATTERN.format(segment_number))
+        if os.path.isfile(filepath) and os.path.getsize(filepath) >= self.segment_max_bytes:
+            filepath = os.path.join(self.folder, SEGMENT_FILENAME_PATTERN.format(segment_number + 1))
+            log(f"Page archive rolled over to segment {filepath}", LogLevels.LOG_LEVEL_NOTICE)
+
+        return filepath
+
+    def save(self, url: str, status: int, body: bytes) -> str:
+        """
+        Archives a fetched page (only storing its body if the same content wasn't archived yet), returning the key
+        of its body
+        :param url:
+        :param status:
+        :param body:
+        :return:
+        """
+        log("Entering PageArchive.save method", LogLevels.LOG_LEVEL_DEBUG)
+        key = hashlib.sha256(body).hexdigest()[:20]
+        fetch = {'url': url, 'status': status, 'fetched_at': get_clock().time(), 'key': key}
+
+        with self._lock, FileLock(self.fetches_index_filepath):
+            blobs = self.get_blobs()
+            if key not in blobs:
+                compressed_body = compress_page(body, codec=self.codec)
+                segment_filepath = self.get_segment_filepath()
+                offset = os.path.getsize(segment_filepath) if os.path.isfile(segment_filepath) else 0
+                write_file(filepath=segment_filepath, data=compressed_body, file_mode=FileMode.FILE_MODE_APPEND)
+                blobs[key] = {
+                    'key': key,
+                    'segment': os.path.basename(segment_filepath),
+                    'offset': offset,
+                    'length': len(compressed_body),
+                    'size': len(body),
+                    'codec': self.codec,
+                }
+                save_text_to_file(
+                    input_text=json.dumps(blobs[key]) + '\n',
+                    output_filepath=self.blobs_index_filepath,
+                    file_mode=FileMode.FILE_MODE_APPEND,
+                )
+
+            save_text_to_file(
+                input_text=json.dumps(fetch, ensure_ascii=False) + '\n',
+                output_filepath=self.fetches_index_filepath,
+                file_mode=FileMode.FILE_MODE_APPEND,
+            )
+
+        return key
+
+    def extract(self, key: str) -> bytes:
+        """
+        Retrieve the original body archived with the given key
+        :param key:
+        :return:
+        """
+        blob = self.get_blobs().get(key)
+        if blob is None:
+            raise KeyError(f"No archived page body with key '{key}'!")
+
+        with open(os.path.join(self.folder, blob['segment']), 'rb') as f:
+            f.seek(blob['offset'])
+            compressed_body = f.read(blob['length'])
+
+        return decompress_page(compressed_body, codec=blob['codec'])
+
+
+_page_archive: Optional[PageArchive] = None
+
+
+def get_page_archive() -> PageArchive:
+    """
+    Retrieve the process-wide page archive (configured from the environment, falling back to gzip if zstd is set but
+    the zstandard package is not installed)
+    :return:
+    """
+    global _page_archive
+
+    if _page_archive is None:
+        codec = os.getenv('PAGE_ARCHIVE_COMPRESSION', PageArchiveCodecs.GZIP)
+        if codec == PageArchiveCodecs.ZSTD and zstandard is None:
+            log("The zstandard package is not installed, archiving the pages with gzip", LogLevels.LOG_LEVEL_WARNING)
+            codec = PageArchiveCodecs.GZIP
+
+        _page_archive = PageArchive(
+            folder=os.getenv('PAGE_ARCHIVE_FOLDER', '/data/page_archive'),
+            codec=codec,
+            segment_max_bytes=int(os.getenv('PAGE_ARCHIVE_SEGMENT_MAX_BYTES', 64 * 1024 * 1024)),
+        )
+
+    return _page_archive
+
+
+def archive_page(url: str, status: int, body: bytes):
+    """
+    Archives a fetched page on the page archive (a failure to archive it is logged, not raised, so the request that
+    fetched it is not affected)
+    :param url:
+    :param status:
+    :param body:
+    :return:
+    """
+    try:
+        get_page_archive().save(url=url, status=status, body=body)
+    except OSError as error:
+        log(f"Failed to archive the page fetched from {url}: {error}", LogLevels.LOG_LEVEL_WARNING)
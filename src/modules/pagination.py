@@ -1,16 +1,113 @@
-from bs4 import BeautifulSoup
-
-from modules.logger import log, LogLevels
-
-
-def check_has_next_page(html_bs: BeautifulSoup):
-    """
-    Determines if there's a next page available in a BS4 HTML results page.
-    :param html_bs:
-    :return:
-    """
-    log("Entering check_has_next_page method", LogLevels.LOG_LEVEL_DEBUG)
-
-    next_div = html_bs.find('div', attrs={'class': 'pagination'}).find_all('span', attrs={'class': 'next'})
-
-    return len(next_div) > 0
+import collections
+import os
+import re
+
+from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional, Tuple
+
+from modules.logger import log, LogLevels
+from modules.run_report import get_current_task_name, use_task_context
+
+
+def check_has_next_page(html_bs: BeautifulSoup):
+    """
+    Determines if there's a next page available in a BS4 HTML results page (there's no pagination block on the
+    single-page results).
+    :param html_bs:
+    :return:
+    """
+    log("Entering check_has_next_page method", LogLevels.LOG_LEVEL_DEBUG)
+    pagination_div = html_bs.find('div', attrs={'class': 'pagination'})
+    if pagination_div is None:
+        return False
+
+    next_div = pagination_div.find_all('span', attrs={'class': 'next'})
+
+    return len(next_div) > 0
+
+
+def get_pages_count(html_bs: BeautifulSoup) -> Optional[int]:
+    """
+    Determines the total amount of pages of a BS4 HTML results page, from the highest page number in its pagination
+    block (the current page and the page links), retrieving None if there's no pagination block or page number.
+    :param html_bs:
+    :return:
+    """
+    log("Entering get_pages_count method", LogLevels.LOG_LEVEL_DEBUG)
+    pagination_div = html_bs.find('div', attrs={'class': 'pagination'})
+    if pagination_div is None:
+        return None
+
+    page_numbers = []
+    for page_link in pagination_div.find_all('a', href=True):
+        page_match = re.search(r'[?&]page=(\d+)', page_link['href'])
+        if page_match is not None:
+            page_numbers.append(int(page_match.group(1)))
+
+    current_span = pagination_div.find('span', attrs={'class': 'current'})
+    if current_span is not None and current_span.text.strip().isdigit():
+        page_numbers.append(int(current_span.text.strip()))
+
+    return max(page_numbers) if len(page_numbers) > 0 else None
+
+
+def iterate_pages(fetch_page: Callable, first_page: Tuple = None, max_workers: int = None) -> Iterator[Tuple]:
+    """
+    Yields the result of each page of a paginated listing in order: a tuple with the page rows, if there's a next page
+    and the pages count, as retrieved by the given callable (receiving the page number). The pages count of the first
+    page (fetched unless its result is given) tells the remaining pages, which are fetched concurrently by up to the
+    given amount of workers (the requests are still spaced by the request pacer). The pages after the ones counted
+    are fetched one at a time while they have a next page (e.g. if the count is unknown or grew meanwhile).
+    :param fetch_page:
+    :param first_page:
+    :param max_workers:
+    :return:
+    """
+    log("Entering iterate_pages method", LogLevels.LOG_LEVEL_DEBUG)
+    if max_workers is None:
+        max_workers = int(os.getenv('PAGINATION_MAX_WORKERS', 4))
+
+    page_result = first_page if first_page is not None else fetch_page(1)
+    yield page_result
+    page = 1
+
+    _, has_next, pages_count = page_result
+    if has_next and pages_count is not None and pages_count > 1 and max_workers > 1:
+        # The usage recorded on the worker threads is attributed to the task iterating the pages
+        task_name = get_current_task_name()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='paginator') as executor:
+            pending_pages = collections.deque()
+            try:
+                while page < pages_count:
+                    while page + len(pending_pages) < pages_count and len(pending_pages) < max_workers:
+                        pending_pages.append(executor.submit(
+                            fetch_task_page, fetch_page, page + len(pending_pages) + 1, task_name,
+                        ))
+
+                    page_result = pending_pages.popleft().result()
+                    page += 1
+                    yield page_result
+            finally:
+                for pending_page in pending_pages:
+                    pending_page.cancel()
+
+        _, has_next, _ = page_result
+
+    while has_next:
+        page += 1
+        page_result = fetch_page(page)
+        yield page_result
+        _, has_next, _ = page_result
+
+
+def fetch_task_page(fetch_page: Callable, page: int, task_name: str) -> Tuple:
+    """
+    Fetches a page with the given callable, attributing the usage it records to the given task
+    :param fetch_page:
+    :param page:
+    :param task_name:
+    :return:
+    """
+    with use_task_context(task_name):
+        return fetch_page(page)
@@ -0,0 +1,232 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from modules.clock import get_clock
+from modules.file import save_text_to_file
+from modules.logger import log, LogLevels
+from modules.run_report import DEFAULT_TASK_NAME, get_thread_task_name
+
+# Innermost frames (module file name and function) of a thread that is sleeping or blocked waiting (not working)
+IDLE_FRAMES = [
+    ('clock.py', 'sleep'),
+    ('clock.py', 'wait'),
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+]
+
+
+def is_sampling_profile_enabled() -> bool:
+    """
+    Determines if the sampling profiler is enabled in the environment (for each main tasks cycle)
+    :return:
+    """
+    return os.getenv('SAMPLING_PROFILE', 'false').lower() in ['1', 'true', 'yes']
+
+
+def get_frame_label(frame) -> Tuple:
+    """
+    Retrieve the label of a stack frame: its module file name, function and first line
+    :param frame:
+    :return:
+    """
+    code = frame.f_code
+
+    return os.path.basename(code.co_filename), code.co_name, code.co_firstlineno
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling (from a background thread) the stacks of the main thread and of the threads running
+    a task, so the overhead depends only on the sampling rate. The samples taken while a thread is sleeping or waiting
+    are counted apart (not profiled), and the others are aggregated per task.
+    """
+    def __init__(self, interval: float):
+        """
+        SamplingProfiler class constructor
+        :param interval: seconds between the samples
+        """
+        log("Instantiating SamplingProfiler class", LogLevels.LOG_LEVEL_DEBUG)
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.idle_samples = collections.Counter()
+        self.sampling_seconds = 0.0
+        self.started_at = None
+        self.duration = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Starts sampling on a background thread
+        :return:
+        """
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self.run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops sampling (waiting for the background thread)
+        :return:
+        """
+        self._stop_event.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def run(self):
+        while not self._stop_event.wait(timeout=self.interval):
+            started_at = time.perf_counter()
+            self.take_sample()
+            self.sampling_seconds += time.perf_counter() - started_at
+
+    def take_sample(self):
+        """
+        Records the current stacks of the main thread and of the threads running a task
+        :return:
+        """
+        main_thread_id = threading.main_thread().ident
+        for thread_id, frame in sys._current_frames().items():
+            task_name = get_thread_task_name(thread_id)
+            if task_name is None:
+                if thread_id != main_thread_id:
+                    continue
+
+                task_name = DEFAULT_TASK_NAME
+
+            if get_frame_label(frame)[:2] in IDLE_FRAMES:
+                self.idle_samples[task_name] += 1
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(get_frame_label(frame))
+                frame = frame.f_back
+
+            self.samples[(task_name, tuple(reversed(stack)))] += 1
+
+    def get_folded_stacks(self) -> List[str]:
+        """
+        Retrieve the samples as folded stacks ('<task>;<outermost frame>;...;<innermost frame> <count>'), the input of
+        the flame graph tools
+        :return:
+        """
+        return [
+            ';'.join([task_name] + [f'{function} ({filename}:{line})' for filename, function, line in stack])
+            + f' {count}'
+            for (task_name, stack), count in sorted(self.samples.items())
+        ]
+
+    def get_hot_functions(self, limit: int) -> List[Dict]:
+        """
+        Retrieve the functions with the most samples: the ones in which they were taken (self) and the ones in their
+        stacks (total)
+        :param limit:
+        :return:
+        """
+        functions = {}
+        for (task_name, stack), count in self.samples.items():
+            for depth, label in enumerate(stack):
+                function = functions.setdefault(label, {'self': 0, 'total': 0, 'tasks': collections.Counter()})
+                # The recursive calls are counted once per sample
+                if label not in stack[:depth]:
+                    function['total'] += count
+                    function['tasks'][task_name] += count
+
+            functions[stack[-1]]['self'] += count
+
+        hot_functions = [
+            {
+                'function': f'{function} ({filename}:{line})',
+                'self': usage['self'],
+                'total': usage['total'],
+                'tasks': dict(usage['tasks']),
+            }
+            for (filename, function, line), usage in functions.items()
+        ]
+
+        return sorted(hot_functions, key=lambda function: (function['self'], function['total']), reverse=True)[:limit]
+
+    def get_report(self, limit: int) -> List[str]:
+        """
+        Retrieve the report of the profile: the samples of each task and the top hot functions
+        :param limit:
+        :return:
+        """
+        tasks_samples = collections.Counter()
+        for (task_name, _), count in self.samples.items():
+            tasks_samples[task_name] += count
+
+        total_samples = max(1, sum(tasks_samples.values()))
+        lines = [
+            f"Sampling profile of {self.duration:.1f} seconds every {self.interval * 1000:.0f} ms "
+            f"(sampling overhead: {self.sampling_seconds / max(self.duration, 1e-6):.2%})",
+            f"{'Task':<24} {'Samples':>8} {'Share':>7} {'Idle':>8}",
+        ]
+        for task_name in sorted(set(tasks_samples) | set(self.idle_samples)):
+            lines.append(
+                f"{task_name:<24} {tasks_samples[task_name]:>8} {tasks_samples[task_name] / total_samples:>7.1%} "
+                f"{self.idle_samples[task_name]:>8}"
+            )
+
+        lines.append(f"Top {limit} hot functions:")
+        lines.append(f"{'Self':>7} {'Total':>7}  Function")
+        for function in self.get_hot_functions(limit=limit):
+            lines.append(
+                f"{function['self'] / total_samples:>7.1%} {function['total'] / total_samples:>7.1%}  "
+                f"{function['function']}"
+            )
+
+        return lines
+
+    def save(self, output_folder: str, limit: int) -> str:
+        """
+        Saves the folded stacks and the report to the given folder, retrieving the path of the folded stacks file
+        :param output_folder:
+        :param limit:
+        :return:
+        """
+        log("Entering SamplingProfiler.save method", LogLevels.LOG_LEVEL_DEBUG)
+        filename = f"profile_{get_clock().now().strftime('%Y%m%d_%H%M%S')}"
+
+        folded_filepath = os.path.join(output_folder, f'{filename}.folded')
+        save_text_to_file(input_text='\n'.join(self.get_folded_stacks()) + '\n', output_filepath=folded_filepath)
+        save_text_to_file(
+            input_text='\n'.join(self.get_report(limit=limit)) + '\n',
+            output_filepath=os.path.join(output_folder, f'{filename}.txt'),
+        )
+
+        return folded_filepath
+
+
+@contextmanager
+def profile_cycle():
+    """
+    Context manager sampling the stacks while its block runs (when the sampling profiler is enabled), logging the
+    report and saving it (with the folded stacks) at the end
+    :return:
+    """
+    if not is_sampling_profile_enabled():
+        yield
+        return
+
+    limit = int(os.getenv('SAMPLING_PROFILE_TOP', 25))
+    profiler = SamplingProfiler(interval=1 / float(os.getenv('SAMPLING_PROFILE_RATE', 100)))
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        for line in profiler.get_report(limit=limit):
+            log(line)
+
+        folded_filepath = profiler.save(
+            output_folder=os.getenv('SAMPLING_PROFILE_FOLDER', '/data/profiles'),
+            limit=limit,
+        )
+        log(f"Sampling profile saved to {folded_filepath}", LogLevels.LOG_LEVEL_NOTICE)
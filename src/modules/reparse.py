@@ -0,0 +1,164 @@
+import datetime
+import json
+import multiprocessing
+import os
+import re
+
+from typing import Dict, List, Optional, Tuple
+
+from models.line import Line
+from modules.airplanes import parse_airplanes_page
+from modules.file import save_dict_to_json, save_text_to_file
+from modules.lines_data import parse_basic_data, parse_marketing_data
+from modules.lines_summary import parse_lines_summary_page
+from modules.logger import log, LogLevels
+from modules.page_archive import get_page_archive
+
+
+class ArchivedPageKinds:
+    """
+    Enum class for the kinds of archived pages handled by the extractors
+    """
+    LINES_SUMMARY = 'lines_summary'
+    AIRPLANES = 'airplanes'
+    LINE_DETAILS = 'line_details'
+    LINE_PRICING = 'line_pricing'
+
+
+# URL patterns of each kind of archived page, capturing its key (the page number or the line ID)
+ARCHIVED_PAGE_PATTERNS = {
+    ArchivedPageKinds.LINES_SUMMARY: re.compile(r'/network/\?page=(\d+)$'),
+    ArchivedPageKinds.AIRPLANES: re.compile(r'/aircraft\?page=(\d+)$'),
+    ArchivedPageKinds.LINE_DETAILS: re.compile(r'/network/showline/(\d+)/?$'),
+    ArchivedPageKinds.LINE_PRICING: re.compile(r'/marketing/pricing/(\d+)/?$'),
+}
+
+
+def match_archived_page(url: str) -> Optional[Tuple[str, int]]:
+    """
+    Retrieve the kind and the key of an archived page from its URL (None if no extractor handles it)
+    :param url:
+    :return:
+    """
+    for kind, pattern in ARCHIVED_PAGE_PATTERNS.items():
+        url_match = pattern.search(url)
+        if url_match is not None:
+            return kind, int(url_match.group(1))
+
+    return None
+
+
+def extract_page(kind: str, key: int, html_text: str) -> Dict:
+    """
+    Runs the current extractor of the given kind of page over its body, retrieving the extracted data
+    :param kind:
+    :param key:
+    :param html_text:
+    :return:
+    """
+    if kind == ArchivedPageKinds.LINES_SUMMARY:
+        rows, has_next_page, pages_count = parse_lines_summary_page(html_text=html_text, page=key)
+        return {'rows': rows, 'has_next_page': has_next_page, 'pages_count': pages_count}
+
+    if kind == ArchivedPageKinds.AIRPLANES:
+        rows, has_next_page, pages_count = parse_airplanes_page(html_text=html_text, page=key)
+        return {'rows': rows, 'has_next_page': has_next_page, 'pages_count': pages_count}
+
+    line = Line()
+    line.id = key
+    if kind == ArchivedPageKinds.LINE_DETAILS:
+        parse_basic_data(line=line, html_text=html_text)
+        return {
+            'name': line.name,
+            'display_name': line.display_name,
+            'origin': line.origin.serialize(),
+            'destination': line.destination.serialize(),
+            'distance_km': line.distance_km,
+            'taxes': line.taxes,
+        }
+
+    parse_marketing_data(line=line, html_text=html_text)
+    return {
+        'total_demand': line.total_demand.serialize(),
+        'ideal_cost': line.ideal_cost.serialize(),
+        'turnover': line.turnover.serialize(),
+        'current_cost': line.current_cost.serialize(),
+        'internal_audit_cost': line.internal_audit_cost,
+        'last_audit_date': line.last_audit_date.isoformat(),
+        'reliability_level': line.reliability_level,
+        'can_update_prices': line.can_update_prices,
+    }
+
+
+def reparse_archived_page(page: Tuple[str, str, int]) -> Tuple[Tuple, Dict]:
+    """
+    Entrypoint of the reparse worker processes: extracts the data of an archived page body (given by its body key,
+    kind and key), retrieving it along with the page (an extraction error, or a body missing from the archive, is
+    retrieved instead of the data)
+    :param page:
+    :return:
+    """
+    body_key, kind, key = page
+    try:
+        html_text = get_page_archive().extract(body_key).decode('utf-8')
+        return page, extract_page(kind=kind, key=key, html_text=html_text)
+    except Exception as error:
+        return page, {'error': f'{type(error).__name__}: {error}'}
+
+
+def execute_reparse_command(arguments: List):
+    """
+    Runs the current extractors over the archived pages (in parallel, on the given amount of worker processes or on
+    all the cores), without any request. The history of each kind of page (one record per fetch, oldest first) and its
+    latest extracted state (by page number or line ID) are written to the reparse output folder.
+    :param arguments:
+    :return:
+    """
+    log("Entering execute_reparse_command method", LogLevels.LOG_LEVEL_DEBUG)
+    workers = int(arguments[0]) if len(arguments) > 0 else os.cpu_count()
+    archive = get_page_archive()
+
+    fetches = []
+    for fetch in archive.iterate_fetches():
+        archived_page = match_archived_page(fetch['url'])
+        if archived_page is not None and fetch['status'] == 200:
+            fetches.append((fetch, (fetch['key'],) + archived_page))
+
+    # The same body fetched more than once (for the same page) is only extracted once
+    pages = sorted({page for _, page in fetches})
+
+    # The extraction errors are already reported on the reparse output, so the workers don't store error dumps
+    os.environ['ERROR_DUMPS_ENABLED'] = 'false'
+    log(f"Reparsing {len(pages)} archived page(s) from {len(fetches)} fetch(es) on {workers} worker(s)...")
+    with multiprocessing.Pool(processes=workers) as pool:
+        results = dict(pool.imap_unordered(reparse_archived_page, pages, chunksize=8))
+
+    output_folder = os.getenv('REPARSE_OUTPUT_FOLDER', '/data/reparse')
+    for kind in ARCHIVED_PAGE_PATTERNS.keys():
+        history = []
+        latest = {}
+        for fetch, page in sorted(fetches, key=lambda kind_fetch: kind_fetch[0]['fetched_at']):
+            if page[1] != kind:
+                continue
+
+            data = results[page]
+            history.append({
+                'fetched_at': datetime.datetime.fromtimestamp(fetch['fetched_at']).isoformat(timespec='seconds'),
+                'url': fetch['url'],
+                'key': page[2],
+                'data': data,
+            })
+            if 'error' not in data:
+                latest[str(page[2])] = data
+
+        errors_count = sum(1 for record in history if 'error' in record['data'])
+        save_text_to_file(
+            input_text=''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in history),
+            output_filepath=os.path.join(output_folder, f'{kind}_history.jsonl'),
+        )
+        save_dict_to_json(input_dict=latest, output_filepath=os.path.join(output_folder, f'{kind}_latest.json'))
+        log(
+            f"Reparsed {len(history)} {kind} fetch(es) ({errors_count} failed, {len(latest)} latest page(s)) to "
+            f"{output_folder}",
+            LogLevels.LOG_LEVEL_WARNING if errors_count > 0 else LogLevels.LOG_LEVEL_INFO,
+        )
@@ -0,0 +1,222 @@
+import json
+import os
+import random
+import threading
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+from modules.clock import get_clock
+from modules.file import file_exists, FileLock, read_text_file, save_dict_to_json
+from modules.logger import log, LogLevels
+
+
+class RetryItemKinds:
+    """
+    Enum class for the kinds of the units of work that can be retried
+    """
+    LINE = 'line'
+    WORKSHOP_ITEM = 'workshop_item'
+    TASK = 'task'
+
+
+class RetryItemStates:
+    """
+    Enum class for the possible states of a retry queue item
+    """
+    PENDING = 'pending'
+    DEAD = 'dead'
+
+
+class RetryQueue:
+    """
+    Persistent queue of the failed units of work (a page, a line, a workshop item...), retried individually with an
+    exponential backoff (plus jitter) until they succeed or reach the max attempts (dead-letter state). The queue file
+    is shared with the work queue worker processes, so it's reloaded and updated holding a file lock.
+    """
+    def __init__(self, filepath: str, base_delay: float, max_delay: float, max_attempts: int):
+        """
+        RetryQueue class constructor
+        :param filepath:
+        :param base_delay:
+        :param max_delay:
+        :param max_attempts:
+        """
+        log("Instantiating RetryQueue class", LogLevels.LOG_LEVEL_DEBUG)
+        self.filepath = filepath
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self._items: Optional[Dict] = None
+        self._loaded_file_state: Optional[Tuple] = None
+        self._lock = threading.RLock()
+
+    def get_items(self) -> Dict:
+        """
+        Retrieve the queue items keyed by '<kind>:<key>' (loaded from the file on the first call)
+        :return:
+        """
+        if self._items is None:
+            self._items = json.loads(read_text_file(self.filepath)) if file_exists(self.filepath) else {}
+
+        return self._items
+
+    def reload_items(self) -> Dict:
+        """
+        Retrieve the queue items reloaded from the file if it was changed since it was loaded, e.g. by the other
+        processes (must be called holding the locks)
+        :return:
+        """
+        file_state = get_file_state(self.filepath)
+        if file_state != self._loaded_file_state:
+            self._items = None
+            self._loaded_file_state = file_state
+
+        return self.get_items()
+
+    def persist_to_file(self):
+        """
+        Persist the queue to the file stored locally
+        :return:
+        """
+        save_dict_to_json(input_dict=self.get_items(), output_filepath=self.filepath)
+        self._loaded_file_state = get_file_state(self.filepath)
+
+    def enqueue(self, kind: str, key, error: Exception):
+        """
+        Registers a failed attempt of a unit of work, scheduling its next attempt (or moving it to the dead-letter
+        state if it reached the max attempts)
+        :param kind:
+        :param key:
+        :param error:
+        :return:
+        """
+        log("Entering RetryQueue.enqueue method", LogLevels.LOG_LEVEL_DEBUG)
+        with self._lock, FileLock(self.filepath):
+            item = self.reload_items().setdefault(f'{kind}:{key}', {
+                'kind': kind,
+                'key': str(key),
+                'attempts': 0,
+                'state': RetryItemStates.PENDING,
+                'first_failed_at': get_clock().time(),
+            })
+            item['attempts'] += 1
+            item['last_error'] = repr(error)
+
+            if item['attempts'] >= self.max_attempts:
+                item['state'] = RetryItemStates.DEAD
+                item['next_attempt_at'] = None
+                log(
+                    f"Giving up on {kind} '{key}' after {item['attempts']} attempts: {repr(error)}",
+                    LogLevels.LOG_LEVEL_ERROR,
+                )
+            else:
+                delay = min(self.max_delay, self.base_delay * 2 ** (item['attempts'] - 1)) * random.uniform(0.5, 1.5)
+                item['next_attempt_at'] = get_clock().time() + delay
+                log(f"Queued {kind} '{key}' to be retried in {round(delay)} seconds (attempt {item['attempts']})")
+
+            self.persist_to_file()
+
+    def resolve(self, kind: str, key):
+        """
+        Removes a unit of work from the queue (after it succeeded)
+        :param kind:
+        :param key:
+        :return:
+        """
+        with self._lock, FileLock(self.filepath):
+            if self.reload_items().pop(f'{kind}:{key}', None) is not None:
+                log(f"The retried {kind} '{key}' succeeded", LogLevels.LOG_LEVEL_NOTICE)
+                self.persist_to_file()
+
+    def get_due_items(self) -> List[Dict]:
+        """
+        Retrieve the pending items whose next attempt is due
+        :return:
+        """
+        now = get_clock().time()
+        with self._lock, FileLock(self.filepath):
+            return [
+                dict(item) for item in self.reload_items().values()
+                if item['state'] == RetryItemStates.PENDING and item['next_attempt_at'] <= now
+            ]
+
+    def get_seconds_until_next_attempt(self) -> Optional[float]:
+        """
+        Retrieve the seconds until the next pending attempt is due (None if there's no pending item)
+        :return:
+        """
+        with self._lock, FileLock(self.filepath):
+            pending_attempts = [
+                item['next_attempt_at'] for item in self.reload_items().values()
+                if item['state'] == RetryItemStates.PENDING
+            ]
+        if len(pending_attempts) == 0:
+            return None
+
+        return max(0.0, min(pending_attempts) - get_clock().time())
+
+    def drain(self, handlers: Dict[str, Callable], **kwargs) -> int:
+        """
+        Retries all the due items with the handler of their kind (receiving the item key and the given kwargs),
+        returning the amount of items that succeeded (the failed ones are queued again)
+        :param handlers:
+        :param kwargs:
+        :return:
+        """
+        log("Entering RetryQueue.drain method", LogLevels.LOG_LEVEL_DEBUG)
+        succeeded = 0
+        for item in self.get_due_items():
+            handler = handlers.get(item['kind'])
+            if handler is None:
+                log(f"No retry handler for items of kind '{item['kind']}'!", LogLevels.LOG_LEVEL_WARNING)
+                continue
+
+            log(f"Retrying {item['kind']} '{item['key']}' (attempt {item['attempts'] + 1})")
+            try:
+                handler(item['key'], **kwargs)
+            except Exception as error:
+                # Any error counts as a failed attempt (growing the backoff), so it doesn't stop the drain
+                log(f"Retrying {item['kind']} '{item['key']}' failed: {repr(error)}", LogLevels.LOG_LEVEL_ERROR)
+                self.enqueue(item['kind'], item['key'], error)
+                continue
+
+            self.resolve(item['kind'], item['key'])
+            succeeded += 1
+
+        return succeeded
+
+
+def get_file_state(filepath: str) -> Optional[Tuple]:
+    """
+    Retrieve the inode, modification time and size of a file, to detect its changes (as it's replaced atomically on
+    each write), or None if it doesn't exist
+    :param filepath:
+    :return:
+    """
+    if not os.path.isfile(filepath):
+        return None
+
+    file_stat = os.stat(filepath)
+
+    return file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size
+
+
+_retry_queue: Optional[RetryQueue] = None
+
+
+def get_retry_queue() -> RetryQueue:
+    """
+    Retrieve the process-wide retry queue (configured from the environment)
+    :return:
+    """
+    global _retry_queue
+
+    if _retry_queue is None:
+        _retry_queue = RetryQueue(
+            filepath=os.getenv('RETRY_QUEUE_FILEPATH', '/data/retry_queue.json'),
+            base_delay=float(os.getenv('RETRY_BASE_DELAY', 60)),
+            max_delay=float(os.getenv('RETRY_MAX_DELAY', 60*60*6)),
+            max_attempts=int(os.getenv('RETRY_MAX_ATTEMPTS', 8)),
+        )
+
+    return _retry_queue
@@ -0,0 +1,314 @@
+import datetime
+import json
+import os
+import statistics
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from modules.clock import get_clock
+from modules.logger import log, LogLevels
+
+# Usage counters recorded for each task of a run
+USAGE_FIELDS = [
+    'requests',
+    'response_bytes',
+    'sleep_seconds',
+    'network_seconds',
+    'parse_seconds',
+    'persist_seconds',
+    'cache_hits',
+]
+
+# Time components compared against the baseline by the trend report
+TIME_FIELDS = ['duration', 'sleep_seconds', 'network_seconds', 'parse_seconds', 'persist_seconds']
+
+DEFAULT_TASK_NAME = 'main'
+
+_task_context = threading.local()
+
+# Task running in each thread, readable from the other threads (e.g. by the sampling profiler)
+_thread_task_names: Dict[int, str] = {}
+
+
+class RunReport:
+    """
+    Report of a run (a main tasks cycle or a lines update), breaking down where the time of each task went: sleeping on
+    the request pacer, waiting on the network, parsing the pages and persisting the files
+    """
+    def __init__(self, run_name: str):
+        """
+        RunReport class constructor
+        :param run_name:
+        """
+        log("Instantiating RunReport class", LogLevels.LOG_LEVEL_DEBUG)
+        self.run_name = run_name
+        self.started_at = get_clock().time()
+        self.duration = None
+        self.status = None
+        self._tasks: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def get_task_usage(self, task_name: str) -> Dict:
+        """
+        Retrieve the usage counters of a task (created on the first call, must be called holding the lock)
+        :param task_name:
+        :return:
+        """
+        if task_name not in self._tasks:
+            self._tasks[task_name] = {field: 0 for field in USAGE_FIELDS + ['wall_seconds']}
+
+        return self._tasks[task_name]
+
+    def add_usage(self, task_name: str, **usage):
+        """
+        Adds the given usage amounts to the counters of a task
+        :param task_name:
+        :param usage:
+        :return:
+        """
+        with self._lock:
+            task_usage = self.get_task_usage(task_name)
+            for field, amount in usage.items():
+                task_usage[field] += amount
+
+    def serialize(self) -> Dict:
+        """
+        Writes the report as a dict (with the totals of all the tasks)
+        :return:
+        """
+        with self._lock:
+            tasks = {name: dict(usage) for name, usage in self._tasks.items()}
+
+        totals = {field: sum(usage[field] for usage in tasks.values()) for field in USAGE_FIELDS}
+
+        return {
+            'run': self.run_name,
+            'started_at': self.started_at,
+            'duration': self.duration,
+            'status': self.status,
+            'totals': totals,
+            'tasks': tasks,
+        }
+
+
+_active_report: Optional[RunReport] = None
+
+
+def get_current_task_name() -> str:
+    """
+    Retrieve the name of the task running in this thread
+    :return:
+    """
+    return getattr(_task_context, 'task_name', DEFAULT_TASK_NAME)
+
+
+def get_thread_task_name(thread_id: int) -> Optional[str]:
+    """
+    Retrieve the name of the task running in the given thread (None if it's not running one)
+    :param thread_id:
+    :return:
+    """
+    return _thread_task_names.get(thread_id)
+
+
+@contextmanager
+def track_task(task_name: str):
+    """
+    Context manager attributing the usage recorded in this thread to the given task (and its wall time)
+    :param task_name:
+    :return:
+    """
+    started_at = time.perf_counter()
+    with use_task_context(task_name):
+        try:
+            yield
+        finally:
+            add_run_usage(wall_seconds=time.perf_counter() - started_at)
+
+
+@contextmanager
+def use_task_context(task_name: str):
+    """
+    Context manager attributing the usage recorded in this thread to the given task, without accounting its wall time
+    (e.g. on the threads helping a task with its requests)
+    :param task_name:
+    :return:
+    """
+    parent_task_name = getattr(_task_context, 'task_name', None)
+    _task_context.task_name = task_name
+    _thread_task_names[threading.get_ident()] = task_name
+    try:
+        yield
+    finally:
+        _task_context.task_name = parent_task_name if parent_task_name is not None else DEFAULT_TASK_NAME
+        if parent_task_name not in [None, DEFAULT_TASK_NAME]:
+            _thread_task_names[threading.get_ident()] = parent_task_name
+        else:
+            _thread_task_names.pop(threading.get_ident(), None)
+
+
+def add_run_usage(**usage):
+    """
+    Adds the given usage amounts to the current task of the active run report (if any)
+    :param usage:
+    :return:
+    """
+    report = _active_report
+    if report is not None:
+        report.add_usage(get_current_task_name(), **usage)
+
+
+@contextmanager
+def open_run_report(run_name: str):
+    """
+    Context manager recording a run report while its block runs, appending it to the history file at the end
+    :param run_name:
+    :return:
+    """
+    global _active_report
+
+    report = RunReport(run_name=run_name)
+    _active_report = report
+    started_at = time.perf_counter()
+    report.status = 'failed'
+    try:
+        yield report
+        report.status = 'success'
+    finally:
+        _active_report = None
+        report.duration = time.perf_counter() - started_at
+        save_run_report(report=report)
+
+
+def get_history_filepath() -> str:
+    """
+    Retrieve the path of the run reports history file
+    :return:
+    """
+    return os.getenv('RUN_REPORTS_FILEPATH', '/data/run_reports.jsonl')
+
+
+def save_run_report(report: RunReport):
+    """
+    Appends a run report to the history file and logs its breakdown
+    :param report:
+    :return:
+    """
+    log("Entering save_run_report method", LogLevels.LOG_LEVEL_DEBUG)
+    report_dict = report.serialize()
+
+    # Written directly (as the logs) since the file layer reports its usage to this module
+    history_filepath = get_history_filepath()
+    os.makedirs(os.path.dirname(history_filepath) or '.', exist_ok=True)
+    with open(history_filepath, 'a') as f:
+        f.write(json.dumps(report_dict, ensure_ascii=False) + '\n')
+
+    log(f"Run report of '{report.run_name}' ({report.status}, {report.duration:.1f} seconds):")
+    for task_name, usage in sorted(report_dict['tasks'].items()):
+        log(
+            f"{task_name}: {usage['wall_seconds']:.1f}s wall, {usage['requests']} request(s) "
+            f"({usage['response_bytes'] / 1024:.0f} KiB), {usage['sleep_seconds']:.1f}s sleeping, "
+            f"{usage['network_seconds']:.1f}s network, {usage['parse_seconds']:.1f}s parsing, "
+            f"{usage['persist_seconds']:.1f}s persisting, {usage['cache_hits']} cache hit(s)"
+        )
+
+
+def load_run_reports() -> List[Dict]:
+    """
+    Loads the run reports from the history file (skipping a truncated last record)
+    :return:
+    """
+    history_filepath = get_history_filepath()
+    if not os.path.isfile(history_filepath):
+        return []
+
+    with open(history_filepath, 'r') as f:
+        report_lines = f.read().splitlines()
+
+    reports = []
+    for report_line in report_lines:
+        try:
+            reports.append(json.loads(report_line))
+        except json.JSONDecodeError:
+            log(f"Ignoring truncated record on {history_filepath}", LogLevels.LOG_LEVEL_WARNING)
+
+    return reports
+
+
+def get_report_value(report: Dict, field: str) -> float:
+    """
+    Retrieve a time component of a report (the duration or one of the totals)
+    :param report:
+    :param field:
+    :return:
+    """
+    return report['duration'] if field == 'duration' else report['totals'][field]
+
+
+def find_regressions(report: Dict, baseline_reports: List[Dict], threshold: float) -> List[str]:
+    """
+    Retrieve the time components of a report that are slower than the baseline median by more than the threshold
+    :param report:
+    :param baseline_reports:
+    :param threshold:
+    :return:
+    """
+    if len(baseline_reports) == 0:
+        return []
+
+    regressions = []
+    for field in TIME_FIELDS:
+        baseline = statistics.median(get_report_value(baseline_report, field) for baseline_report in baseline_reports)
+        value = get_report_value(report, field)
+        # Ignores the components too small to be meaningful
+        if value > 1 and value > baseline * (1 + threshold):
+            increase = (value / baseline - 1) * 100 if baseline > 0 else 100
+            regressions.append(f"{field.replace('_seconds', '')} +{increase:.0f}%")
+
+    return regressions
+
+
+def execute_report_trend_command(arguments: List):
+    """
+    Prints the trend table of the last run reports (amount given in the arguments), flagging the runs slower than the
+    rolling baseline of the previous runs with the same name
+    :param arguments:
+    :return:
+    """
+    log("Entering execute_report_trend_command method", LogLevels.LOG_LEVEL_DEBUG)
+    count = int(arguments[0]) if len(arguments) > 0 else 20
+    baseline_size = int(os.getenv('RUN_REPORT_BASELINE_SIZE', 10))
+    threshold = float(os.getenv('RUN_REPORT_REGRESSION_THRESHOLD', 0.25))
+
+    reports = load_run_reports()
+    if len(reports) == 0:
+        log(f"No run reports found on {get_history_filepath()}", LogLevels.LOG_LEVEL_WARNING)
+        return
+
+    print(f"{'Started at':<19}  {'Run':<14} {'Status':<7} {'Duration':>9} {'Requests':>8} {'MiB':>7} "
+          f"{'Sleep':>6} {'Network':>7} {'Parse':>6} {'Persist':>7} {'Cache':>6}  Regressions")
+    first_index = max(0, len(reports) - count)
+    for index in range(first_index, len(reports)):
+        report = reports[index]
+        baseline_reports = [
+            previous_report for previous_report in reports[:index]
+            if previous_report['run'] == report['run'] and previous_report['status'] == 'success'
+        ][-baseline_size:]
+        regressions = find_regressions(report=report, baseline_reports=baseline_reports, threshold=threshold)
+
+        duration = report['duration'] or 0
+        totals = report['totals']
+
+        def share(field: str) -> str:
+            return f"{totals[field] / duration * 100:.0f}%" if duration > 0 else '-'
+
+        started_at = datetime.datetime.fromtimestamp(report['started_at']).strftime('%Y-%m-%d %H:%M:%S')
+        print(
+            f"{started_at:<19}  {report['run']:<14} {report['status']:<7} {duration:>8.0f}s {totals['requests']:>8} "
+            f"{totals['response_bytes'] / 1024 / 1024:>7.1f} {share('sleep_seconds'):>6} {share('network_seconds'):>7} "
+            f"{share('parse_seconds'):>6} {share('persist_seconds'):>7} {totals['cache_hits']:>6}  "
+            f"{', '.join(regressions) if len(regressions) > 0 else '-'}"
+        )
@@ -0,0 +1,378 @@
+import collections
+import datetime
+import heapq
+import itertools
+import os
+import random
+import threading
+
+from typing import Callable, Dict, List, Optional
+
+from modules.airplanes import fetch_all_airplanes_list
+from modules.card_holder import get_free_card_holder_if_available
+from modules.clock import get_clock
+from modules.control_api import start_control_api
+from modules.daemon_state import get_daemon_state
+from modules.lines import fetch_all_lines_list, stream_all_lines_list
+from modules.logger import log, LogLevels
+from modules.memory import is_low_memory_mode, track_memory_stage
+from modules.metrics import observe_task, start_metrics_exporter, write_metrics_textfile
+from modules.retry_queue import get_retry_queue
+from modules.session_manager import SessionManager
+from modules.tasks import drain_retry_queue
+from modules.travel_cards_wheel import spin_travel_cards_wheel_if_available
+from modules.workshop import get_free_workshop_items
+
+
+class ScheduledTask:
+    """
+    Class representing a task run by the daemon scheduler. The task function receives the session manager and returns
+    the seconds until it's due again (None to use the configured interval).
+    """
+    def __init__(self, name: str, function: Callable, interval: int):
+        """
+        ScheduledTask class constructor
+        :param name:
+        :param function:
+        :param interval:
+        """
+        self.name = name
+        self.function = function
+        self.interval = interval
+        self.next_due_at: Optional[float] = None
+        self.consecutive_failures = 0
+
+    def run(self, session_manager: SessionManager) -> float:
+        """
+        Runs the task, returning the seconds until it's due again
+        :param session_manager:
+        :return:
+        """
+        log(f"Running scheduled task '{self.name}'", LogLevels.LOG_LEVEL_NOTICE)
+        reported_delay = self.function(session_manager=session_manager)
+
+        return self.interval if reported_delay is None else max(0, reported_delay)
+
+
+class TaskScheduler:
+    """
+    Priority queue scheduler that sleeps until the earliest task deadline, runs it and reschedules it at the due time
+    reported by the task itself. The wait is interrupted when a task is triggered, a command is submitted or the
+    scheduling is paused/resumed (e.g. from the control API).
+    """
+    def __init__(self, session_manager: SessionManager, tasks: List[ScheduledTask]):
+        """
+        TaskScheduler class constructor
+        :param session_manager:
+        :param tasks:
+        """
+        log("Instantiating TaskScheduler class", LogLevels.LOG_LEVEL_DEBUG)
+        self.session_manager = session_manager
+        self.tasks = {task.name: task for task in tasks}
+        self.jitter = int(os.getenv('SCHEDULER_JITTER_SECONDS', 120))
+        self.error_retry_delay = int(os.getenv('SCHEDULER_ERROR_RETRY_SECONDS', 600))
+        self.error_retry_max_delay = int(os.getenv('SCHEDULER_ERROR_RETRY_MAX_SECONDS', 60*60*6))
+        self.is_paused = False
+        self._queue = []
+        self._sequence = itertools.count()
+        self._commands = collections.deque()
+        self._condition = threading.Condition()
+
+        for task in tasks:
+            self.schedule(task, delay=0)
+
+    def schedule(self, task: ScheduledTask, delay: float):
+        """
+        Schedules a task to run after the given delay (in seconds, a random jitter is added to non-immediate runs),
+        replacing its previous schedule
+        :param task:
+        :param delay:
+        :return:
+        """
+        jitter = random.randint(0, self.jitter) if delay > 0 else 0
+        with self._condition:
+            task.next_due_at = get_clock().time() + delay + jitter
+            heapq.heappush(self._queue, (task.next_due_at, next(self._sequence), task.name))
+            self._condition.notify_all()
+
+        log(
+            "Task '{}' scheduled to {}".format(
+                task.name,
+                datetime.datetime.fromtimestamp(task.next_due_at).strftime('%Y-%m-%d %H:%M:%S'),
+            ),
+            LogLevels.LOG_LEVEL_NOTICE,
+        )
+
+    def trigger(self, task_name: str) -> bool:
+        """
+        Schedules a task to run now, returning False if there's no task with the given name
+        :param task_name:
+        :return:
+        """
+        if task_name not in self.tasks:
+            return False
+
+        log(f"Task '{task_name}' triggered to run now", LogLevels.LOG_LEVEL_NOTICE)
+        self.schedule(self.tasks[task_name], delay=0)
+
+        return True
+
+    def submit(self, name: str, function: Callable, **kwargs):
+        """
+        Submits a command to run on the scheduler thread before the next task (the function receives the session
+        manager and the given kwargs)
+        :param name:
+        :param function:
+        :param kwargs:
+        :return:
+        """
+        with self._condition:
+            self._commands.append((name, function, kwargs))
+            self._condition.notify_all()
+
+    def set_paused(self, is_paused: bool):
+        """
+        Pauses or resumes the scheduling of the tasks (the submitted commands still run while paused)
+        :param is_paused:
+        :return:
+        """
+        log(f"Scheduling {'paused' if is_paused else 'resumed'}", LogLevels.LOG_LEVEL_NOTICE)
+        with self._condition:
+            self.is_paused = is_paused
+            self._condition.notify_all()
+
+    def wait_next_task(self) -> Optional[ScheduledTask]:
+        """
+        Blocks until the earliest task is due (returning it) or until a command is submitted (returning None)
+        :return:
+        """
+        with self._condition:
+            logged_due_at = None
+            while True:
+                if len(self._commands) > 0:
+                    return None
+
+                # Drops the entries replaced by a newer schedule of the same task
+                while len(self._queue) > 0 and self._queue[0][0] != self.tasks[self._queue[0][2]].next_due_at:
+                    heapq.heappop(self._queue)
+
+                if self.is_paused or len(self._queue) == 0:
+                    self._condition.wait()
+                    continue
+
+                due_at, _, task_name = self._queue[0]
+                sleep_interval = due_at - get_clock().time()
+                if sleep_interval <= 0:
+                    heapq.heappop(self._queue)
+                    return self.tasks[task_name]
+
+                if due_at != logged_due_at:
+                    log(f"Sleeping for {round(sleep_interval)} seconds until task '{task_name}' is due...")
+                    logged_due_at = due_at
+
+                get_clock().wait(self._condition, timeout=sleep_interval)
+
+    def run_commands(self):
+        """
+        Runs the submitted commands
+        :return:
+        """
+        while True:
+            with self._condition:
+                if len(self._commands) == 0:
+                    return
+
+                name, function, kwargs = self._commands.popleft()
+
+            log(f"Running submitted command '{name}'", LogLevels.LOG_LEVEL_NOTICE)
+            try:
+                function(session_manager=self.session_manager, **kwargs)
+            except Exception as error:
+                log(f"An error occurred when running command '{name}': {repr(error)}", LogLevels.LOG_LEVEL_ERROR)
+
+    def run_next(self) -> Optional[ScheduledTask]:
+        """
+        Waits until the earliest deadline, then runs the due task and reschedules it, returning it (or runs the
+        submitted commands, returning None). A failed task is logged and retried with an exponential backoff, so an
+        unexpected error never stops the scheduler.
+        :return:
+        """
+        task = self.wait_next_task()
+        if task is None:
+            self.run_commands()
+            return None
+
+        started_at = get_clock().time()
+        error = None
+        try:
+            delay = task.run(session_manager=self.session_manager)
+            task.consecutive_failures = 0
+        except Exception as raised_error:
+            task.consecutive_failures += 1
+            error = raised_error
+            delay = min(self.error_retry_max_delay, self.error_retry_delay * 2 ** (task.consecutive_failures - 1))
+            log(
+                f"An error occurred on task '{task.name}' ({task.consecutive_failures} consecutive failure(s)), "
+                f"retrying in {delay} s: {repr(error)}",
+                LogLevels.LOG_LEVEL_ERROR,
+            )
+
+        get_daemon_state().record_task_run(task.name, started_at, get_clock().time() - started_at, error)
+        observe_task(task=task.name, duration=get_clock().time() - started_at, failed=error is not None)
+        write_metrics_textfile()
+        self.schedule(task, delay=delay)
+
+        return task
+
+    def get_status(self) -> Dict:
+        """
+        Retrieve the scheduling status (paused flag, tasks due times and last runs, pending commands)
+        :return:
+        """
+        task_runs = get_daemon_state().get_task_runs()
+        with self._condition:
+            return {
+                'is_paused': self.is_paused,
+                'tasks': {
+                    task.name: {
+                        'interval': task.interval,
+                        'next_due_at': task.next_due_at,
+                        'last_run': task_runs.get(task.name),
+                    }
+                    for task in self.tasks.values()
+                },
+                'pending_commands': [name for name, _, _ in self._commands],
+            }
+
+    def run_forever(self):
+        """
+        Runs the scheduled tasks forever
+        :return:
+        """
+        log("Entering TaskScheduler.run_forever method", LogLevels.LOG_LEVEL_DEBUG)
+        while True:
+            self.run_next()
+
+
+def run_travel_cards_wheel_task(session_manager: SessionManager) -> Optional[float]:
+    """
+    Scheduled task spinning the Travel Cards Wheel (due again when its countdown ends, or right away if it can be
+    played again)
+    :param session_manager:
+    :return:
+    """
+    log("Entering run_travel_cards_wheel_task method", LogLevels.LOG_LEVEL_DEBUG)
+
+    return spin_travel_cards_wheel_if_available(session_manager=session_manager)
+
+
+def run_card_holder_task(session_manager: SessionManager) -> Optional[float]:
+    """
+    Scheduled task opening the free Card Holder (due again when its countdown ends)
+    :param session_manager:
+    :return:
+    """
+    log("Entering run_card_holder_task method", LogLevels.LOG_LEVEL_DEBUG)
+
+    return get_free_card_holder_if_available(session_manager=session_manager)
+
+
+def run_workshop_task(session_manager: SessionManager) -> Optional[float]:
+    """
+    Scheduled task retrieving the free workshop items
+    :param session_manager:
+    :return:
+    """
+    log("Entering run_workshop_task method", LogLevels.LOG_LEVEL_DEBUG)
+    get_free_workshop_items(session_manager=session_manager)
+
+    return None
+
+
+def run_airplanes_task(session_manager: SessionManager) -> Optional[float]:
+    """
+    Scheduled task fetching the airplanes list
+    :param session_manager:
+    :return:
+    """
+    log("Entering run_airplanes_task method", LogLevels.LOG_LEVEL_DEBUG)
+    airplanes = fetch_all_airplanes_list(session_manager=session_manager)
+    # The airplanes are not kept in low-memory mode, so the previous snapshot is left as is
+    if not is_low_memory_mode():
+        get_daemon_state().set_airplanes(airplanes)
+
+    return None
+
+
+def run_lines_task(session_manager: SessionManager) -> Optional[float]:
+    """
+    Scheduled task fetching the lines (due again when the least recently updated line becomes outdated, capped by the
+    configured interval). In low-memory mode, only the lines updated in the run are refreshed on the daemon state, but
+    all the streamed lines are accounted for the next run.
+    :param session_manager:
+    :return:
+    """
+    log("Entering run_lines_task method", LogLevels.LOG_LEVEL_DEBUG)
+    if is_low_memory_mode():
+        with track_memory_stage('fetch_all_lines_list'):
+            lines, least_recently_updated_at = stream_all_lines_list(session_manager=session_manager)
+        for line in lines:
+            get_daemon_state().update_line(line)
+    else:
+        lines = fetch_all_lines_list(session_manager=session_manager)
+        get_daemon_state().set_lines(lines)
+        updated_dates = [line.last_updated_at for line in lines if line.last_updated_at is not None]
+        least_recently_updated_at = min(updated_dates) if len(updated_dates) > 0 else None
+    if least_recently_updated_at is None:
+        return None
+
+    update_interval = datetime.timedelta(days=int(os.getenv('LINE_UPDATE_INTERVAL_DAYS', 2)))
+    next_outdated_at = least_recently_updated_at + update_interval
+    seconds_until_outdated = (next_outdated_at - get_clock().now()).total_seconds()
+
+    return max(5*60, min(seconds_until_outdated, int(os.getenv('LINES_TASK_INTERVAL', 60*60*6))))
+
+
+def run_retry_queue_task(session_manager: SessionManager) -> Optional[float]:
+    """
+    Scheduled task retrying the due items of the retry queue (due again when its next item is due, capped by the
+    configured interval)
+    :param session_manager:
+    :return:
+    """
+    log("Entering run_retry_queue_task method", LogLevels.LOG_LEVEL_DEBUG)
+    drain_retry_queue(session_manager=session_manager)
+    seconds_until_next_attempt = get_retry_queue().get_seconds_until_next_attempt()
+    if seconds_until_next_attempt is None:
+        return None
+
+    return max(5, min(seconds_until_next_attempt, int(os.getenv('RETRY_QUEUE_TASK_INTERVAL', 60*10))))
+
+
+def build_default_tasks() -> List[ScheduledTask]:
+    """
+    Build the list of the daemon scheduled tasks (intervals are read from the environment)
+    :return:
+    """
+    log("Entering build_default_tasks method", LogLevels.LOG_LEVEL_DEBUG)
+
+    return [
+        ScheduledTask('travel_cards_wheel', run_travel_cards_wheel_task, int(os.getenv('WHEEL_TASK_INTERVAL', 60*60))),
+        ScheduledTask('card_holder', run_card_holder_task, int(os.getenv('CARD_HOLDER_TASK_INTERVAL', 60*60))),
+        ScheduledTask('workshop', run_workshop_task, int(os.getenv('WORKSHOP_TASK_INTERVAL', 60*60*4))),
+        ScheduledTask('airplanes', run_airplanes_task, int(os.getenv('AIRPLANES_TASK_INTERVAL', 60*60*6))),
+        ScheduledTask('lines', run_lines_task, int(os.getenv('LINES_TASK_INTERVAL', 60*60*6))),
+        ScheduledTask('retry_queue', run_retry_queue_task, int(os.getenv('RETRY_QUEUE_TASK_INTERVAL', 60*10))),
+    ]
+
+
+def execute_daemon():
+    """
+    Runs the bot as a daemon, waking each task at its own due time (and serving the local control API)
+    :return:
+    """
+    log("Entering execute_daemon method", LogLevels.LOG_LEVEL_DEBUG)
+    scheduler = TaskScheduler(session_manager=SessionManager(), tasks=build_default_tasks())
+    start_control_api(scheduler=scheduler)
+    start_metrics_exporter()
+    scheduler.run_forever()
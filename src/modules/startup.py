@@ -0,0 +1,85 @@
+import compileall
+import os
+import py_compile
+import subprocess
+import sys
+
+from typing import List
+
+from modules.cli import COMMANDS, load_command_handler
+from modules.logger import log, LogLevels
+
+SOURCES_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def execute_import_time_command(arguments: List):
+    """
+    Prints the modules imported by a command (without running it) sorted by their cumulative import time, measured by
+    a child interpreter with '-X importtime': 'import-time [command arguments...]'
+    :param arguments:
+    :return:
+    """
+    log("Entering execute_import_time_command method", LogLevels.LOG_LEVEL_DEBUG)
+    result = subprocess.run(
+        [
+            sys.executable, '-X', 'importtime', '-c',
+            'import sys; from modules.cli import load_command_handler; load_command_handler(sys.argv[1:])',
+            *arguments,
+        ],
+        cwd=SOURCES_FOLDER,
+        capture_output=True,
+        text=True,
+    )
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+
+        self_time, cumulative_time, package = line[len('import time:'):].split('|')
+        imports.append({'self': int(self_time), 'cumulative': int(cumulative_time), 'package': package.rstrip()})
+
+    total_time = sum(module_import['self'] for module_import in imports)
+    print(f"{len(imports)} modules imported in {total_time / 1000:.1f} ms by '{' '.join(arguments)}'")
+    print(f"{'Self (ms)':>10} {'Cumul. (ms)':>12}  Module")
+    top_imports = sorted(imports, key=lambda module_import: module_import['cumulative'], reverse=True)
+    for module_import in top_imports[:int(os.getenv('IMPORT_TIME_TOP', 30))]:
+        print(
+            f"{module_import['self'] / 1000:>10.1f} {module_import['cumulative'] / 1000:>12.1f} "
+            f"{module_import['package']}"
+        )
+
+
+def execute_precompile_command():
+    """
+    Compiles the bytecode of the sources and of every module the commands import (the standard library and the
+    dependencies included) to the cache folder set in PYTHONPYCACHEPREFIX, so the commands run later (with
+    PYTHONDONTWRITEBYTECODE set) don't compile them again on each start
+    :return:
+    """
+    log("Entering execute_precompile_command method", LogLevels.LOG_LEVEL_DEBUG)
+    if sys.pycache_prefix is None:
+        log("The bytecode cache folder is not set (PYTHONPYCACHEPREFIX)!", LogLevels.LOG_LEVEL_ERROR)
+        return
+
+    compileall.compile_dir(SOURCES_FOLDER, quiet=1)
+
+    load_command_handler([])
+    for command in COMMANDS:
+        command.load_handler()
+
+    modules_filepaths = [getattr(module, '__file__', None) for module in list(sys.modules.values())]
+    compiled = 0
+    for filepath in modules_filepaths:
+        if filepath is None or not filepath.endswith('.py'):
+            continue
+
+        try:
+            py_compile.compile(filepath, doraise=True)
+        except (py_compile.PyCompileError, OSError) as error:
+            log(f"Unable to compile {filepath}: {repr(error)}", LogLevels.LOG_LEVEL_WARNING)
+            continue
+
+        compiled += 1
+
+    log(f"Compiled the bytecode of {compiled} modules to {sys.pycache_prefix}")
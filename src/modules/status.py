@@ -0,0 +1,32 @@
+import json
+import os
+import urllib.error
+import urllib.request
+
+from modules.logger import log, LogLevels
+from modules.run_report import load_run_reports
+
+
+def execute_status_command():
+    """
+    Prints the status of the daemon (from its control API) or, if it's not running, the summary of the last run
+    :return:
+    """
+    log("Entering execute_status_command method", LogLevels.LOG_LEVEL_DEBUG)
+    port = os.getenv('CONTROL_API_PORT', '8765')
+    if port != '':
+        status_url = f"http://{os.getenv('CONTROL_API_HOST', '127.0.0.1')}:{port}/status"
+        try:
+            with urllib.request.urlopen(status_url, timeout=float(os.getenv('STATUS_TIMEOUT', 2))) as response:
+                print(json.dumps(json.loads(response.read()), indent=2))
+                return
+        except (urllib.error.URLError, OSError):
+            log(f"The daemon control API is not reachable at {status_url}", LogLevels.LOG_LEVEL_NOTICE)
+
+    reports = load_run_reports()
+    if len(reports) == 0:
+        print("No run recorded yet")
+        return
+
+    last_report = {field: reports[-1].get(field) for field in ['run', 'started_at', 'duration', 'status']}
+    print(json.dumps(last_report, indent=2))
@@ -1,27 +1,96 @@
-import re
-
-from modules.logger import log, LogLevels
-
-
-def sanitize_text(input_text) -> str:
-    """
-    Sanitizes a string parsed from HTML, removing extra spaces and newlines.
-    :param input_text:
-    :return:
-    """
-    log("Entering sanitize_text method", LogLevels.LOG_LEVEL_DEBUG)
-
-    return re.sub(r'\s+', ' ', str(input_text).strip())
-
-
-def return_only_numbers(input_text) -> int:
-    """
-    Retrieve only numbers (digits) from a given value
-    :param input_text:
-    :return:
-    """
-    log("Entering return_only_numbers method", LogLevels.LOG_LEVEL_DEBUG)
-
-    numeric_string = re.sub(r'[^0-9]', '', str(input_text))
-
-    return int(numeric_string) if numeric_string != '' else None
+import re
+
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
+
+from modules.logger import log, LogLevels
+
+
+def sanitize_text(input_text) -> str:
+    """
+    Sanitizes a string parsed from HTML, removing extra spaces and newlines.
+    :param input_text:
+    :return:
+    """
+    log("Entering sanitize_text method", LogLevels.LOG_LEVEL_DEBUG)
+
+    return re.sub(r'\s+', ' ', str(input_text).strip())
+
+
+def return_only_numbers(input_text) -> int:
+    """
+    Retrieve only numbers (digits) from a given value
+    :param input_text:
+    :return:
+    """
+    log("Entering return_only_numbers method", LogLevels.LOG_LEVEL_DEBUG)
+
+    numeric_string = re.sub(r'[^0-9]', '', str(input_text))
+
+    return int(numeric_string) if numeric_string != '' else None
+
+
+def return_signed_decimal(input_text) -> Optional[float]:
+    """
+    Retrieve the (signed) decimal number in a given value, ignoring the units and the thousands separators (like
+    '$ -1 234.56', '1.234,5' or '79.5%'), or None if there's no digit. The last separator is the decimal one if both
+    '.' and ',' are used, or if it's used once and isn't followed by exactly 3 digits (so '1,234' is a thousand).
+    :param input_text:
+    :return:
+    """
+    number_match = re.search(r'-?\s*\d[\d\s.,]*', str(input_text))
+    if number_match is None:
+        return None
+
+    number_text = re.sub(r'[^0-9.,]', '', number_match.group(0)).rstrip('.,')
+    separators = re.findall(r'[.,]', number_text)
+    integer_text, fraction_text = number_text, ''
+    if len(separators) > 0:
+        last_separator = separators[-1]
+        is_decimal_separator = len(set(separators)) == 2 or (
+            separators.count(last_separator) == 1 and len(number_text.rpartition(last_separator)[2]) != 3
+        )
+        if is_decimal_separator:
+            integer_text, _, fraction_text = number_text.rpartition(last_separator)
+
+    number = float(re.sub(r'[^0-9]', '', integer_text) + '.' + (fraction_text or '0'))
+
+    return -number if number_match.group(0).startswith('-') else number
+
+
+def return_signed_number(input_text) -> Optional[int]:
+    """
+    Retrieve the (signed) number in a given value (see return_signed_decimal) rounded half up to an integer, or None if
+    there's no digit
+    :param input_text:
+    :return:
+    """
+    number = return_signed_decimal(input_text)
+
+    return int(Decimal(str(number)).to_integral_value(ROUND_HALF_UP)) if number is not None else None
+
+
+def parse_countdown_seconds(input_text) -> Optional[int]:
+    """
+    Parses a countdown text (like '05:23:11', '23:11', '1d 05:23:11' or '5h 23m 11s') into a total of seconds
+    :param input_text:
+    :return:
+    """
+    log("Entering parse_countdown_seconds method", LogLevels.LOG_LEVEL_DEBUG)
+    text = sanitize_text(input_text).lower()
+
+    days_match = re.search(r'(\d+)\s*d', text)
+    days_seconds = int(days_match.group(1)) * 86400 if days_match else 0
+
+    clock_match = re.search(r'(?:(\d+):)?(\d{1,2}):(\d{2})', text)
+    if clock_match:
+        hours, minutes, seconds = (int(group) if group else 0 for group in clock_match.groups())
+        return days_seconds + hours * 3600 + minutes * 60 + seconds
+
+    units_matches = re.findall(r'(\d+)\s*(h|m|s)\b', text)
+    if len(units_matches) == 0:
+        return days_seconds if days_match else None
+
+    units_seconds = {'h': 3600, 'm': 60, 's': 1}
+
+    return days_seconds + sum(int(value) * units_seconds[unit] for value, unit in units_matches)
@@ -0,0 +1,186 @@
+import threading
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List
+
+from modules.clock import get_clock
+from modules.logger import log, LogLevels
+from modules.metrics import observe_task
+from modules.run_report import track_task
+
+
+class TaskStatus:
+    """
+    Enum class for the possible statuses of a runner task
+    """
+    PENDING = 'pending'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+
+
+class RunnerTask:
+    """
+    Class representing a node of the task graph: the function to run, the tasks it depends on and the resource tags it
+    needs exclusive access to while running
+    """
+    def __init__(self, name: str, function: Callable, depends_on: List[str] = None, resources: List[str] = None):
+        """
+        RunnerTask class constructor
+        :param name:
+        :param function:
+        :param depends_on:
+        :param resources:
+        """
+        self.name = name
+        self.function = function
+        self.depends_on = depends_on or []
+        self.resources = resources or []
+        self.status = TaskStatus.PENDING
+        self.started_at = None
+        self.duration = None
+        self.error = None
+
+
+class TaskRunner:
+    """
+    Runs a graph of tasks, executing the independent branches concurrently (tasks sharing a resource tag never run at
+    the same time) and recording the timing of each task
+    """
+    def __init__(self, tasks: List[RunnerTask], max_workers: int = 3):
+        """
+        TaskRunner class constructor
+        :param tasks:
+        :param max_workers:
+        """
+        log("Instantiating TaskRunner class", LogLevels.LOG_LEVEL_DEBUG)
+        self.tasks = {task.name: task for task in tasks}
+        self.max_workers = max_workers
+        self._resource_locks = {
+            resource: threading.Lock() for task in tasks for resource in task.resources
+        }
+
+        for task in tasks:
+            unknown_dependencies = [name for name in task.depends_on if name not in self.tasks]
+            if len(unknown_dependencies) > 0:
+                raise ValueError(f"Task '{task.name}' depends on unknown task(s): {', '.join(unknown_dependencies)}")
+
+    def run(self, raise_errors: bool = True, **kwargs) -> Dict:
+        """
+        Runs all the tasks (passing the given kwargs to each function), raising the first task error (if any and if
+        requested) after all the runnable tasks finished. Returns the timings breakdown.
+        :param raise_errors:
+        :param kwargs:
+        :return:
+        """
+        log("Entering TaskRunner.run method", LogLevels.LOG_LEVEL_DEBUG)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                for task in self.get_ready_tasks(running_names=running.values()):
+                    running[executor.submit(self.run_task, task, kwargs)] = task.name
+
+                if len(running) == 0:
+                    break
+
+                done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)
+
+        self.log_timings()
+
+        failed_tasks = self.get_failed_tasks()
+        if raise_errors and len(failed_tasks) > 0:
+            raise failed_tasks[0].error
+
+        return self.get_timings()
+
+    def get_failed_tasks(self) -> List[RunnerTask]:
+        """
+        Retrieve the tasks that failed in the last run
+        :return:
+        """
+        return [task for task in self.tasks.values() if task.status == TaskStatus.FAILED]
+
+    def get_succeeded_tasks(self) -> List[RunnerTask]:
+        """
+        Retrieve the tasks that succeeded in the last run
+        :return:
+        """
+        return [task for task in self.tasks.values() if task.status == TaskStatus.SUCCESS]
+
+    def get_ready_tasks(self, running_names) -> List[RunnerTask]:
+        """
+        Retrieve the pending tasks whose dependencies succeeded (the ones with a failed dependency are skipped)
+        :param running_names:
+        :return:
+        """
+        ready_tasks = []
+        for task in self.tasks.values():
+            if task.status != TaskStatus.PENDING or task.name in running_names:
+                continue
+
+            dependencies_statuses = [self.tasks[name].status for name in task.depends_on]
+            if any(status in [TaskStatus.FAILED, TaskStatus.SKIPPED] for status in dependencies_statuses):
+                log(
+                    f"Skipping task '{task.name}' as one of its dependencies did not succeed",
+                    LogLevels.LOG_LEVEL_WARNING,
+                )
+                task.status = TaskStatus.SKIPPED
+                continue
+
+            if all(status == TaskStatus.SUCCESS for status in dependencies_statuses):
+                ready_tasks.append(task)
+
+        return ready_tasks
+
+    def run_task(self, task: RunnerTask, kwargs: Dict):
+        """
+        Runs a single task holding the locks of its resources
+        :param task:
+        :param kwargs:
+        :return:
+        """
+        log(f"Starting task '{task.name}'", LogLevels.LOG_LEVEL_NOTICE)
+        locks = [self._resource_locks[resource] for resource in sorted(task.resources)]
+        for lock in locks:
+            lock.acquire()
+
+        task.started_at = get_clock().time()
+        try:
+            with track_task(task.name):
+                task.function(**kwargs)
+            task.status = TaskStatus.SUCCESS
+        except Exception as error:
+            log(f"Task '{task.name}' failed: {repr(error)}", LogLevels.LOG_LEVEL_ERROR)
+            task.error = error
+            task.status = TaskStatus.FAILED
+        finally:
+            task.duration = get_clock().time() - task.started_at
+            observe_task(task=task.name, duration=task.duration, failed=task.status == TaskStatus.FAILED)
+            for lock in reversed(locks):
+                lock.release()
+
+    def get_timings(self) -> Dict:
+        """
+        Retrieve the timings breakdown of the tasks
+        :return:
+        """
+        return {
+            task.name: {
+                'status': task.status,
+                'started_at': task.started_at,
+                'duration': task.duration,
+            }
+            for task in self.tasks.values()
+        }
+
+    def log_timings(self):
+        """
+        Logs the timings breakdown of the tasks
+        :return:
+        """
+        for task in self.tasks.values():
+            duration = f'{task.duration:.1f} seconds' if task.duration is not None else '-'
+            log(f"Task '{task.name}': {task.status.upper()} ({duration})")
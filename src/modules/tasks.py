@@ -0,0 +1,115 @@
+from typing import Dict, List
+
+from models.airport import get_airport_registry
+from models.line import Line
+from modules.airplanes import fetch_all_airplanes_list
+from modules.card_holder import get_free_card_holder_if_available
+from modules.change_detection import persist_change_indexes
+from modules.daemon_state import get_daemon_state
+from modules.lines import fetch_all_lines_list
+from modules.lines_data import update_line_data
+from modules.logger import log, LogLevels
+from modules.retry_queue import get_retry_queue, RetryItemKinds
+from modules.session_manager import SessionManager
+from modules.task_runner import RunnerTask
+from modules.travel_cards_wheel import spin_travel_cards_wheel_if_available
+from modules.workshop import get_free_workshop_items, retrieve_free_workshop_item_by_url
+
+
+def build_main_tasks() -> List[RunnerTask]:
+    """
+    Build the task graph of the regular tasks
+    :return:
+    """
+    log("Entering build_main_tasks method", LogLevels.LOG_LEVEL_DEBUG)
+
+    return [
+        # Travel cards wheel, free card holder and free workshop items (sequential, sharing the session state)
+        RunnerTask('travel_cards_wheel', spin_travel_cards_wheel_if_available, resources=['session', 'write']),
+        RunnerTask(
+            'card_holder',
+            get_free_card_holder_if_available,
+            depends_on=['travel_cards_wheel'],
+            resources=['session', 'write'],
+        ),
+        RunnerTask(
+            'workshop',
+            get_free_workshop_items,
+            depends_on=['card_holder'],
+            resources=['session', 'write'],
+        ),
+
+        # Fetch the airplanes
+        RunnerTask('airplanes', fetch_all_airplanes_list),
+
+        # Fetch the lines
+        RunnerTask('lines', fetch_all_lines_list, resources=['lines']),
+    ]
+
+
+def retry_line_update(line_id: str, session_manager: SessionManager):
+    """
+    Retry handler updating the data of a single line
+    :param line_id:
+    :param session_manager:
+    :return:
+    """
+    log("Entering retry_line_update method", LogLevels.LOG_LEVEL_DEBUG)
+    update_line_data(line=Line(id=int(line_id)), session_manager=session_manager)
+
+
+def refresh_lines(line_ids: List[int], session_manager: SessionManager):
+    """
+    Updates the data of the given lines (queueing the failed ones to be retried) and their in-memory snapshots
+    :param line_ids:
+    :param session_manager:
+    :return:
+    """
+    log("Entering refresh_lines method", LogLevels.LOG_LEVEL_DEBUG)
+    for line_id in line_ids:
+        line = Line(id=int(line_id))
+        try:
+            update_line_data(line=line, session_manager=session_manager)
+        except ReferenceError as error:
+            get_retry_queue().enqueue(RetryItemKinds.LINE, line_id, error)
+            continue
+
+        get_daemon_state().update_line(line)
+
+    get_airport_registry().persist_to_file()
+    persist_change_indexes()
+
+
+def retry_main_task(task_name: str, session_manager: SessionManager):
+    """
+    Retry handler running a single task of the main tasks graph
+    :param task_name:
+    :param session_manager:
+    :return:
+    """
+    log("Entering retry_main_task method", LogLevels.LOG_LEVEL_DEBUG)
+    tasks = {task.name: task for task in build_main_tasks()}
+    tasks[task_name].function(session_manager=session_manager)
+
+
+def get_retry_handlers() -> Dict:
+    """
+    Retrieve the retry handler of each kind of retry queue item
+    :return:
+    """
+    return {
+        RetryItemKinds.LINE: retry_line_update,
+        RetryItemKinds.WORKSHOP_ITEM: retrieve_free_workshop_item_by_url,
+        RetryItemKinds.TASK: retry_main_task,
+    }
+
+
+def drain_retry_queue(session_manager: SessionManager) -> int:
+    """
+    Retries the due items of the retry queue, returning the amount of items that succeeded
+    :param session_manager:
+    :return:
+    """
+    log("Entering drain_retry_queue method", LogLevels.LOG_LEVEL_DEBUG)
+
+    return get_retry_queue().drain(handlers=get_retry_handlers(), session_manager=session_manager)
@@ -1,96 +1,139 @@
-import json
-import os
-
-from bs4 import BeautifulSoup
-from datetime import datetime
-from typing import Dict
-
-from modules.file import save_dict_to_json, save_error_dump_file
-from modules.logger import log, LogLevels
-from modules.session_manager import SessionManager
-
-
-def spin_travel_cards_wheel_if_available(session_manager: SessionManager):
-    """
-    Checks if the Travel Cards wheel is available, and spin it if so
-    :param session_manager:
-    :return:
-    """
-    log("Entering spin_travel_cards_wheel_if_available method", LogLevels.LOG_LEVEL_DEBUG)
-    if not is_travel_cards_wheel_available(session_manager=session_manager):
-        return
-
-    spin_result = spin_travel_cards_wheel(session_manager=session_manager)
-    log("Travel Card Wheel spin Results: {}".format(json.dumps(spin_result)))
-
-
-def is_travel_cards_wheel_available(session_manager: SessionManager) -> bool:
-    """
-    Determines if the Travel Cards Wheel is available to spin
-    :param session_manager:
-    :return:
-    """
-    log("Entering is_travel_cards_wheel_available method", LogLevels.LOG_LEVEL_DEBUG)
-    home_response = session_manager.request(
-        url='http://tycoon.airlines-manager.com/home',
-        method=SessionManager.Methods.GET,
-    )
-    home_bs = BeautifulSoup(home_response.text, 'html.parser')
-
-    main_content_div = home_bs.find('div', attrs={'id': 'mainContent'})
-    if main_content_div is None:
-        log("Aborting workshop reading as the items rack div was not found!", LogLevels.LOG_LEVEL_ERROR)
-        save_error_dump_file(dump=home_response.text, tag='home_main_content_div_not_found')
-        raise ReferenceError("The home content div was not found")
-
-    has_play_wheel_banner = home_bs.find('div', attrs={'id': 'playWheel'}) is not None
-    log("Travel Cards Wheel available: {}".format('YES' if has_play_wheel_banner else 'NO'))
-
-    return has_play_wheel_banner
-
-
-def spin_travel_cards_wheel(session_manager: SessionManager) -> Dict:
-    """
-    Spin the Travel Cards Wheel, save and return the results (must check if available first!)
-    :param session_manager:
-    :return:
-    """
-    log("Entering spin_travel_cards_wheel method", LogLevels.LOG_LEVEL_DEBUG)
-    wheel_spin_result = session_manager.request(
-        url='http://tycoon.airlines-manager.com/home/wheeltcgame/play',
-        method=SessionManager.Methods.GET,
-        extra_headers={
-            'Accept': 'application/json, text/javascript, */*; q=0.01',
-            'Referer': 'http://tycoon.airlines-manager.com/home/wheeltcgame',
-            'X-Requested-With': 'XMLHttpRequest',
-        },
-    )
-
-    original_json_data = json.loads(wheel_spin_result.text)
-
-    parsed_results = {
-        'totalTravelCardsAfter': int(original_json_data['nbOfTravelCards']),
-        'totalTravelCardsBefore': int(original_json_data['nbOfTravelCards']) - int(original_json_data['gain']),
-        'earnedTravelCards': int(original_json_data['gain']),
-        'bonusMultiplierGain': float(original_json_data['multiplierBonus']),
-        'bonusMultiplierGainIndex': int(original_json_data['indexScore']),
-        'canPlayAgain': bool(original_json_data['isAllowToPlay']),
-    }
-
-    save_travel_cards_results(parsed_results)
-
-    return parsed_results
-
-
-def save_travel_cards_results(parsed_results: Dict):
-    """
-    Saves the Travel Cards Wheel spin results to a json file
-    :param parsed_results:
-    :return:
-    """
-    log("Entering save_travel_cards_results method", LogLevels.LOG_LEVEL_DEBUG)
-    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    filename = 'travel_cards_wheel_results__{}.json'.format(timestamp)
-    filepath = os.path.join(os.environ['TRAVEL_CARDS_RESULTS_FOLDER'], filename)
-
-    save_dict_to_json(parsed_results, filepath)
+import json
+
+from bs4 import BeautifulSoup
+from typing import Dict, Optional, Tuple
+
+from modules.error_dumps import save_error_dump_file
+from modules.html_parser import parse_html
+from modules.journal import EventTypes, record_event
+from modules.logger import log, LogLevels
+from modules.session_manager import SessionManager
+from modules.strings import parse_countdown_seconds
+from modules.urls import build_url
+
+
+def spin_travel_cards_wheel_if_available(session_manager: SessionManager) -> Optional[int]:
+    """
+    Checks if the Travel Cards wheel is available, and spin it if so. Returns the seconds until the wheel can be played
+    again (0 if right away, the countdown shown when it isn't available, None if unknown).
+    :param session_manager:
+    :return:
+    """
+    log("Entering spin_travel_cards_wheel_if_available method", LogLevels.LOG_LEVEL_DEBUG)
+    is_available, countdown_seconds = fetch_travel_cards_wheel_status(session_manager=session_manager)
+    if not is_available:
+        return countdown_seconds
+
+    spin_result = spin_travel_cards_wheel(session_manager=session_manager)
+    log("Travel Card Wheel spin Results: {}".format(json.dumps(spin_result)))
+
+    return 0 if spin_result['canPlayAgain'] else None
+
+
+def is_travel_cards_wheel_available(session_manager: SessionManager) -> bool:
+    """
+    Determines if the Travel Cards Wheel is available to spin
+    :param session_manager:
+    :return:
+    """
+    log("Entering is_travel_cards_wheel_available method", LogLevels.LOG_LEVEL_DEBUG)
+    is_available, _ = fetch_travel_cards_wheel_status(session_manager=session_manager)
+
+    return is_available
+
+
+def fetch_travel_cards_wheel_status(session_manager: SessionManager) -> Tuple:
+    """
+    Retrieves a tuple of 2 items, containing if the Travel Cards Wheel is available to spin and the seconds left in its
+    countdown (None if available or if the countdown could not be parsed).
+    :param session_manager:
+    :return:
+    """
+    log("Entering fetch_travel_cards_wheel_status method", LogLevels.LOG_LEVEL_DEBUG)
+    home_response = session_manager.request(
+        url=build_url('/home'),
+        method=SessionManager.Methods.GET,
+    )
+    home_bs = parse_html(home_response.text, page='home')
+
+    main_content_div = home_bs.find('div', attrs={'id': 'mainContent'})
+    if main_content_div is None:
+        log("Aborting workshop reading as the items rack div was not found!", LogLevels.LOG_LEVEL_ERROR)
+        save_error_dump_file(dump=home_response.text, tag='home_main_content_div_not_found')
+        raise ReferenceError("The home content div was not found")
+
+    has_play_wheel_banner = home_bs.find('div', attrs={'id': 'playWheel'}) is not None
+    log("Travel Cards Wheel available: {}".format('YES' if has_play_wheel_banner else 'NO'))
+    if has_play_wheel_banner:
+        return True, None
+
+    countdown_div = home_bs.find('div', attrs={'id': 'timerWheel'})
+    if countdown_div is None:
+        return False, None
+
+    countdown_seconds = parse_travel_cards_wheel_countdown(countdown_div)
+    if countdown_seconds is not None:
+        log(f"Next Travel Cards Wheel spin in {countdown_seconds} seconds", LogLevels.LOG_LEVEL_NOTICE)
+
+    return False, countdown_seconds
+
+
+def parse_travel_cards_wheel_countdown(countdown_div: BeautifulSoup) -> Optional[int]:
+    """
+    Parses the Travel Cards Wheel countdown div into the seconds left (from a numeric data attribute or from its text)
+    :param countdown_div:
+    :return:
+    """
+    log("Entering parse_travel_cards_wheel_countdown method", LogLevels.LOG_LEVEL_DEBUG)
+    for attribute, value in countdown_div.attrs.items():
+        if attribute.startswith('data-') and str(value).isdigit():
+            return int(value)
+
+    countdown_seconds = parse_countdown_seconds(countdown_div.text)
+    if countdown_seconds is None:
+        log(f"Unable to parse the Travel Cards Wheel countdown '{countdown_div.text}'", LogLevels.LOG_LEVEL_WARNING)
+
+    return countdown_seconds
+
+
+def spin_travel_cards_wheel(session_manager: SessionManager) -> Dict:
+    """
+    Spin the Travel Cards Wheel, save and return the results (must check if available first!)
+    :param session_manager:
+    :return:
+    """
+    log("Entering spin_travel_cards_wheel method", LogLevels.LOG_LEVEL_DEBUG)
+    wheel_spin_result = session_manager.request(
+        url=build_url('/home/wheeltcgame/play'),
+        method=SessionManager.Methods.GET,
+        extra_headers={
+            'Accept': 'application/json, text/javascript, */*; q=0.01',
+            'Referer': build_url('/home/wheeltcgame'),
+            'X-Requested-With': 'XMLHttpRequest',
+        },
+    )
+
+    original_json_data = json.loads(wheel_spin_result.text)
+
+    parsed_results = {
+        'totalTravelCardsAfter': int(original_json_data['nbOfTravelCards']),
+        'totalTravelCardsBefore': int(original_json_data['nbOfTravelCards']) - int(original_json_data['gain']),
+        'earnedTravelCards': int(original_json_data['gain']),
+        'bonusMultiplierGain': float(original_json_data['multiplierBonus']),
+        'bonusMultiplierGainIndex': int(original_json_data['indexScore']),
+        'canPlayAgain': bool(original_json_data['isAllowToPlay']),
+    }
+
+    save_travel_cards_results(parsed_results)
+
+    return parsed_results
+
+
+def save_travel_cards_results(parsed_results: Dict):
+    """
+    Saves the Travel Cards Wheel spin results to the events journal
+    :param parsed_results:
+    :return:
+    """
+    log("Entering save_travel_cards_results method", LogLevels.LOG_LEVEL_DEBUG)
+    record_event(event_type=EventTypes.TRAVEL_CARDS_WHEEL, data=parsed_results)
@@ -0,0 +1,28 @@
+import os
+
+from urllib.parse import urlparse
+
+
+def get_base_url() -> str:
+    """
+    Retrieve the base URL of the game (may point to a stand-in server, e.g. for load testing)
+    :return:
+    """
+    return os.getenv('AM_BASE_URL', 'http://tycoon.airlines-manager.com').rstrip('/')
+
+
+def get_base_host() -> str:
+    """
+    Retrieve the host (and port, if any) of the game base URL
+    :return:
+    """
+    return urlparse(get_base_url()).netloc
+
+
+def build_url(path: str) -> str:
+    """
+    Builds the URL of a game page from its path (e.g. '/home')
+    :param path:
+    :return:
+    """
+    return get_base_url() + path
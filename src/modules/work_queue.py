@@ -0,0 +1,238 @@
+import os
+import sqlite3
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from modules.clock import get_clock
+from modules.file import ensure_folder_exists
+from modules.logger import log, LogLevels
+
+
+class WorkItemStates:
+    """
+    Enum class for the possible states of a work queue item
+    """
+    PENDING = 'pending'
+    LEASED = 'leased'
+    DONE = 'done'
+    DEAD = 'dead'
+
+
+class WorkQueue:
+    """
+    Work queue backed by a SQLite database shared by several processes: the items are leased by a worker for a limited
+    time (extended by its heartbeats) and the leases of dead workers expire, returning the items to the queue
+    """
+    def __init__(self, filepath: str, lease_seconds: float, max_attempts: int):
+        """
+        WorkQueue class constructor
+        :param filepath:
+        :param lease_seconds:
+        :param max_attempts:
+        """
+        log("Instantiating WorkQueue class", LogLevels.LOG_LEVEL_DEBUG)
+        self.filepath = filepath
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        ensure_folder_exists(os.path.dirname(self.filepath))
+        with self.transaction() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS work_items ('
+                'queue TEXT NOT NULL, '
+                'key TEXT NOT NULL, '
+                'state TEXT NOT NULL, '
+                'attempts INTEGER NOT NULL DEFAULT 0, '
+                'lease_owner TEXT, '
+                'lease_expires_at REAL, '
+                'enqueued_at REAL NOT NULL, '
+                'last_error TEXT, '
+                'PRIMARY KEY (queue, key))'
+            )
+
+    @contextmanager
+    def transaction(self):
+        """
+        Opens a connection to the queue database inside a write transaction (a connection per operation, so the queue
+        can be used from several threads and processes)
+        :return:
+        """
+        connection = sqlite3.connect(self.filepath, timeout=60, isolation_level=None)
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+
+    def enqueue(self, queue: str, keys: List) -> int:
+        """
+        Adds the given keys to a queue (the finished items are queued again, the pending and leased ones are kept),
+        returning the amount of items queued
+        :param queue:
+        :param keys:
+        :return:
+        """
+        log("Entering WorkQueue.enqueue method", LogLevels.LOG_LEVEL_DEBUG)
+        now = get_clock().time()
+        with self.transaction() as connection:
+            queued_before = connection.total_changes
+            connection.executemany(
+                'INSERT INTO work_items (queue, key, state, enqueued_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (queue, key) DO UPDATE SET state = excluded.state, attempts = 0, '
+                'enqueued_at = excluded.enqueued_at, last_error = NULL '
+                'WHERE work_items.state IN (?, ?)',
+                [
+                    (queue, str(key), WorkItemStates.PENDING, now, WorkItemStates.DONE, WorkItemStates.DEAD)
+                    for key in keys
+                ],
+            )
+
+            return connection.total_changes - queued_before
+
+    def lease(self, queue: str, owner: str) -> Optional[str]:
+        """
+        Leases the next pending item of a queue to the given owner (after returning the expired leases to the queue),
+        returning its key (None if there's no pending item)
+        :param queue:
+        :param owner:
+        :return:
+        """
+        now = get_clock().time()
+        with self.transaction() as connection:
+            self.expire_leases(connection=connection, queue=queue, now=now)
+
+            row = connection.execute(
+                'SELECT key FROM work_items WHERE queue = ? AND state = ? ORDER BY attempts, enqueued_at LIMIT 1',
+                (queue, WorkItemStates.PENDING),
+            ).fetchone()
+            if row is None:
+                return None
+
+            connection.execute(
+                'UPDATE work_items SET state = ?, lease_owner = ?, lease_expires_at = ? WHERE queue = ? AND key = ?',
+                (WorkItemStates.LEASED, owner, now + self.lease_seconds, queue, row[0]),
+            )
+
+            return row[0]
+
+    def expire_leases(self, connection: sqlite3.Connection, queue: str, now: float):
+        """
+        Returns the items whose lease expired (their worker died or hung) to the queue, counting it as a failed attempt
+        :param connection:
+        :param queue:
+        :param now:
+        :return:
+        """
+        expired_keys = [row[0] for row in connection.execute(
+            'SELECT key FROM work_items WHERE queue = ? AND state = ? AND lease_expires_at < ?',
+            (queue, WorkItemStates.LEASED, now),
+        )]
+        for key in expired_keys:
+            log(f"The lease of {queue} item '{key}' expired, returning it to the queue", LogLevels.LOG_LEVEL_WARNING)
+            self.release(connection=connection, queue=queue, key=key, error='Lease expired')
+
+    def release(self, connection: sqlite3.Connection, queue: str, key: str, error: str):
+        """
+        Returns a leased item to the queue after a failed attempt (or moves it to the dead state if it reached the
+        max attempts)
+        :param connection:
+        :param queue:
+        :param key:
+        :param error:
+        :return:
+        """
+        connection.execute(
+            'UPDATE work_items SET attempts = attempts + 1, last_error = ?, lease_owner = NULL, '
+            'lease_expires_at = NULL, state = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END '
+            'WHERE queue = ? AND key = ?',
+            (error, self.max_attempts, WorkItemStates.DEAD, WorkItemStates.PENDING, queue, key),
+        )
+
+    def heartbeat(self, queue: str, key: str, owner: str) -> bool:
+        """
+        Extends the lease of an item, returning False if the given owner doesn't hold it anymore
+        :param queue:
+        :param key:
+        :param owner:
+        :return:
+        """
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE work_items SET lease_expires_at = ? '
+                'WHERE queue = ? AND key = ? AND state = ? AND lease_owner = ?',
+                (get_clock().time() + self.lease_seconds, queue, key, WorkItemStates.LEASED, owner),
+            )
+
+            return cursor.rowcount > 0
+
+    def complete(self, queue: str, key: str, owner: str) -> bool:
+        """
+        Marks a leased item as done, returning False if the given owner doesn't hold its lease anymore
+        :param queue:
+        :param key:
+        :param owner:
+        :return:
+        """
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE work_items SET state = ?, lease_owner = NULL, lease_expires_at = NULL '
+                'WHERE queue = ? AND key = ? AND state = ? AND lease_owner = ?',
+                (WorkItemStates.DONE, queue, key, WorkItemStates.LEASED, owner),
+            )
+
+            return cursor.rowcount > 0
+
+    def fail(self, queue: str, key: str, owner: str, error: Exception):
+        """
+        Returns a leased item to the queue after a failed attempt of the given owner
+        :param queue:
+        :param key:
+        :param owner:
+        :param error:
+        :return:
+        """
+        log(f"Attempt of {queue} item '{key}' failed: {repr(error)}", LogLevels.LOG_LEVEL_WARNING)
+        with self.transaction() as connection:
+            row = connection.execute(
+                'SELECT 1 FROM work_items WHERE queue = ? AND key = ? AND state = ? AND lease_owner = ?',
+                (queue, key, WorkItemStates.LEASED, owner),
+            ).fetchone()
+            if row is not None:
+                self.release(connection=connection, queue=queue, key=key, error=repr(error))
+
+    def get_counts(self, queue: str) -> Dict[str, int]:
+        """
+        Retrieve the amount of items of a queue in each state
+        :param queue:
+        :return:
+        """
+        with self.transaction() as connection:
+            counts = {state: 0 for state in [
+                WorkItemStates.PENDING, WorkItemStates.LEASED, WorkItemStates.DONE, WorkItemStates.DEAD,
+            ]}
+            for state, count in connection.execute(
+                'SELECT state, COUNT(*) FROM work_items WHERE queue = ? GROUP BY state',
+                (queue,),
+            ):
+                counts[state] = count
+
+            return counts
+
+
+def get_work_queue() -> WorkQueue:
+    """
+    Build the work queue (configured from the environment)
+    :return:
+    """
+    return WorkQueue(
+        filepath=os.getenv('WORK_QUEUE_FILEPATH', '/data/work_queue.sqlite3'),
+        lease_seconds=float(os.getenv('WORK_QUEUE_LEASE_SECONDS', 5*60)),
+        max_attempts=int(os.getenv('WORK_QUEUE_MAX_ATTEMPTS', 5)),
+    )